@@ -0,0 +1,330 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from .snapshot import WorldSnapshot
+from .spatial import SpatialHash
+
+# Extra cost (in seconds) of sending a unit of one kind (rows, see KINDS) at a
+# target of another (columns), inf where it cannot get at it: bases do not
+# move and tanks cannot drive onto water. Chasing faster units costs extra.
+KIND_COST = np.array([
+    # bases, tanks, ships, jets
+    [np.inf, np.inf, np.inf, np.inf],  # bases
+    [0.0, 0.0, np.inf, 10.0],  # tanks
+    [0.0, 10.0, 0.0, 10.0],  # ships
+    [0.0, 0.0, 0.0, 0.0],  # jets
+])
+
+
+def cost_matrix(positions: np.ndarray, targets: np.ndarray, size: np.ndarray, speed: np.ndarray,
+                attack: np.ndarray, health: np.ndarray, kinds: np.ndarray = None,
+                target_kinds: np.ndarray = None, kind_cost: np.ndarray = KIND_COST,
+                columns: np.ndarray = None) -> np.ndarray:
+  """
+  Seconds for each of n units to reach each of m targets over the wrapped
+  map and destroy it on its own, plus the kind_cost of the pair when the
+  kinds (indices into KINDS) are given. Returns an (n, m) matrix, or with
+  columns the (n, k) costs for the targets columns[i] of each unit (inf for
+  -1). Speeds and attacks of 0 (not known) count as 1.
+  """
+  positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+  targets = np.asarray(targets, dtype=float).reshape(-1, 2)
+  columns = np.arange(len(targets))[None, :] if columns is None else np.asarray(columns)
+  nx, ny = np.asarray(size, dtype=float)
+  dx = (targets[columns, 0] - positions[:, None, 0] + nx / 2) % nx - nx / 2
+  dy = (targets[columns, 1] - positions[:, None, 1] + ny / 2) % ny - ny / 2
+  speed = np.asarray(speed, dtype=float).reshape(-1, 1)
+  attack = np.asarray(attack, dtype=float).reshape(-1, 1)
+  cost = np.hypot(dx, dy) / np.where(speed > 0, speed, 1)
+  cost += np.asarray(health, dtype=float)[columns] / np.where(attack > 0, attack, 1)
+  if kinds is not None and target_kinds is not None:
+    cost += kind_cost[np.asarray(kinds)[:, None], np.asarray(target_kinds)[columns]]
+  return np.where(columns >= 0, cost, np.inf)
+
+
+def _bid(columns: np.ndarray, benefit: np.ndarray, prices: np.ndarray, owner: np.ndarray, assigned: np.ndarray,
+         eps: float, rounds: int = None, leave: bool = False) -> None:
+  """
+  Jacobi auction rounds until every person owns an object or has none: all
+  persons without one bid at once for their best object, raising its price
+  by how much they prefer it over their second best plus eps, and each
+  object goes to its highest bidder. Updates the arrays in place, at most
+  `rounds` times; the persons still bidding then are left without one.
+
+  Person i of the rows of columns may bid for the objects columns[i] (-1
+  for none), worth benefit[i] to it, and if leave also have none (assigned
+  to len(prices)), worth 0. Persons past the rows want no object in
+  particular: the k of them without one take the k cheapest objects at
+  once, bidding the price of the next cheapest plus eps, rather than one
+  per round.
+  """
+  units = len(columns)
+  free = np.flatnonzero(assigned < 0)
+  top = np.full(len(prices), -np.inf)
+  for _ in range(rounds) if rounds is not None else iter(int, 1):
+    if not len(free):
+      break
+    free = np.concatenate([free[free < units], free[free >= units]])
+    bidders = np.count_nonzero(free < units)
+    candidates = columns[free[:bidders]]
+    values = np.where(candidates >= 0, benefit[free[:bidders]] - prices[candidates], -np.inf)
+    rows = np.arange(bidders)
+    pick = np.argmax(values, axis=1)
+    best = candidates[rows, pick]
+    first = values[rows, pick]
+    values[rows, pick] = -np.inf
+    second = values.max(axis=1)
+    leaving = np.zeros(bidders, dtype=bool)
+    if leave:
+      # Having none is the second best of every person, and the best of some
+      second = np.maximum(second, 0)
+      leaving = first < 0
+    assigned[free[:bidders][leaving]] = len(prices)
+    bids = prices[best] + first - second + eps
+    padding = len(free) - bidders
+    if padding:
+      cheapest = np.argsort(prices)[:padding + 1]
+      next_price = prices[cheapest[-1]] if padding < len(prices) else prices[cheapest]
+      best = np.concatenate([best, cheapest[:padding]])
+      bids = np.concatenate([bids, np.broadcast_to(next_price + eps, padding)])
+    stay = np.r_[~leaving, np.ones(padding, dtype=bool)]
+    free, best, bids = free[stay], best[stay], bids[stay]
+
+    # Every object goes to its highest bidder, the owner it had becomes free
+    np.maximum.at(top, best, bids)
+    won = bids == top[best]
+    top[best] = -np.inf
+    winners, objects = free[won], best[won]
+    # Of equal bids the last one wins
+    owner_before = owner[objects]
+    owner[objects] = winners
+    taken = owner[objects] == winners
+    winners, objects = winners[taken], objects[taken]
+    prices[objects] = bids[won][taken]
+    losers = owner_before[taken]
+    losers = losers[losers >= 0]
+    assigned[losers] = -1
+    assigned[winners] = objects
+    free = np.concatenate([free[~won], free[won][~taken], losers])
+
+
+def auction(cost: np.ndarray, capacity=1, prices: np.ndarray = None, assignment: np.ndarray = None,
+            eps: float = None, columns: np.ndarray = None, rounds: int = None) -> tuple:
+  """
+  Assignment of n units (rows) to m targets (columns) of least total cost,
+  with the auction algorithm. Every unit gets at most one target and target
+  j at most capacity[j] units (an array of m, an int applies to all
+  targets). Infinite costs are never assigned.
+
+  Returns the target of every unit (-1 for none) and the target prices,
+  which can be passed back with the assignment as a warm start for the next
+  tick: when little changed, a few bidding rounds repair the assignment.
+  The total cost is within n * eps of the optimum, eps defaults to 1/100
+  of the cost range.
+
+  With columns given the cost is sparse, (n, k) for the targets columns[i]
+  of each unit (-1 for none), e.g. its k nearest, and capacity holds the m
+  targets. A unit may then be left without a target while others have
+  slots left, and the auction runs in one pass at eps. A warm start or a
+  sparse auction stops after `rounds` bidding rounds: the units still
+  bidding then have no target, the next tick goes on from the prices.
+  """
+  cost = np.asarray(cost, dtype=float)
+  n = len(cost)
+  if columns is None:
+    m = cost.shape[1]
+    capacity = np.broadcast_to(capacity, (m,))
+  else:
+    m = len(capacity)
+    columns = np.asarray(columns)
+  capacity = np.minimum(capacity, n).astype(int)
+  feasible = np.isfinite(cost)
+  if n == 0 or m == 0 or not feasible.any():
+    return np.full(n, -1), np.zeros(m) if prices is None else np.asarray(prices, dtype=float)
+
+  # Benefits are positive for the targets a unit can attack and negative
+  # for the others, so that having no target (0) lies in between
+  low, high = cost[feasible].min(), cost[feasible].max()
+  spread = max(high - low, 1e-9)
+  eps = spread / 100 if eps is None else eps
+  benefit = np.where(feasible, high + spread - cost, -spread)
+
+  # A target takes as many units as it has slots, each slot an object of
+  # the auction.
+  slot_target = np.repeat(np.arange(m), capacity)
+  slots = len(slot_target)
+  if columns is None:
+    # Padding with persons that want no slot in particular and with slots
+    # that stand for no target makes the problem square, the case the
+    # auction (with epsilon scaling) solves optimally.
+    size = max(n, slots)
+    benefit = np.c_[benefit[:, slot_target], np.zeros((n, size - slots))]
+    slot_columns = np.broadcast_to(np.arange(size), (n, size))
+  else:
+    # The slots of the targets of every unit, -1 past their capacity
+    size = slots
+    target = np.maximum(columns, 0)
+    offset = np.arange(capacity.max())
+    first_slot = np.cumsum(capacity) - capacity
+    slot_columns = np.where((columns >= 0)[..., None] & (offset < capacity[target][..., None]),
+                            first_slot[target][..., None] + offset, -1).reshape(n, -1)
+    benefit = np.repeat(benefit, len(offset), axis=1)
+  leave = columns is not None
+
+  object_prices = np.zeros(size)
+  owner = np.full(size, -1)
+  assigned = np.full(max(n, size), -1)
+  if prices is not None and assignment is not None:
+    # Slots start at the price of their target, units keep their target
+    # where that is still (eps-)optimal at those prices
+    prices = np.asarray(prices, dtype=float)
+    object_prices[:slots] = prices[slot_target]
+    assignment = np.asarray(assignment)
+    rows = np.flatnonzero((assignment >= 0) & (assignment < m))
+    targets = assignment[rows]
+    own = (slot_columns[rows] >= 0) & (slot_columns[rows] < slots)
+    own &= slot_target[np.minimum(slot_columns[rows], slots - 1)] == targets[:, None]
+    current = np.where(own, benefit[rows], -np.inf).max(axis=1, initial=-np.inf) - prices[targets]
+    kept = current >= _values(slot_columns[rows], benefit[rows], object_prices, leave) - eps
+    rows, targets = rows[kept], targets[kept]
+    # Every kept unit takes the next slot of its target, if there is one
+    order = np.argsort(targets, kind="stable")
+    rows, targets = rows[order], targets[order]
+    taken = np.searchsorted(slot_target, targets) + np.arange(len(targets)) - np.searchsorted(targets, targets)
+    fits = taken < np.searchsorted(slot_target, targets, side="right")
+    owner[taken[fits]] = rows[fits]
+    assigned[rows[fits]] = taken[fits]
+    _bid(slot_columns, benefit, object_prices, owner, assigned, eps, rounds, leave)
+  elif leave:
+    _bid(slot_columns, benefit, object_prices, owner, assigned, eps, rounds, leave)
+  else:
+    # Epsilon scaling: a coarse auction first, each finer one starts from
+    # the prices of the one before
+    scale = max(spread / 4, eps)
+    _bid(slot_columns, benefit, object_prices, owner, assigned, scale, rounds)
+    while scale > eps:
+      scale = max(scale / 8, eps)
+      # Only the persons that are not within the finer eps of their best
+      # object at the current prices bid again
+      values = benefit - object_prices
+      lost = object_prices[assigned] > object_prices.min() + scale
+      lost[:n] = values[np.arange(n), assigned[:n]] < values.max(axis=1) - scale
+      owner[assigned[lost]] = -1
+      assigned[lost] = -1
+      _bid(slot_columns, benefit, object_prices, owner, assigned, scale, rounds)
+
+  result = np.full(n, -1)
+  # Units that only got a slot of a target they cannot attack have none
+  real = (assigned[:n] >= 0) & (assigned[:n] < slots)
+  own = slot_columns == np.where(real, assigned[:n], -2)[:, None]
+  real &= (own & (benefit > 0)).any(axis=1)
+  result[real] = slot_target[assigned[:n][real]]
+  # The price of a target is that of its cheapest slot
+  target_prices = np.full(m, np.inf)
+  np.minimum.at(target_prices, slot_target, object_prices[:slots])
+  target_prices[np.isinf(target_prices)] = 0
+  return result, target_prices
+
+
+def _greedy(cost: np.ndarray, capacity: np.ndarray) -> np.ndarray:
+  """
+  Target of every unit (-1 for none) when each takes its cheapest target
+  with slots left, the cheapest units first where too many want one.
+  """
+  cost = np.array(cost, dtype=float)
+  capacity = np.array(capacity)
+  result = np.full(len(cost), -1)
+  free = np.flatnonzero(np.isfinite(cost).any(axis=1))
+  while len(free):
+    choice = np.argmin(cost[free], axis=1)
+    price = cost[free, choice]
+    order = np.lexsort((price, choice))
+    order = order[np.isfinite(price[order])]
+    free, choice = free[order], choice[order]
+    won = np.arange(len(choice)) - np.searchsorted(choice, choice) < capacity[choice]
+    result[free[won]] = choice[won]
+    capacity -= np.bincount(choice[won], minlength=len(capacity))
+    cost[:, capacity <= 0] = np.inf
+    free = free[~won]
+  return result
+
+
+def _values(columns: np.ndarray, benefit: np.ndarray, prices: np.ndarray, leave: bool) -> np.ndarray:
+  """What the best object at these prices is worth to each person, as in _bid()."""
+  values = np.where(columns >= 0, benefit - prices[columns], -np.inf).max(axis=1, initial=-np.inf)
+  return np.maximum(values, 0) if leave else values
+
+
+class TargetAssigner:
+  """
+  Assigns units to targets every tick, warm-started from the tick before.
+
+  Assignments and prices are kept by uid, so that units and targets can
+  come and go between ticks: a unit keeps its target while that is still
+  the best deal at the current prices, and only the units whose situation
+  changed bid again.
+  """
+
+  def __init__(self):
+    self.targets = {}
+    self.prices = {}
+
+  def assign(self, unit_uids: list, target_uids: list, cost: np.ndarray, capacity=1, columns=None,
+             rounds: int = None) -> dict:
+    """
+    Target uid of every unit that gets one, for the (units, targets) cost
+    matrix, or the sparse one of auction() with columns.
+    """
+    index = {uid: column for column, uid in enumerate(target_uids)}
+    prices = np.array([self.prices.get(uid, 0.0) for uid in target_uids])
+    assignment = np.array([index.get(self.targets.get(uid), -1) for uid in unit_uids], dtype=int)
+    capacity = np.broadcast_to(capacity, (len(target_uids),))
+    result, prices = auction(cost, capacity, prices, assignment, columns=columns, rounds=rounds)
+    self.prices = dict(zip(target_uids, prices.tolist()))
+    self.targets = {uid: target_uids[column] for uid, column in zip(unit_uids, result.tolist()) if column >= 0}
+    return self.targets
+
+  def assign_rows(self, world: WorldSnapshot, units, targets, capacity=None, nearest: int = 8,
+                  rounds: int = 20) -> dict:
+    """
+    Target uid of every unit that gets one, for units and targets given as
+    rows of the snapshot, with the costs of cost_matrix(). By default the
+    targets share the units evenly, so that every unit gets one.
+
+    With more than `nearest` targets every unit only bids for the nearest
+    ones, for at most `rounds` rounds a tick, and the units left over then
+    take the cheapest targets with slots left.
+    """
+    units = np.arange(len(world.uids))[units]
+    targets = np.arange(len(world.uids))[targets]
+    if capacity is None:
+      capacity = -(-len(units) // max(len(targets), 1))
+    capacity = np.broadcast_to(capacity, (len(targets),))
+    unit_uids = [world.uids[row] for row in units]
+    target_uids = [world.uids[row] for row in targets]
+    if len(targets) <= nearest:
+      cost = cost_matrix(world.position[units], world.position[targets], world.size, world.speed[units],
+                         world.attack[units], world.health[targets], world.kind[units], world.kind[targets])
+      return self.assign(unit_uids, target_uids, cost, capacity)
+
+    # Cells of about `nearest` targets each
+    cell_size = np.sqrt(world.size.prod() * nearest / len(targets))
+    target_index = SpatialHash(world.position[targets], world.size, cell_size)
+    columns = target_index.k_nearest(world.position[units], nearest)[1]
+    cost = cost_matrix(world.position[units], world.position[targets], world.size, world.speed[units],
+                       world.attack[units], world.health[targets], world.kind[units], world.kind[targets],
+                       columns=columns)
+    result = self.assign(unit_uids, target_uids, cost, capacity, columns, rounds)
+    index = {uid: column for column, uid in enumerate(target_uids)}
+    left = np.array([uid not in result for uid in unit_uids])
+    slots = capacity - np.bincount([index[uid] for uid in result.values()], minlength=len(targets))
+    if left.any() and slots.any():
+      rows, open_targets = units[left], np.flatnonzero(slots > 0)
+      cost = cost_matrix(world.position[rows], world.position[targets[open_targets]], world.size,
+                         world.speed[rows], world.attack[rows], world.health[targets[open_targets]],
+                         world.kind[rows], world.kind[targets[open_targets]])
+      extra = _greedy(cost, slots[open_targets])
+      result.update((world.uids[row], target_uids[open_targets[column]])
+                    for row, column in zip(rows, extra.tolist()) if column >= 0)
+    return result
@@ -0,0 +1,164 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Scaling benchmark of PlayerAi.run() for every bot in the package.
+
+    python -m <package>.benchmark --units 10 100 1000 --teams 2 4 --maps 256 1024
+
+Each scenario builds a synthetic world with the stand-in engine: a generated
+map, and for every team a number of bases and of tanks, ships and jets spread
+over the map on the right terrain. Everything is visible, the worst case for
+the nearest-enemy searches. The bot's first call (which builds its caches) is
+timed on its own, then the units move a step before each timed call. Peak
+memory is measured on one extra call under tracemalloc.
+"""
+
+import argparse
+import importlib
+import itertools
+import json
+import time
+import tracemalloc
+import numpy as np
+
+from .engine import VEHICLE_KINDS, Engine
+from .profiling import LatencyHistogram
+
+BOTS = (
+    "fivemonkeys_ai",
+    "fivedonkeys_ai",
+    "hunter_ai",
+    "hunterx_ai",
+    "player_ai",
+    "junior_ai",
+    "chatgpt_ai",
+    "antiair_base",
+    "antiair_unit",
+    "settlers_historic_avoidance_ai",
+)
+
+
+class _Team:
+  """Placeholder player for the synthetic enemy teams, which never run."""
+
+  def __init__(self, team: str):
+    self.team = team
+
+
+def make_world(team: str, units: int, teams: int, map_size: int, seed: int = 0) -> Engine:
+  """
+  Engine with `teams` teams of `units` units each on a map_size^2 map, one
+  base per 20 units and the rest split evenly between tanks, ships and jets.
+  """
+  players = [_Team(team)] + [_Team(f"enemy-{i}") for i in range(1, teams)]
+  engine = Engine(players, nx=map_size, ny=map_size, fog=False, seed=seed)
+  rng = engine.rng
+  land = np.flatnonzero(engine.game_map.ravel() == 1)
+  water = np.flatnonzero(engine.game_map.ravel() == 0)
+  tiles = {"tanks": land, "ships": water, "jets": np.arange(engine.game_map.size)}
+
+  for name in engine.teams:
+    nbases = max(1, units // 20)
+    for tile in rng.choice(land, nbases - 1):
+      engine.add_base(name, tile % map_size + 0.5, tile // map_size + 0.5)
+    bases = engine.bases[name]
+    for i in range(units - nbases):
+      kind = VEHICLE_KINDS[i % len(VEHICLE_KINDS)]
+      vehicle = engine.add_vehicle(bases[rng.integers(len(bases))], kind, rng.random() * 360)
+      tile = rng.choice(tiles[kind])
+      engine.position[vehicle._slot] = tile % map_size + 0.5, tile // map_size + 0.5
+  return engine
+
+
+def bench(bot: str, units: int, teams: int, map_size: int, repeat: int = 20, seed: int = 0) -> dict:
+  """Time `repeat` calls of the bot's run() in one scenario, latencies in ms."""
+  player = importlib.import_module(f".{bot}", __package__).PlayerAi()
+  if hasattr(player, "rng"):
+    player.rng.seed(seed)
+  engine = make_world(player.team, units, teams, map_size, seed)
+  game_map = engine.view(player.team)
+  errors = 0
+
+  def call():
+    nonlocal errors
+    info = engine.info(player.team)
+    start = time.perf_counter_ns()
+    try:
+      player.run(engine.t, engine.dt, info, game_map)
+    except Exception:
+      errors += 1
+    return time.perf_counter_ns() - start
+
+  cold = call()
+  histogram = LatencyHistogram()
+  for _ in range(repeat):
+    engine.move()
+    histogram.record(call())
+
+  tracemalloc.start()
+  call()
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+
+  return {
+      "bot": bot,
+      "units": units,
+      "teams": teams,
+      "map": map_size,
+      "cold_ms": cold / 1e6,
+      **{key: value for key, value in histogram.summary().items() if key != "count"},
+      "peak_mb": peak / 2**20,
+      "errors": errors,
+  }
+
+
+def run(bots, units, teams, maps, repeat: int = 20, budget: float = 1.0, seed: int = 0):
+  """
+  Benchmark every bot in every scenario, yielding one result per scenario.
+  Once a bot takes more than `budget` seconds per call, the scenarios that
+  are at least as large in every dimension are skipped for it.
+  """
+  for bot in bots:
+    too_slow = []
+    for size in sorted(itertools.product(units, teams, maps), key=lambda size: np.prod(size)):
+      if any(all(a >= b for a, b in zip(size, slow)) for slow in too_slow):
+        continue
+      result = bench(bot, *size, repeat=repeat, seed=seed)
+      if result["p50_ms"] > budget * 1e3:
+        too_slow.append(size)
+      yield result
+
+
+COLUMNS = ("bot", "units", "teams", "map", "cold_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms", "peak_mb",
+           "errors")
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument("--bots", nargs="+", default=BOTS, choices=BOTS)
+  parser.add_argument("--units", nargs="+", type=int, default=[10, 100, 1000, 10000],
+                      help="units per team")
+  parser.add_argument("--teams", nargs="+", type=int, default=[2, 4, 16])
+  parser.add_argument("--maps", nargs="+", type=int, default=[256, 1024, 4096],
+                      help="map width and height")
+  parser.add_argument("--repeat", type=int, default=20, help="timed calls per scenario")
+  parser.add_argument("--budget", type=float, default=1.0,
+                      help="seconds per call above which larger scenarios are skipped")
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--json", help="also write the results to this file")
+  args = parser.parse_args(argv)
+
+  print(f"{COLUMNS[0]:<32}" + " ".join(f"{column:>8}" for column in COLUMNS[1:]))
+  results = []
+  for result in run(args.bots, args.units, args.teams, args.maps, args.repeat, args.budget, args.seed):
+    results.append(result)
+    print(f"{result['bot']:<32}" + " ".join(f"{result[column]:>8.2f}" if isinstance(result[column], float)
+                                          else f"{result[column]:>8}" for column in COLUMNS[1:]), flush=True)
+
+  if args.json:
+    with open(args.json, "w") as f:
+      json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+  main()
@@ -1,7 +1,15 @@
 import numpy as np
-from collections import defaultdict
 import math
 
+from .assignment import TargetAssigner
+from .mapstate import MapState
+from .pathfinding import PathPlanner
+from .profiling import PhaseProfiler, profiled
+from .randomness import BotRandom
+from .replay import recorded
+from .snapshot import WorldSnapshot
+from .units import UnitStore
+
 # This is your team name
 CREATOR = "chatgpt"
 
@@ -9,84 +17,85 @@ class PlayerAi:
     def __init__(self):
         self.team = CREATOR
 
-        # Record the previous positions of all my vehicles
-        self.previous_positions = {}
-        # Record the number of tanks and ships I have at each base
-        self.ntanks = {}
-        self.nships = {}
+        # This tick's map, with a version and the tiles that changed
+        self.map = MapState()
+        # Record the previous positions of all my vehicles, and the number of
+        # tanks and ships I have at each base
+        self.units = UnitStore({"ntanks": 0, "nships": 0})
+
+        # Which enemy base each of my vehicles goes for
+        self.targets = TargetAssigner()
+        self.paths = PathPlanner()
 
-        self.targets = defaultdict(lambda: None)
+        # Per-phase timings, only collected when profiling is switched on
+        self.profiler = PhaseProfiler(CREATOR)
+        # Seeded random numbers, the match runner sets the seed
+        self.rng = BotRandom(CREATOR)
 
     def get_distance(self, obj1, obj2):
         return math.dist(obj1.position, obj2.position)
 
-    def get_nearest_enemy_base(self, my_bases, enemy_bases):
-        nearest_enemy_base = None
-        min_distance = float("inf")
-        for my_base in my_bases:
-            for enemy_base in enemy_bases:
-                distance = self.get_distance(my_base, enemy_base)
-                if distance < min_distance:
-                    nearest_enemy_base = enemy_base
-                    min_distance = distance
-        return nearest_enemy_base
-
-    def attack_or_retreat(self, vehicle, target):
+    def attack_or_retreat(self, vehicle, kind, target):
         distance_to_target = self.get_distance(vehicle, target)
         if distance_to_target <= 10:  # Attack when within 10 units of the target
-            vehicle.attack(*target.position)
+            # Vehicles fire on their own, so just close in
             vehicle.goto(*target.position)
         elif vehicle.health < 50:  # Retreat when health drops below 50
-            vehicle.goto(vehicle.owner.x, vehicle.owner.y)
+            # Jets fly over everything, tanks and ships need a way around the terrain
+            home = vehicle.owner.position
+            if kind == "jets" or not self.paths.steer(vehicle, kind, home):
+                vehicle.goto(*home)
         else:
-            vehicle.set_heading(np.random.random() * 360.0)
+            vehicle.set_heading(self.rng.heading())
 
+    @recorded
+    @profiled
     def run(self, t: float, dt: float, info: dict, game_map: np.ndarray):
+        self.profiler.begin("perceive")
         myinfo = info[self.team]
+        self.map.update(game_map)
+        self.paths.update(self.map)
+        units = [unit for kind in ("bases", "tanks", "ships", "jets") for unit in myinfo.get(kind, [])]
+        self.paths.forget(self.units.update([unit.uid for unit in units], [unit.position for unit in units]))
 
         # Controlling my bases
+        self.profiler.begin("build")
         for base in myinfo["bases"]:
-            if base.uid not in self.ntanks:
-                self.ntanks[base.uid] = 0
-            if base.uid not in self.nships:
-                self.nships[base.uid] = 0
-
             if base.mines < 3 and base.crystal > base.cost("mine"):
                 base.build_mine()
-            elif base.crystal > base.cost("tank") and self.ntanks[base.uid] < 5:
-                tank_uid = base.build_tank(heading=360 * np.random.random())
-                self.ntanks[base.uid] += 1
-            elif base.crystal > base.cost("ship") and self.nships[base.uid] < 3:
-                ship_uid = base.build_ship(heading=360 * np.random.random())
-                self.nships[base.uid] += 1
+            elif base.crystal > base.cost("tank") and self.units.get(base.uid, "ntanks") < 5:
+                tank_uid = base.build_tank(heading=self.rng.heading())
+                self.units.add(base.uid, "ntanks")
+            elif base.crystal > base.cost("ship") and self.units.get(base.uid, "nships") < 3:
+                ship_uid = base.build_ship(heading=self.rng.heading())
+                self.units.add(base.uid, "nships")
             elif base.crystal > base.cost("jet"):
-                jet_uid = base.build_jet(heading=360 * np.random.random())
-
-            if "bases" in info and len(info) > 1:
-                enemy_bases = [b for name, team_info in info.items() if name != self.team for b in team_info["bases"]]
-                target = self.get_nearest_enemy_base(myinfo["bases"], enemy_bases)
-                self.targets[base.uid] = target
+                jet_uid = base.build_jet(heading=self.rng.heading())
 
+        # Spread my vehicles over the enemy bases in sight, each goes for the one
+        # it can reach and destroy soonest
+        world = WorldSnapshot(info, self.team, game_map.shape)
+        vehicle_rows = np.r_[world.mine("tanks"), world.mine("ships"), world.mine("jets")]
+        targets = self.targets.assign_rows(world, vehicle_rows, world.enemy("bases"))
+        objects = dict(zip(world.uids, world.objects))
 
         vehicles = []
 
         if "tanks" in myinfo:
-            vehicles += myinfo["tanks"]
+            vehicles += [("tanks", tank) for tank in myinfo["tanks"]]
 
         if "ships" in myinfo:
-            vehicles += myinfo["ships"]
+            vehicles += [("ships", ship) for ship in myinfo["ships"]]
 
         if "jets" in myinfo:
-            vehicles += myinfo["jets"]
+            vehicles += [("jets", jet) for jet in myinfo["jets"]]
 
         # Controlling my vehicles
-        for vehicle in vehicles:
-            if vehicle.uid in self.previous_positions and not vehicle.stopped:
-                if all(vehicle.position == self.previous_positions[vehicle.uid]):
-                    vehicle.set_heading(np.random.random() * 360.0)
+        for kind, vehicle in vehicles:
+            self.profiler.begin(kind)
+            if self.units.is_tracked(vehicle.uid) and not vehicle.stopped:
+                if self.units.is_stationary(vehicle.uid):
+                    vehicle.set_heading(self.rng.heading())
                 else:
-                    target = self.targets[vehicle.owner.uid]
-                    if target is not None:
-                        self.attack_or_retreat(vehicle, target)
-
-            self.previous_positions[vehicle.uid] = vehicle.position
+                    if vehicle.uid in targets:
+                        self.attack_or_retreat(vehicle, kind, objects[targets[vehicle.uid]])
@@ -0,0 +1,451 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import itertools
+import time
+import traceback
+import numpy as np
+
+from .geometry import torus_delta, torus_distance
+from .spatial import SpatialHash
+
+VEHICLE_KINDS = ("tanks", "ships", "jets")
+COSTS = {"mine": 1000, "tank": 500, "ship": 2000, "jet": 4000}
+STATS = {
+    "tanks": {"speed": 10.0, "health": 50.0, "attack": 20.0},
+    "ships": {"speed": 5.0, "health": 80.0, "attack": 10.0},
+    "jets": {"speed": 20.0, "health": 50.0, "attack": 30.0},
+}
+BASE_HEALTH = 100.0
+START_CRYSTAL = 1000.0
+# Crystal per second of a base, and per mine in it
+CRYSTAL_RATE = 10.0
+MINE_RATE = 50.0
+VIEW_RADIUS = 40.0
+COMBAT_RADIUS = 5.0
+# How far from land a ship may be to turn into a base
+CONVERT_RADIUS = 3
+
+
+def make_map(nx: int, ny: int, rng: np.random.Generator, land: float = 0.4,
+             feature_size: int = 16) -> np.ndarray:
+  """
+  Random islands and continents on a wrapped map: coarse noise is scaled up,
+  smoothed with wrapping box blurs, and its highest `land` fraction becomes
+  land (1), the rest water (0).
+  """
+  coarse = rng.random((-(-ny // feature_size), -(-nx // feature_size)))
+  noise = np.repeat(np.repeat(coarse, feature_size, axis=0), feature_size, axis=1)[:ny, :nx]
+  for _ in range(3):
+    for axis in (0, 1):
+      noise = sum(np.roll(noise, shift, axis=axis) for shift in range(-4, 5)) / 9
+  return (noise > np.quantile(noise, 1 - land)).astype(int)
+
+
+class Base:
+  """A base with the attributes and build methods the bots use."""
+
+  def __init__(self, engine: "Engine", team: str, number: int, x: float, y: float):
+    self._engine = engine
+    self.team = team
+    self.number = number
+    self.x = float(x)
+    self.y = float(y)
+    self.uid = engine.new_uid()
+    self.mines = 0
+    self.crystal = START_CRYSTAL
+    self.health = BASE_HEALTH
+
+  @property
+  def position(self) -> np.ndarray:
+    return np.array([self.x, self.y])
+
+  def get_position(self) -> np.ndarray:
+    return self.position
+
+  def cost(self, kind: str) -> float:
+    return COSTS[kind]
+
+  def _pay(self, kind: str) -> bool:
+    if self.crystal < COSTS[kind]:
+      return False
+    self.crystal -= COSTS[kind]
+    return True
+
+  def build_mine(self):
+    if self._pay("mine"):
+      self.mines += 1
+
+  def build_tank(self, heading: float = 0):
+    if self._pay("tank"):
+      return self._engine.add_vehicle(self, "tanks", heading).uid
+
+  def build_ship(self, heading: float = 0):
+    if self._pay("ship"):
+      return self._engine.add_vehicle(self, "ships", heading).uid
+
+  def build_jet(self, heading: float = 0):
+    if self._pay("jet"):
+      return self._engine.add_vehicle(self, "jets", heading).uid
+
+
+class Vehicle:
+  """
+  A tank, ship or jet. Its state lives in a slot of the engine's arrays, so
+  that the engine can move all vehicles at once.
+  """
+
+  def __init__(self, engine: "Engine", kind: str, owner: Base, slot: int):
+    self._engine = engine
+    self._slot = slot
+    self.kind = kind
+    self.owner = owner
+    self.team = owner.team
+    self.number = owner.number
+    self.uid = engine.new_uid()
+    self.speed = STATS[kind]["speed"]
+    self.attack = STATS[kind]["attack"]
+
+  @property
+  def x(self) -> float:
+    return float(self._engine.position[self._slot, 0])
+
+  @property
+  def y(self) -> float:
+    return float(self._engine.position[self._slot, 1])
+
+  @property
+  def position(self) -> np.ndarray:
+    return self._engine.position[self._slot].copy()
+
+  @property
+  def heading(self) -> float:
+    return float(self._engine.heading[self._slot])
+
+  @property
+  def vector(self) -> np.ndarray:
+    angle = np.radians(self.heading)
+    return np.array([np.cos(angle), np.sin(angle)])
+
+  @property
+  def health(self) -> float:
+    return float(self._engine.health[self._slot])
+
+  @property
+  def stopped(self) -> bool:
+    return bool(self._engine.stopped[self._slot])
+
+  def get_position(self) -> np.ndarray:
+    return self.position
+
+  def get_heading(self) -> float:
+    return self.heading
+
+  def set_heading(self, angle: float) -> None:
+    self._engine.heading[self._slot] = float(angle) % 360
+
+  def get_vector(self) -> np.ndarray:
+    return self.vector
+
+  def set_vector(self, vector) -> None:
+    self.set_heading(np.degrees(np.arctan2(vector[1], vector[0])))
+
+  def goto(self, x: float, y: float) -> None:
+    self.set_vector(torus_delta(self._engine.position[self._slot], (x, y), self._engine.size))
+
+  def stop(self) -> None:
+    self._engine.stopped[self._slot] = True
+
+  def start(self) -> None:
+    self._engine.stopped[self._slot] = False
+
+  def get_distance(self, x: float, y: float, shortest: bool = True) -> float:
+    position = self._engine.position[self._slot]
+    if shortest:
+      return float(torus_distance(position, (x, y), self._engine.size))
+    return float(np.hypot(x - position[0], y - position[1]))
+
+  def convert_to_base(self):
+    """Turn the ship into a base if it is next to land, returns the base uid or None."""
+    if self.kind != "ships":
+      return None
+    base = self._engine.convert(self)
+    return None if base is None else base.uid
+
+
+class Engine:
+  """
+  Headless stand-in for the game engine, to run and profile bots offline.
+
+  Bases are plain objects; all vehicles of all teams live in preallocated
+  arrays (position, heading, health, ...) and are moved and fight in a few
+  array operations per tick, so the engine itself takes a small fraction of
+  the time of the bots. Tanks cannot drive from land into water and ships
+  cannot sail from water onto land; jets fly anywhere. With fog on, each team
+  only sees the tiles and enemies within VIEW_RADIUS of its units, and
+  unknown tiles are -1 in its game_map.
+
+  Exceptions raised by a bot are caught and counted in `errors`, the way the
+  tournament keeps going when a bot crashes; `last_error` keeps the last
+  traceback of each team.
+  """
+
+  def __init__(self, players: list, nx: int = 256, ny: int = 128, game_map: np.ndarray = None,
+               dt: float = 0.1, fog: bool = True, seed: int = None, capacity: int = 256):
+    self.rng = np.random.default_rng(seed)
+    self.game_map = make_map(nx, ny, self.rng) if game_map is None else np.asarray(game_map)
+    ny, nx = self.game_map.shape
+    self.size = np.array([nx, ny], dtype=float)
+    self.dt = dt
+    self.t = 0.0
+    self.ticks = 0
+    self.fog = fog
+
+    self.players = {}
+    for player in players:
+      if player.team in self.players:
+        raise ValueError(f"two players are called {player.team!r}")
+      self.players[player.team] = player
+      # Bots with their own generator (see randomness.py) play the same with the same seed
+      if seed is not None and hasattr(player, "rng"):
+        player.rng.seed(seed)
+    self.teams = list(self.players)
+    self.errors = dict.fromkeys(self.teams, 0)
+    self.last_error = {}
+    self.bot_time = dict.fromkeys(self.teams, 0.0)
+
+    self._uids = itertools.count()
+    self.bases = {team: [] for team in self.teams}
+    self.vehicles = {team: {kind: [] for kind in VEHICLE_KINDS} for team in self.teams}
+
+    self._objects = [None] * capacity
+    self._free = list(range(capacity - 1, -1, -1))
+    self.position = np.zeros((capacity, 2))
+    self.heading = np.zeros(capacity)
+    self.speed = np.zeros(capacity)
+    self.health = np.zeros(capacity)
+    self.attack = np.zeros(capacity)
+    self.stopped = np.zeros(capacity, dtype=bool)
+    self.alive = np.zeros(capacity, dtype=bool)
+    self.kind = np.zeros(capacity, dtype=np.int8)
+    self.team_index = np.zeros(capacity, dtype=np.int16)
+
+    # Fog is revealed by blocks of tiles, the views are copied on change only
+    self._block = 8
+    blocks = (-(-ny // self._block), -(-nx // self._block))
+    self._seen = {team: np.zeros(blocks, dtype=bool) for team in self.teams}
+    self._views = {team: np.full((ny, nx), -1) if fog else self.game_map.copy() for team in self.teams}
+
+    for team, (x, y) in zip(self.teams, self._start_positions(len(self.teams))):
+      self.add_base(team, x + 0.5, y + 0.5)
+
+  def new_uid(self) -> str:
+    return str(next(self._uids))
+
+  def _start_positions(self, count: int) -> list:
+    """Land tiles for the first bases, each the farthest from those before it."""
+    ys, xs = np.nonzero(self.game_map == 1)
+    tiles = np.stack([xs, ys], axis=1).astype(float)
+    # A sample of the land is plenty to spread the bases, even on large maps
+    tiles = tiles[self.rng.choice(len(tiles), min(len(tiles), 4096), replace=False)]
+    chosen = [tiles[self.rng.integers(len(tiles))]]
+    for _ in range(count - 1):
+      distances = torus_distance(tiles[:, None], np.array(chosen)[None], self.size).min(axis=1)
+      chosen.append(tiles[np.argmax(distances)])
+    return chosen
+
+  def _grow(self) -> None:
+    capacity = len(self._objects)
+    self._objects += [None] * capacity
+    self._free += range(2 * capacity - 1, capacity - 1, -1)
+    for name in ("position", "heading", "speed", "health", "attack", "stopped", "alive", "kind",
+                 "team_index"):
+      values = getattr(self, name)
+      setattr(self, name, np.concatenate([values, np.zeros_like(values)]))
+
+  def add_base(self, team: str, x: float, y: float) -> Base:
+    base = Base(self, team, self.teams.index(team), x, y)
+    self.bases[team].append(base)
+    return base
+
+  def add_vehicle(self, base: Base, kind: str, heading: float) -> Vehicle:
+    if not self._free:
+      self._grow()
+    slot = self._free.pop()
+    vehicle = Vehicle(self, kind, base, slot)
+    self._objects[slot] = vehicle
+    self.position[slot] = base.x, base.y
+    self.heading[slot] = float(heading) % 360
+    self.speed[slot] = vehicle.speed
+    self.health[slot] = STATS[kind]["health"]
+    self.attack[slot] = vehicle.attack
+    self.stopped[slot] = False
+    self.alive[slot] = True
+    self.kind[slot] = VEHICLE_KINDS.index(kind)
+    self.team_index[slot] = self.teams.index(base.team)
+    self.vehicles[base.team][kind].append(vehicle)
+    return vehicle
+
+  def remove_vehicle(self, vehicle: Vehicle) -> None:
+    slot = vehicle._slot
+    self.alive[slot] = False
+    self._objects[slot] = None
+    self._free.append(slot)
+    self.vehicles[vehicle.team][vehicle.kind].remove(vehicle)
+
+  def convert(self, ship: Vehicle):
+    x, y = np.floor(ship.position).astype(int)
+    ny, nx = self.game_map.shape
+    offsets = np.arange(-CONVERT_RADIUS, CONVERT_RADIUS + 1)
+    window = self.game_map[np.ix_((y + offsets) % ny, (x + offsets) % nx)]
+    if not (window == 1).any():
+      return None
+    base = self.add_base(ship.team, ship.x, ship.y)
+    self.remove_vehicle(ship)
+    return base
+
+  def nearest(self, points: np.ndarray, targets: np.ndarray) -> tuple:
+    """Distance to and index of the nearest target of each point."""
+    if len(points) * len(targets) > 1 << 16:
+      return SpatialHash(targets, self.size).nearest(points)
+    distances = torus_distance(points[:, None], targets[None], self.size)
+    nearest = distances.argmin(axis=1)
+    return distances[np.arange(len(points)), nearest], nearest
+
+  def info(self, team: str) -> dict:
+    """The info dict handed to the bot of a team: its own units and the enemies it can see."""
+    info = {}
+    if self.fog:
+      eyes = self._team_positions(team)
+
+    for name in self.teams:
+      objects = {"bases": self.bases[name]}
+      objects.update(self.vehicles[name])
+      if name != team and self.fog:
+        for kind, group in objects.items():
+          if group and len(eyes):
+            distances = self.nearest(np.array([(obj.x, obj.y) for obj in group]), eyes)[0]
+            objects[kind] = [obj for obj, distance in zip(group, distances) if distance <= VIEW_RADIUS]
+          else:
+            objects[kind] = []
+      objects = {kind: group for kind, group in objects.items() if group}
+      if objects or name == team:
+        info[name] = objects
+    return info
+
+  def _team_positions(self, team: str) -> np.ndarray:
+    index = self.teams.index(team)
+    vehicles = self.position[self.alive & (self.team_index == index)]
+    bases = np.array([(base.x, base.y) for base in self.bases[team]]).reshape(-1, 2)
+    return np.concatenate([bases, vehicles])
+
+  def view(self, team: str) -> np.ndarray:
+    """The game_map of a team, with the tiles it has not seen yet at -1."""
+    if not self.fog:
+      return self._views[team]
+    seen = self._seen[team]
+    positions = self._team_positions(team)
+    reach = int(np.ceil(VIEW_RADIUS / self._block))
+    offsets = np.arange(-reach, reach + 1)
+    blocks = (positions // self._block).astype(int)
+    rows = (blocks[:, 1, None, None] + offsets[None, :, None]) % seen.shape[0]
+    cols = (blocks[:, 0, None, None] + offsets[None, None, :]) % seen.shape[1]
+    revealed = np.zeros_like(seen)
+    revealed[rows, cols] = True
+    if (revealed & ~seen).any():
+      seen |= revealed
+      ny, nx = self.game_map.shape
+      mask = np.repeat(np.repeat(seen, self._block, axis=0), self._block, axis=1)[:ny, :nx]
+      self._views[team] = np.where(mask, self.game_map, -1)
+    return self._views[team]
+
+  def alive_teams(self) -> list:
+    return [team for team in self.teams
+            if self.bases[team] or any(self.vehicles[team].values())]
+
+  def step(self) -> None:
+    """One tick: every live bot runs, then the world moves and fights."""
+    for team in self.alive_teams():
+      if not self.bases[team]:
+        continue
+      info = self.info(team)
+      game_map = self.view(team)
+      start = time.perf_counter()
+      try:
+        self.players[team].run(self.t, self.dt, info, game_map)
+      except Exception:
+        self.errors[team] += 1
+        self.last_error[team] = traceback.format_exc()
+      self.bot_time[team] += time.perf_counter() - start
+
+    for bases in self.bases.values():
+      for base in bases:
+        base.crystal += self.dt * (CRYSTAL_RATE + MINE_RATE * base.mines)
+
+    self.move()
+    self.fight()
+    self.t += self.dt
+    self.ticks += 1
+
+  def move(self) -> None:
+    moving = np.flatnonzero(self.alive & ~self.stopped)
+    if len(moving) == 0:
+      return
+    angle = np.radians(self.heading[moving])
+    step = (self.speed[moving] * self.dt)[:, None] * np.stack([np.cos(angle), np.sin(angle)], axis=1)
+    start = self.position[moving]
+    end = (start + step) % self.size
+
+    ny, nx = self.game_map.shape
+    here = self.game_map[start[:, 1].astype(int) % ny, start[:, 0].astype(int) % nx]
+    there = self.game_map[end[:, 1].astype(int) % ny, end[:, 0].astype(int) % nx]
+    kind = self.kind[moving]
+    blocked = (((kind == VEHICLE_KINDS.index("tanks")) & (here == 1) & (there == 0))
+               | ((kind == VEHICLE_KINDS.index("ships")) & (here == 0) & (there == 1)))
+    self.position[moving[~blocked]] = end[~blocked]
+
+  def fight(self) -> None:
+    """Every vehicle damages the closest enemy unit within COMBAT_RADIUS."""
+    vehicles = np.flatnonzero(self.alive)
+    if len(vehicles) == 0:
+      return
+    bases = [base for team in self.teams for base in self.bases[team]]
+    base_positions = np.array([(base.x, base.y) for base in bases]).reshape(-1, 2)
+    base_teams = np.array([self.teams.index(base.team) for base in bases], dtype=np.int16)
+    positions = np.concatenate([self.position[vehicles], base_positions])
+    teams = np.concatenate([self.team_index[vehicles], base_teams])
+
+    damage = np.zeros(len(positions))
+    for index in np.unique(self.team_index[vehicles]):
+      attackers = vehicles[self.team_index[vehicles] == index]
+      targets = np.flatnonzero(teams != index)
+      if len(targets) == 0:
+        continue
+      distances, nearest = self.nearest(self.position[attackers], positions[targets])
+      hit = distances <= COMBAT_RADIUS
+      np.add.at(damage, targets[nearest[hit]], self.attack[attackers[hit]] * self.dt)
+
+    self.health[vehicles] -= damage[:len(vehicles)]
+    for slot in vehicles[self.health[vehicles] <= 0]:
+      self.remove_vehicle(self._objects[slot])
+    for base, hit in zip(bases, damage[len(vehicles):]):
+      base.health -= hit
+      if base.health <= 0:
+        self.bases[base.team].remove(base)
+
+  def run(self, ticks: int) -> dict:
+    """Run up to `ticks` ticks (fewer if one team is left), returns timing stats."""
+    start = time.perf_counter()
+    first_tick = self.ticks
+    bot_time = sum(self.bot_time.values())
+    for _ in range(ticks):
+      if len(self.alive_teams()) < 2:
+        break
+      self.step()
+    elapsed = time.perf_counter() - start
+    return {
+        "ticks": self.ticks - first_tick,
+        "elapsed": elapsed,
+        "engine_time": elapsed - (sum(self.bot_time.values()) - bot_time),
+        "bot_time": dict(self.bot_time),
+        "errors": dict(self.errors),
+    }
@@ -0,0 +1,158 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from .assignment import TargetAssigner, cost_matrix
+from .flowfield import neighbour_indices
+from .mapstate import MapState
+from .snapshot import WorldSnapshot
+
+
+def frontier_mask(game_map: np.ndarray) -> np.ndarray:
+  """Known tiles with at least one unknown (-1) tile among their 8 neighbours, wrapped."""
+  unknown = game_map == -1
+  near_unknown = np.zeros_like(unknown)
+  for dy in (-1, 0, 1):
+    for dx in (-1, 0, 1):
+      if dy or dx:
+        near_unknown |= np.roll(unknown, (dy, dx), axis=(0, 1))
+  return ~unknown & near_unknown
+
+
+class FrontierPlanner:
+  """
+  Sends ships and jets to the edge of the explored part of the map.
+
+  The frontier (known tiles next to unknown ones) is kept as a mask and as
+  per-cluster counts and coordinate sums over a grid of cell_size tiles,
+  one layer for all frontier tiles (jets) and one for those on water
+  (ships). update() only looks again at the tiles that changed since the
+  previous update and at their neighbours, so a tick costs in proportion to
+  what was revealed. Each cluster is targeted at its frontier tile closest
+  to their mean, the mean itself may be on land or still unknown; clusters
+  never straddle the wrap, so the plain mean is the wrapped one. Targets are
+  kept between ticks and only looked for again, within the cluster's cell,
+  for the clusters whose frontier changed. assign()
+  then spreads the explorers of a kind over the clusters, one each, by
+  travel time with a warm-started auction.
+  """
+
+  KINDS = ("jets", "ships")
+
+  def __init__(self, cell_size: int = 16):
+    self.cell_size = cell_size
+    self.frontier = None
+    self.counts = None
+    self.sums = None
+    self.known = 0
+    self.shape = None
+    self._game_map = None
+    self._version = 0
+    self._targets = None
+    self._stale = None
+    self._assigners = {kind: TargetAssigner() for kind in self.KINDS}
+
+  def _cluster(self, tiles: np.ndarray) -> np.ndarray:
+    nx = self.shape[1]
+    gx = -(-nx // self.cell_size)
+    y, x = np.divmod(tiles, nx)
+    return (y // self.cell_size) * gx + x // self.cell_size
+
+  def _add(self, tiles: np.ndarray, values: np.ndarray, sign: int) -> None:
+    """Add (sign 1) or take out (-1) frontier tiles with the given map values of the cluster counts and sums."""
+    y, x = np.divmod(tiles, self.shape[1])
+    clusters = self._cluster(tiles)
+    for layer, selected in enumerate((np.ones(len(tiles), dtype=bool), values == 0)):
+      np.add.at(self.counts[layer], clusters[selected], sign)
+      np.add.at(self.sums[layer], clusters[selected], sign * np.stack([x[selected], y[selected]], axis=1))
+      self._stale[layer, clusters[selected]] = True
+
+  def update(self, map_state: MapState) -> None:
+    if self._version == map_state.version:
+      return
+    game_map = self._game_map = map_state.game_map
+    changes = map_state.changes_since(self._version)
+    self._version = map_state.version
+    if changes is None:
+      ny, nx = self.shape = game_map.shape
+      clusters = -(-ny // self.cell_size) * -(-nx // self.cell_size)
+      self.counts = np.zeros((len(self.KINDS), clusters), dtype=np.int64)
+      self.sums = np.zeros((len(self.KINDS), clusters, 2))
+      self._targets = np.zeros((len(self.KINDS), clusters, 2), dtype=np.int64)
+      self._stale = np.ones((len(self.KINDS), clusters), dtype=bool)
+      self.frontier = frontier_mask(game_map)
+      tiles = np.flatnonzero(self.frontier)
+      self._add(tiles, game_map.ravel()[tiles], 1)
+      self.known = int((game_map != -1).sum())
+      return
+
+    changed, previous = changes
+    neighbours, _ = neighbour_indices(changed, game_map.shape)
+    tiles = np.unique(np.concatenate([changed, neighbours.ravel()]))
+
+    # The tiles around a change are taken out with what they were and put
+    # back with what they are now
+    flat = self.frontier.ravel()
+    values = game_map.ravel()[tiles]
+    old = values.copy()
+    old[np.searchsorted(tiles, changed)] = previous
+    self._add(tiles[flat[tiles]], old[flat[tiles]], -1)
+    around, _ = neighbour_indices(tiles, game_map.shape)
+    flat[tiles] = (values != -1) & (game_map.ravel()[around] == -1).any(axis=1)
+    self._add(tiles[flat[tiles]], values[flat[tiles]], 1)
+    self.known += int((game_map.ravel()[changed] != -1).sum() - (previous != -1).sum())
+
+  @property
+  def coverage(self) -> float:
+    """Share of the map that is known."""
+    return self.known / (self.shape[0] * self.shape[1]) if self.shape is not None else 0.0
+
+  def _retarget(self, layer: int, clusters: np.ndarray) -> None:
+    """Find the target tiles of the given clusters again, from the tiles of their cells."""
+    ny, nx = self.shape
+    cell = self.cell_size
+    cy, cx = np.divmod(clusters, -(-nx // cell))
+    dy, dx = np.divmod(np.arange(cell * cell), cell)
+    y, x = cy[:, None] * cell + dy, cx[:, None] * cell + dx
+    # Row-major within a cell, as in the map, so ties go the same way
+    inside = (y < ny) & (x < nx)
+    owner = np.repeat(np.arange(len(clusters)), cell * cell)[inside.ravel()]
+    y, x = y[inside], x[inside]
+    tiles = y * nx + x
+    keep = self.frontier.ravel()[tiles]
+    if self.KINDS[layer] == "ships":
+      keep &= self._game_map.ravel()[tiles] == 0
+    owner, y, x = owner[keep], y[keep], x[keep]
+
+    mean = self.sums[layer, clusters] / np.maximum(self.counts[layer, clusters], 1)[:, None]
+    offset = (x - mean[owner, 0]) ** 2 + (y - mean[owner, 1]) ** 2
+    # Tiles by cluster then by offset, the first of each cluster is its target
+    order = np.lexsort((offset, owner))
+    first = order[np.r_[True, np.diff(owner[order]) != 0]] if len(order) else order
+    self._targets[layer, clusters[owner[first]]] = np.stack([x[first], y[first]], axis=1)
+
+  def clusters(self, kind: str) -> tuple:
+    """Ids, (n, 2) target points and frontier tile counts of the clusters explorers of a kind can go to."""
+    layer = self.KINDS.index(kind)
+    ids = np.flatnonzero(self.counts[layer] > 0)
+    stale = ids[self._stale[layer, ids]]
+    if len(stale):
+      self._retarget(layer, stale)
+    self._stale[layer] = False
+    return ids, self._targets[layer, ids] + 0.5, self.counts[layer, ids]
+
+  def assign(self, uids: list, positions: np.ndarray, speeds: np.ndarray, kind: str) -> dict:
+    """Point every explorer of a kind goes to, for those that get a cluster."""
+    if self.shape is None or not len(uids):
+      return {}
+    ids, centers, counts = self.clusters(kind)
+    ny, nx = self.shape
+    cost = cost_matrix(positions, centers, np.array([nx, ny]), speeds, np.ones(len(uids)), np.zeros(len(ids)))
+    targets = self._assigners[kind].assign(list(uids), ids.tolist(), cost)
+    center = dict(zip(ids.tolist(), centers))
+    return {uid: center[cluster] for uid, cluster in targets.items()}
+
+  def assign_rows(self, world: WorldSnapshot, rows, kind: str) -> dict:
+    """assign() for explorers given as rows of the snapshot."""
+    rows = np.arange(len(world.uids))[rows]
+    return self.assign([world.uids[row] for row in rows], world.position[rows], world.speed[rows], kind)
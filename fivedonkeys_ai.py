@@ -4,11 +4,30 @@ from collections import defaultdict
 from typing import Sequence, Union
 import numpy as np
 
-from supremacy.tools import distance_on_torus
+from .exploration import FrontierPlanner
+from .mapstate import MapState
+from .params import load_params
+from .profiling import PhaseProfiler, profiled
+from .randomness import BotRandom
+from .replay import recorded
+from .snapshot import WorldSnapshot
+from .spatial import SpatialHash
+from .tracking import MotionTracker
+from .units import UnitStore
 
 # This is your team name
 CREATOR = "5donkeys"
 
+# Build and behavior constants (see params.SCHEMA), tuned values are loaded
+# from the parameters file at startup
+PARAMS = {
+  "max_mines": 3,
+  "min_tanks": 5,
+  "min_ships": 4,
+  "min_base_ship_distance": 20.0,
+  "home_distance": 400.0,
+}
+
 # def plot_line(x0, y0, x1, y1):
 #   dx = x1 - x0
 #   dy = y1 - y0
@@ -44,18 +63,28 @@ class PlayerAi:
 
   def __init__(self):
     self.team = CREATOR  # Mandatory attribute
-
-    # Record the previous positions of all my vehicles
-    self.previous_positions = {}
-    # Record the number of tanks and ships I have at each base
-    self.ntanks = {}
-    self.nships = {}
-    self.njets = {}
-    self.ship_headings = {}
+    self.params = load_params(__name__, PARAMS)
+
+    # This tick's map, with a version and the tiles that changed
+    self.map = MapState()
+    # Record the previous positions of all my vehicles, and the number of
+    # tanks, ships and jets and the build heading of each base
+    self.units = UnitStore({"ntanks": 0, "nships": 0, "njets": 0, "heading": np.nan})
+    # Recent positions of the enemy vehicles, to lead moving targets
+    self.tracker = MotionTracker()
+    # Where my ships and jets go to see more of the map
+    self.explore = FrontierPlanner()
+
+    # Per-phase timings, only collected when profiling is switched on
+    self.profiler = PhaseProfiler(CREATOR)
+    # Seeded random numbers, the match runner sets the seed
+    self.rng = BotRandom(CREATOR)
 
     # self.defense = set()
     # self.offense = set()
 
+  @recorded
+  @profiled
   def run(self, t: float, dt: float, info: dict, game_map: np.ndarray):
     """
         This is the main function that will be called by the game engine.
@@ -89,6 +118,35 @@ class PlayerAi:
     # Get information about my team
     myinfo = info[self.team]
 
+    self.profiler.begin("perceive")
+    world = WorldSnapshot(info, self.team, game_map.shape)
+    my_rows = world.my_rows()
+    self.units.update([world.uids[row] for row in my_rows], world.position[my_rows])
+
+    enemy_bases = world.objects_in(world.enemy("bases"))
+    enemy_tanks = world.objects_in(world.enemy("tanks"))
+    enemy_ships = world.objects_in(world.enemy("ships"))
+    enemy_jets = world.objects_in(world.enemy("jets"))
+
+    enemy_vehicles = enemy_tanks + enemy_ships + enemy_jets
+    enemy_entities = enemy_bases + enemy_vehicles
+    enemy_vehicle_rows = np.r_[world.enemy("tanks"), world.enemy("ships"), world.enemy("jets")]
+    enemy_vehicle_index = SpatialHash(world.position[enemy_vehicle_rows], world.size)
+    self.tracker.update(t, [world.uids[row] for row in enemy_vehicle_rows], world.position[enemy_vehicle_rows],
+                        world.size)
+
+    target = None
+    if len(enemy_entities) >= 1:
+      target = [enemy_entities[0].x, enemy_entities[0].y]
+
+    # Ships, and jets when there is no enemy in sight, head for the
+    # closest unexplored parts of the map, one part each
+    self.map.update(game_map)
+    self.explore.update(self.map)
+    explore_positions = self.explore.assign_rows(world, world.mine("ships"), "ships")
+    if target is None:
+      explore_positions.update(self.explore.assign_rows(world, world.mine("jets"), "jets"))
+
     # Controlling my bases =================================================
 
     # Description of information available on bases:
@@ -120,41 +178,35 @@ class PlayerAi:
     base_positions = [[base.x, base.y] for base in myinfo["bases"]]
 
     # Iterate through all my bases (vehicles belong to bases)
+    self.profiler.begin("build")
     for base in myinfo["bases"]:
-      # If this is a new base, initialize the tank, ship and jet counters
-      if base.uid not in self.ntanks:
-        self.ntanks[base.uid] = 0
-      if base.uid not in self.nships:
-        self.nships[base.uid] = 0
-      if base.uid not in self.njets:
-        self.njets[base.uid] = 0
-      if base.uid not in self.ship_headings:
-        self.ship_headings[base.uid] = to_heading(
-            np.flip(np.add.reduce(base_positions)))
+      # If this is a new base, initialize its build heading
+      if np.isnan(self.units.get(base.uid, "heading")):
+        self.units.set(base.uid, "heading", to_heading(
+            np.flip(np.add.reduce(base_positions))))
       # Firstly, each base should build a mine if it has less than 3 mines
-      if base.mines < 3:
+      if base.mines < self.params.max_mines:
         if base.crystal > base.cost("mine"):
           base.build_mine()
       # Secondly, each base should build a tank if it has less than 5 tanks
-      elif base.crystal > base.cost("tank") and self.ntanks[base.uid] < 5:
+      elif base.crystal > base.cost("tank") and self.units.get(base.uid, "ntanks") < self.params.min_tanks:
         # build_tank() returns the uid of the tank that was built
-        tank_uid = base.build_tank(heading=self.ship_headings[base.uid])
+        tank_uid = base.build_tank(heading=self.units.get(base.uid, "heading"))
         # Add 1 to the tank counter for this base
-        self.ntanks[base.uid] += 1
+        self.units.add(base.uid, "ntanks")
       # Thirdly, each base should build a ship if it has less than 3 ships
-      elif base.crystal > base.cost("ship") and self.nships[base.uid] < 4:
+      elif base.crystal > base.cost("ship") and self.units.get(base.uid, "nships") < self.params.min_ships:
         # build_ship() returns the uid of the ship that was built
-        self.ship_headings[base.uid] += 90
-        self.ship_headings[base.uid] %= 360
-        ship_uid = base.build_ship(heading=self.ship_headings[base.uid])
+        self.units.set(base.uid, "heading", (self.units.get(base.uid, "heading") + 90) % 360)
+        ship_uid = base.build_ship(heading=self.units.get(base.uid, "heading"))
         # Add 1 to the ship counter for this base
-        self.nships[base.uid] += 1
+        self.units.add(base.uid, "nships")
       # If everything else is satisfied, build a jet
       elif base.crystal > base.cost("jet"):
         # build_jet() returns the uid of the jet that was built
-        jet_uid = base.build_jet(heading=self.ship_headings[base.uid])
+        jet_uid = base.build_jet(heading=self.units.get(base.uid, "heading"))
         # Add 1 to the jet counter for this base
-        self.njets[base.uid] += 1
+        self.units.add(base.uid, "njets")
 
         # We want to start by creating defensive jets
         # if self.njets[base.uid] <= 5:
@@ -162,32 +214,6 @@ class PlayerAi:
         # else:
         #     self.offense.add(jet_uid)
 
-    enemy_bases = []
-    enemy_tanks = []
-    enemy_ships = []
-    enemy_jets  = []
-
-    if len(info) > 1:
-      for name in info:
-        if name == self.team:
-          continue
-
-        if "bases" in info[name]:
-          enemy_bases += info[name]["bases"]
-        if "tanks" in info[name]:
-          enemy_tanks += info[name]["tanks"]
-        if "ships" in info[name]:
-          enemy_ships += info[name]["ships"]
-        if "jets" in info[name]:
-          enemy_jets += info[name]["jets"]
-
-    enemy_vehicles = enemy_tanks + enemy_ships + enemy_jets
-    enemy_entities = enemy_bases + enemy_vehicles
-
-    target = None
-    if len(enemy_entities) >= 1:
-      target = [enemy_entities[0].x, enemy_entities[0].y]
-
     # Controlling my vehicles ==============================================
 
     # Description of information available on vehicles
@@ -234,60 +260,69 @@ class PlayerAi:
     # shortest path on the map (i.e. they may go through the map boundaries).
 
     # Iterate through all my tanks
+    self.profiler.begin("tanks")
     if "tanks" in myinfo:
+      # One random heading for every stuck tank, drawn at once
+      stuck = [tank.uid for tank in myinfo["tanks"] if self.units.is_stationary(tank.uid)]
+      stuck_headings = dict(zip(stuck, self.rng.headings(len(stuck)).tolist()))
       for tank in myinfo["tanks"]:
-        if (tank.uid in self.previous_positions) and (not tank.stopped):
+        if self.units.is_tracked(tank.uid) and (not tank.stopped):
           # If the tank position is the same as the previous position,
           # set a random heading
-          if all(tank.position == self.previous_positions[tank.uid]):
-            tank.set_heading(np.random.random() * 360.0)
+          if self.units.is_stationary(tank.uid):
+            tank.set_heading(stuck_headings[tank.uid])
           # Else, if there is a target, go to the target
           elif target is not None:
             tank.goto(*target)
-        # Store the previous position of this tank for the next time step
-        self.previous_positions[tank.uid] = tank.position
 
     # Iterate through all my ships
+    self.profiler.begin("ships")
     if "ships" in myinfo:
+      stuck = [ship.uid for ship in myinfo["ships"] if self.units.is_stationary(ship.uid)]
+      stuck_headings = dict(zip(stuck, self.rng.headings(len(stuck)).tolist()))
       for ship in myinfo["ships"]:
-        if ship.uid in self.previous_positions:
+        if self.units.is_tracked(ship.uid):
           # If the ship position is the same as the previous position,
           # convert the ship to a base if it is far from the owning base,
           # set a random heading otherwise
-          if all(ship.position == self.previous_positions[ship.uid]):
-            if ship.get_distance(ship.owner.x, ship.owner.y, False) > 20:
+          if self.units.is_stationary(ship.uid):
+            if ship.get_distance(ship.owner.x, ship.owner.y, False) > self.params.min_base_ship_distance:
               ship.convert_to_base()
             else:
-              self.ship_headings[ship.owner.uid] = 360 * np.random.random()
-              ship.set_heading(self.ship_headings[ship.owner.uid])
+              self.units.set(ship.owner.uid, "heading", stuck_headings[ship.uid])
+              ship.set_heading(self.units.get(ship.owner.uid, "heading"))
+          # Sail on to the unexplored part of the map assigned to the ship
+          elif ship.uid in explore_positions:
+            ship.goto(*explore_positions[ship.uid])
         # else:
         #     ship.set_vector(np.flip(np.add.reduce(base_positions)))
-        # Store the previous position of this ship for the next time step
-        self.previous_positions[ship.uid] = ship.position
 
     # Iterate through all my jets
+    self.profiler.begin("jets")
     if "jets" in myinfo:
-      for jet in myinfo["jets"]:
-        home_position = [jet.owner.x, jet.owner.y]
+      jets = myinfo["jets"]
+      jet_rows = np.arange(len(world.uids))[world.mine("jets")]
+      home_positions = np.array([(jet.owner.x, jet.owner.y) for jet in jets], dtype=float).reshape(-1, 2)
+
+      # Every jet chases the enemy vehicle closest to it or to its base,
+      # whichever is closer, and leads it; all jets at once
+      closest_intercepts = [None] * len(jets)
+      if len(enemy_vehicle_rows) > 0:
+        jet_distances, jet_closest = enemy_vehicle_index.nearest(world.position[jet_rows])
+        home_distances, home_closest = enemy_vehicle_index.nearest(home_positions)
+        closest_rows = enemy_vehicle_rows[np.where(jet_distances <= home_distances, jet_closest, home_closest)]
+        closest_intercepts = self.tracker.intercepts(
+            world.position[jet_rows], world.speed[jet_rows], [world.uids[row] for row in closest_rows],
+            world.position[closest_rows])
+
+      for jet, home_position, closest_intercept in zip(jets, home_positions, closest_intercepts):
         home_distance = jet.get_distance(*home_position, False)
 
-        closest_distance = None
-        closest_target = None
-        if len(enemy_vehicles) > 0:
-          for enemy in enemy_vehicles:
-            enemy_jet_distance = jet.get_distance(*enemy.position, False)
-            enemy_home_distance = distance_on_torus(*home_position, *enemy.position)
-
-            if (closest_distance is None) or min(enemy_jet_distance, enemy_home_distance) < closest_distance or enemy_jet_distance < enemy_home_distance:
-              closest_distance = min(enemy_jet_distance, enemy_home_distance)
-              closest_target = [enemy.x, enemy.y]
-
-        if home_distance > 400:
+        if home_distance > self.params.home_distance:
           jet.set_vector(home_position)
-        elif closest_target is not None:
-          jet.goto(*closest_target)
+        elif closest_intercept is not None:
+          jet.goto(*closest_intercept)
         elif target is not None:
           jet.goto(*target)
-
-        # Store the previous position of this jet for the next time step
-        self.previous_positions[jet.uid] = jet.position
+        elif jet.uid in explore_positions:
+          jet.goto(*explore_positions[jet.uid])
@@ -0,0 +1,257 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from .mapstate import MapState
+
+# 8-connected neighbour offsets (dx, dy), straight moves first so that they win
+# ties against diagonal ones.
+NEIGHBOURS = np.array([(1, 0), (0, 1), (-1, 0), (0, -1), (1, 1), (-1, 1), (-1, -1), (1, -1)])
+NEIGHBOUR_HEADINGS = np.degrees(np.arctan2(NEIGHBOURS[:, 1], NEIGHBOURS[:, 0])) % 360
+# The two straight neighbours beside each diagonal one; a diagonal step is only
+# allowed when both are passable, vehicles get stuck on corners otherwise.
+DIAGONAL_SIDES = np.array([(0, 1), (2, 1), (2, 3), (0, 3)])
+
+
+def passable_mask(game_map: np.ndarray, kind: str) -> np.ndarray:
+  """
+  Tiles a vehicle kind can move over. Unknown tiles are assumed passable so
+  that paths are planned optimistically through unexplored parts of the map.
+  """
+  if kind == "tanks":
+    return game_map != 0
+  if kind == "ships":
+    return game_map != 1
+  return np.ones(game_map.shape, dtype=bool)
+
+
+def corner_free(open_tiles: np.ndarray, valid: np.ndarray) -> np.ndarray:
+  """Mask out the diagonal steps of an (n, 8) neighbour mask that cut a corner."""
+  straight = open_tiles[:, :4] & valid[:, :4]
+  valid = valid.copy()
+  valid[:, 4:] &= straight[:, DIAGONAL_SIDES[:, 0]] & straight[:, DIAGONAL_SIDES[:, 1]]
+  return valid
+
+
+def neighbour_indices(indices: np.ndarray, shape: tuple, wrap: bool = True) -> tuple:
+  """
+  Flat indices of the 8 neighbours of each flat index, as an (n, 8) array,
+  and a mask of the neighbours that are on the map (all of them when wrapping).
+  """
+  ny, nx = shape
+  y, x = np.divmod(indices, nx)
+  x = x[:, None] + NEIGHBOURS[:, 0]
+  y = y[:, None] + NEIGHBOURS[:, 1]
+  if wrap:
+    valid = np.ones(x.shape, dtype=bool)
+  else:
+    valid = (x >= 0) & (x < nx) & (y >= 0) & (y < ny)
+  return (y % ny) * nx + (x % nx), valid
+
+
+def bfs_distance(passable: np.ndarray, sources: np.ndarray, distance: np.ndarray = None,
+                 wrap: bool = True) -> np.ndarray:
+  """
+  Multi-source breadth-first distance (in 8-connected steps) from the given
+  flat source indices over the passable tiles.
+
+  The search expands a whole wavefront per step with array operations. When
+  an existing distance grid is passed in, only the tiles that get closer to
+  the new sources are touched, which is how sources are added incrementally.
+  Sources themselves do not have to be passable (e.g. a base on land seeding
+  a field over water).
+  """
+  shape = passable.shape
+  passable = passable.ravel()
+  if distance is None:
+    distance = np.full(passable.size, np.inf, dtype=np.float32)
+  else:
+    distance = distance.ravel().copy()
+
+  frontier = np.unique(np.asarray(sources, dtype=np.int64))
+  frontier = frontier[distance[frontier] > 0]
+  distance[frontier] = 0
+
+  step = 0
+  while frontier.size > 0:
+    step += 1
+    neighbours, valid = neighbour_indices(frontier, shape, wrap)
+    valid = corner_free(passable[neighbours], valid)
+    neighbours = np.unique(neighbours[valid])
+    frontier = neighbours[passable[neighbours] & (distance[neighbours] > step)]
+    distance[frontier] = step
+
+  return distance.reshape(shape)
+
+
+def bfs_repair(passable: np.ndarray, removed: np.ndarray, distance: np.ndarray,
+               wrap: bool = True) -> np.ndarray:
+  """
+  bfs_distance() after taking the given flat indices out of the sources the
+  distance grid was searched from. Only the tiles downstream of them, whose
+  distance goes up one step at a time from a removed source, are searched
+  again, starting from the known distances around them.
+  """
+  shape = passable.shape
+  passable = passable.ravel()
+  distance = distance.ravel().copy()
+  frontier = np.unique(np.asarray(removed, dtype=np.int64))
+  frontier = frontier[distance[frontier] == 0]
+  affected = [frontier]
+  while frontier.size > 0:
+    neighbours, valid = neighbour_indices(frontier, shape, wrap)
+    valid = corner_free(passable[neighbours], valid)
+    frontier = np.unique(neighbours[valid & (distance[neighbours] == distance[frontier][:, None] + 1)])
+    affected.append(frontier)
+  affected = np.unique(np.concatenate(affected))
+  distance[affected] = np.inf
+
+  # The tiles a step away from the affected ones seed the search, each at
+  # its own distance, the nearest first
+  neighbours, valid = neighbour_indices(affected[passable[affected]], shape, wrap)
+  valid = corner_free(passable[neighbours], valid)
+  seeds = np.unique(neighbours[valid & np.isfinite(distance[neighbours])])
+  seeds = seeds[np.argsort(distance[seeds], kind="stable")]
+  levels = distance[seeds]
+  frontier = np.zeros(0, dtype=np.int64)
+  start = 0
+  step = levels[0] if len(seeds) else 0
+  while True:
+    end = np.searchsorted(levels, step, side="right")
+    frontier = np.union1d(frontier, seeds[start:end])
+    start = end
+    if frontier.size == 0:
+      if start == len(seeds):
+        break
+      step = levels[start]
+      continue
+    step += 1
+    neighbours, valid = neighbour_indices(frontier, shape, wrap)
+    valid = corner_free(passable[neighbours], valid)
+    neighbours = np.unique(neighbours[valid])
+    frontier = neighbours[passable[neighbours] & (distance[neighbours] > step)]
+    distance[frontier] = step
+
+  return distance.reshape(shape)
+
+
+def descent_headings(distance: np.ndarray, indices: np.ndarray = None,
+                     chunk: int = 1 << 18, wrap: bool = True) -> np.ndarray:
+  """
+  Heading (in degrees) towards the neighbour with the lowest distance for the
+  given flat indices (all tiles by default). Tiles that are unreachable or
+  already at a source get NaN.
+  """
+  flat = distance.ravel()
+  if indices is None:
+    indices = np.arange(flat.size)
+
+  headings = np.full(len(indices), np.nan, dtype=np.float32)
+  for start in range(0, len(indices), chunk):
+    block = indices[start:start + chunk]
+    neighbours, valid = neighbour_indices(block, distance.shape, wrap)
+    valid = corner_free(np.isfinite(flat[neighbours]), valid)
+    best = np.argmin(np.where(valid, flat[neighbours], np.inf), axis=1)
+    descending = flat[neighbours[np.arange(len(block)), best]] < flat[block]
+    headings[start:start + chunk] = np.where(descending, NEIGHBOUR_HEADINGS[best], np.nan)
+  return headings
+
+
+class FlowField:
+  """
+  Distance and heading grids towards the closest of a set of sources, e.g.
+  all enemy bases, for one vehicle kind ("tanks" on land, "ships" on water).
+
+  Every vehicle of that kind reads its heading with one array lookup. The
+  field is recomputed when a tile of the map changes passability or a source
+  passed to update() disappears, and extended incrementally when new sources
+  appear. add() and remove() change the sources without a new map, searching
+  again only where the distances change.
+  """
+
+  def __init__(self, kind: str):
+    self.kind = kind
+    self.sources = set()
+    self.distance = None
+    self.headings = None
+    self._version = 0
+    self._passable = None
+
+  def update(self, map_state: MapState, positions: np.ndarray) -> bool:
+    game_map = map_state.game_map
+    ny, nx = game_map.shape
+    positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+    sources = set(((positions[:, 1].astype(int) % ny) * nx +
+                   (positions[:, 0].astype(int) % nx)).tolist())
+
+    map_changed = False
+    if self._version != map_state.version:
+      changes = map_state.changes_since(self._version)
+      if changes is None:
+        self._passable = passable_mask(game_map, self.kind)
+        map_changed = True
+      else:
+        # Revealed tiles only matter where they open or close the way
+        tiles = changes[0]
+        passable = passable_mask(game_map.reshape(-1)[tiles], self.kind)
+        map_changed = bool((passable != self._passable.reshape(-1)[tiles]).any())
+        self._passable.reshape(-1)[tiles] = passable
+      self._version = map_state.version
+    if not map_changed and sources == self.sources:
+      return False
+
+    if map_changed or not sources >= self.sources:
+      self.distance = bfs_distance(self._passable, np.array(sorted(sources), dtype=np.int64))
+      self.headings = descent_headings(self.distance).reshape(game_map.shape)
+      self.sources = sources
+    else:
+      self._extend(np.array(sorted(sources - self.sources), dtype=np.int64))
+    return True
+
+  def add(self, tiles: np.ndarray) -> bool:
+    """
+    Add sources by flat index on the map of the last update(), cheaper than
+    passing the whole grown set to update() when there are many sources.
+    """
+    tiles = np.asarray(tiles, dtype=np.int64)
+    new = set(tiles.tolist()) - self.sources
+    if self.distance is None or not new:
+      return False
+    self._extend(np.array(sorted(new), dtype=np.int64))
+    return True
+
+  def remove(self, tiles: np.ndarray) -> bool:
+    """Take sources out by flat index, searching again only where they were the closest."""
+    gone = set(np.asarray(tiles, dtype=np.int64).tolist()) & self.sources
+    if self.distance is None or not gone:
+      return False
+    previous = self.distance
+    self.distance = bfs_repair(self._passable, np.array(sorted(gone), dtype=np.int64), previous)
+    self._reheading(previous)
+    self.sources = self.sources - gone
+    return True
+
+  def _extend(self, new: np.ndarray) -> None:
+    previous = self.distance
+    self.distance = bfs_distance(self._passable, new, previous)
+    self._reheading(previous)
+    self.sources = self.sources | set(new.tolist())
+
+  def _reheading(self, previous: np.ndarray) -> None:
+    # Only tiles whose distance changed, and their neighbours, can change heading
+    changed = np.flatnonzero(self.distance != previous)
+    neighbours, _ = neighbour_indices(changed, previous.shape)
+    changed = np.unique(np.concatenate([changed, neighbours.ravel()]))
+    self.headings.ravel()[changed] = descent_headings(self.distance, changed)
+
+  def _tile(self, x: float, y: float) -> tuple:
+    ny, nx = self.distance.shape
+    return int(y) % ny, int(x) % nx
+
+  def distance_at(self, x: float, y: float) -> float:
+    return float(self.distance[self._tile(x, y)])
+
+  def heading(self, x: float, y: float):
+    """Heading towards the closest source, None if unreachable or arrived."""
+    heading = self.headings[self._tile(x, y)]
+    return None if np.isnan(heading) else float(heading)
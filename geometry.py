@@ -0,0 +1,24 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+
+def torus_delta(a: np.ndarray, b: np.ndarray, size: np.ndarray) -> np.ndarray:
+  """
+  Shortest vector(s) from a to b on a map of the given (nx, ny) size that
+  wraps around its edges.
+  """
+  size = np.asarray(size, dtype=float)
+  delta = np.asarray(b, dtype=float) - np.asarray(a, dtype=float)
+  return (delta + size / 2) % size - size / 2
+
+
+def torus_distance(a: np.ndarray, b: np.ndarray, size: np.ndarray) -> np.ndarray:
+  delta = torus_delta(a, b, size)
+  return np.hypot(delta[..., 0], delta[..., 1])
+
+
+def vector_heading(vector: np.ndarray) -> np.ndarray:
+  """Heading(s) in degrees (0 = east, 90 = north) of the given vector(s)."""
+  vector = np.asarray(vector, dtype=float)
+  return np.degrees(np.arctan2(vector[..., 1], vector[..., 0])) % 360
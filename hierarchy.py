@@ -0,0 +1,267 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import heapq
+import math
+import numpy as np
+
+
+
+def block_distances(passable: np.ndarray, sources: np.ndarray, targets: np.ndarray) -> np.ndarray:
+  """
+  Breadth-first distances (in 8-connected steps, without cutting corners)
+  from each local (x, y) source to each target inside a block of the map at
+  most 64 tiles wide, without wrapping.
+
+  Every row of the block is a bitset in one uint64 word, so a step of the
+  search advances all sources at once with a few shifts and masks.
+  """
+  height, width = passable.shape
+  open_rows = (passable.astype(np.uint64) << np.arange(width, dtype=np.uint64)).sum(axis=1, dtype=np.uint64)
+  # Bit x of these holds whether tile x - 1 (left) or x + 1 (right) is passable
+  open_left = open_rows << np.uint64(1)
+  open_right = open_rows >> np.uint64(1)
+
+  count = len(sources)
+  source_bits = np.uint64(1) << sources[:, 0].astype(np.uint64)
+  target_bits = np.uint64(1) << targets[:, 0].astype(np.uint64)
+  frontier = np.zeros((count, height), dtype=np.uint64)
+  frontier[np.arange(count), sources[:, 1]] = source_bits
+  reached = frontier.copy()
+
+  distances = np.full((count, len(targets)), np.inf)
+  distances[(reached[:, targets[:, 1]] & target_bits) != 0] = 0
+
+  step = 0
+  while frontier.any():
+    step += 1
+    left = frontier << np.uint64(1)
+    right = frontier >> np.uint64(1)
+    grown = left | right
+    grown[:, 1:] |= frontier[:, :-1]
+    grown[:, :-1] |= frontier[:, 1:]
+    # Diagonal steps need both tiles beside them to be passable
+    grown[:, 1:] |= open_rows[:-1] & ((left[:, :-1] & open_left[1:]) | (right[:, :-1] & open_right[1:]))
+    grown[:, :-1] |= open_rows[1:] & ((left[:, 1:] & open_left[:-1]) | (right[:, 1:] & open_right[:-1]))
+
+    frontier = grown & open_rows & ~reached
+    reached |= frontier
+    distances[(frontier[:, targets[:, 1]] & target_bits) != 0] = step
+
+  return distances
+
+
+class ClusterGraph:
+  """
+  Hierarchical (HPA*) abstraction of a passability mask on a wrapped map.
+
+  The map is cut into square clusters. Wherever a run of passable tiles
+  crosses the border between two clusters, the middle of the run becomes an
+  entrance: a pair of nodes, one on either side, joined by a step of cost 1.
+  Entrances are found for the whole map at once with array operations, and
+  by update() again only on the borders of the clusters whose tiles changed.
+  The costs between the nodes inside a cluster are computed the first time a
+  search passes through that cluster and then kept for as long as its tiles
+  and nodes do not change, so long-range queries only touch the clusters
+  along their way and never search the full grid.
+  """
+
+  def __init__(self, passable: np.ndarray, cluster_size: int = 32):
+    if cluster_size > 64:
+      raise ValueError("clusters are searched as 64-bit rows, cluster_size must be at most 64")
+    self.passable = passable
+    self.cluster_size = cluster_size
+    ny, nx = passable.shape
+    self.nclusters = (-(-nx // cluster_size), -(-ny // cluster_size))
+    self._set_nodes(*self._entrances())
+    # Intra-cluster costs, keyed by cluster and node tiles
+    self._costs = {}
+
+  def update(self, tiles: np.ndarray) -> None:
+    """
+    Catch up with a change of passability (made in place) at the given flat
+    tile indices: only the borders of the clusters holding them get their
+    entrances found again, and only the clusters whose tiles or nodes
+    changed lose their costs.
+    """
+    ny, nx = self.passable.shape
+    ncx, ncy = self.nclusters
+    y, x = np.divmod(np.asarray(tiles), nx)
+    cy, cx = np.divmod(np.unique(self.cluster_of(x, y)), ncx)
+    # The left, right, top and bottom border of every cluster
+    segments = np.unique(np.concatenate([cx * ncy + cy, (cx - 1) % ncx * ncy + cy,
+                                         ncx * ncy + cy * ncx + cx, ncx * ncy + (cy - 1) % ncy * ncx + cx]))
+    keep = ~np.isin(self.node_segment, segments)
+    xs, ys, partners, node_segments = self._entrances(segments)
+    dirty = set((cy * ncx + cx).tolist()) | set(self.node_cluster[~keep].tolist())
+    renumber = np.cumsum(keep) - 1
+    self._set_nodes(np.r_[self.node_x[keep], xs], np.r_[self.node_y[keep], ys],
+                    np.r_[renumber[self.partner[keep]], partners + keep.sum()],
+                    np.r_[self.node_segment[keep], node_segments])
+    dirty |= set(self.cluster_of(xs, ys).tolist())
+    self._costs = {key: costs for key, costs in self._costs.items() if key[0] not in dirty}
+
+  def _set_nodes(self, xs: np.ndarray, ys: np.ndarray, partners: np.ndarray, segments: np.ndarray) -> None:
+    self.node_x = xs
+    self.node_y = ys
+    self.partner = partners
+    self.node_segment = segments
+    self.node_cluster = self.cluster_of(xs, ys)
+    order = np.argsort(self.node_cluster, kind="stable")
+    clusters, starts = np.unique(self.node_cluster[order], return_index=True)
+    ends = np.r_[starts[1:], len(order)]
+    self.cluster_nodes = {cluster: order[start:end]
+                          for cluster, start, end in zip(clusters.tolist(), starts.tolist(), ends.tolist())}
+
+  def cluster_of(self, x, y):
+    return (np.asarray(y) // self.cluster_size) * self.nclusters[0] + np.asarray(x) // self.cluster_size
+
+  def cluster_bounds(self, cluster: int) -> tuple:
+    ny, nx = self.passable.shape
+    cy, cx = divmod(cluster, self.nclusters[0])
+    x0 = cx * self.cluster_size
+    y0 = cy * self.cluster_size
+    return x0, y0, min(x0 + self.cluster_size, nx), min(y0 + self.cluster_size, ny)
+
+  def _entrances(self, segments: np.ndarray = None) -> tuple:
+    """
+    Entrance nodes as (xs, ys, partners, segments), on all borders or only
+    on the given segments, the parts of the borders between two clusters:
+    the vertical ones first, numbered by border and then along it, then the
+    horizontal ones.
+    """
+    size = self.cluster_size
+    xs, ys, partners, ids = [], [], [], []
+    count = 0
+    first_segment = 0
+    for transpose in (False, True):
+      passable = self.passable.T if transpose else self.passable
+      n = passable.shape[1]
+      # Last column of every cluster and the first column of the next one
+      edges = np.minimum(np.arange(1, -(-n // size) + 1) * size, n) - 1
+      along = -(-passable.shape[0] // size)
+      edge_ids = np.arange(len(edges))
+      if segments is not None:
+        local = segments[(segments >= first_segment) & (segments < first_segment + len(edges) * along)]
+        edge_ids = np.unique((local - first_segment) // along)
+      crossing = passable[:, edges[edge_ids]] & passable[:, (edges[edge_ids] + 1) % n]
+
+      # Runs of crossable tiles, cut at the cluster borders along the edge
+      rows = np.arange(crossing.shape[0])[:, None]
+      before = np.vstack([np.zeros((1, crossing.shape[1]), bool), crossing[:-1]])
+      after = np.vstack([crossing[1:], np.zeros((1, crossing.shape[1]), bool)])
+      starts = crossing & (~before | (rows % size == 0))
+      ends = crossing & (~after | (rows % size == size - 1))
+      start_edge, start_row = np.nonzero(starts.T)
+      _, end_row = np.nonzero(ends.T)
+      start_edge = edge_ids[start_edge]
+      segment = first_segment + start_edge * along + start_row // size
+      first_segment += len(edges) * along
+      if segments is not None:
+        wanted = np.isin(segment, segments)
+        start_edge, start_row, end_row = start_edge[wanted], start_row[wanted], end_row[wanted]
+        segment = segment[wanted]
+      middle = (start_row + end_row) // 2
+
+      inside = edges[start_edge]
+      outside = (inside + 1) % n
+      if transpose:
+        xs += [middle, middle]
+        ys += [inside, outside]
+      else:
+        xs += [inside, outside]
+        ys += [middle, middle]
+      entrances = np.arange(len(middle)) + count
+      partners += [entrances + len(middle), entrances]
+      ids += [segment, segment]
+      count += 2 * len(middle)
+
+    xs = np.concatenate(xs).astype(np.int64)
+    ys = np.concatenate(ys).astype(np.int64)
+    return xs, ys, np.concatenate(partners).astype(np.int64), np.concatenate(ids).astype(np.int64)
+
+  def _distances(self, cluster: int, sources: list, targets: list) -> np.ndarray:
+    """Distances inside the cluster from each (x, y) source to each target."""
+    x0, y0, x1, y1 = self.cluster_bounds(cluster)
+    sources = np.array(sources, dtype=np.int64).reshape(-1, 2) - (x0, y0)
+    targets = np.array(targets, dtype=np.int64).reshape(-1, 2) - (x0, y0)
+    return block_distances(self.passable[y0:y1, x0:x1], sources, targets)
+
+  def _costs_of(self, cluster: int) -> tuple:
+    nodes = self.cluster_nodes.get(cluster, np.empty(0, dtype=np.int64))
+    tiles = tuple(zip(self.node_x[nodes].tolist(), self.node_y[nodes].tolist()))
+    key = (cluster, tiles)
+    if key not in self._costs:
+      self._costs[key] = self._distances(cluster, tiles, tiles)
+    return nodes, self._costs[key]
+
+  def _heuristic(self, node: int, goal: tuple) -> float:
+    ny, nx = self.passable.shape
+    dx = abs(int(self.node_x[node]) - goal[0])
+    dy = abs(int(self.node_y[node]) - goal[1])
+    return max(min(dx, nx - dx), min(dy, ny - dy))
+
+  def abstract_path(self, start: tuple, goal: tuple):
+    """
+    Node ids from the start cluster to the goal cluster, or None when the
+    goal cannot be reached. An empty list means start and goal are connected
+    within their own cluster.
+    """
+    start_cluster = int(self.cluster_of(*start))
+    goal_cluster = int(self.cluster_of(*goal))
+
+    start_nodes = self.cluster_nodes.get(start_cluster, np.empty(0, dtype=np.int64))
+    goal_nodes = self.cluster_nodes.get(goal_cluster, np.empty(0, dtype=np.int64))
+    start_tiles = list(zip(self.node_x[start_nodes].tolist(), self.node_y[start_nodes].tolist()))
+    goal_tiles = list(zip(self.node_x[goal_nodes].tolist(), self.node_y[goal_nodes].tolist()))
+    if start_cluster == goal_cluster:
+      from_start = self._distances(start_cluster, [start], start_tiles + [goal])[0]
+      if math.isfinite(from_start[-1]):
+        return []
+      from_start = from_start[:-1]
+    else:
+      from_start = self._distances(start_cluster, [start], start_tiles)[0]
+
+    to_goal = dict(zip(goal_nodes.tolist(), self._distances(goal_cluster, [goal], goal_tiles)[0].tolist()))
+
+    cost = {}
+    parent = {}
+    queue = []
+    for node, distance in zip(start_nodes.tolist(), from_start.tolist()):
+      if math.isfinite(distance):
+        cost[node] = distance
+        parent[node] = None
+        heapq.heappush(queue, (distance + self._heuristic(node, goal), node))
+
+    best = math.inf
+    best_node = None
+    while queue:
+      estimate, node = heapq.heappop(queue)
+      if estimate >= best:
+        break
+      node_cost = cost[node]
+      if node in to_goal and node_cost + to_goal[node] < best:
+        best = node_cost + to_goal[node]
+        best_node = node
+
+      neighbours = [(int(self.partner[node]), 1.0)]
+      nodes, costs = self._costs_of(int(self.node_cluster[node]))
+      row = int(np.flatnonzero(nodes == node)[0])
+      neighbours += [(other, c) for other, c in zip(nodes.tolist(), costs[row].tolist())
+                     if other != node and math.isfinite(c)]
+
+      for neighbour, step in neighbours:
+        neighbour_cost = node_cost + step
+        if neighbour_cost < cost.get(neighbour, math.inf):
+          cost[neighbour] = neighbour_cost
+          parent[neighbour] = node
+          heapq.heappush(queue, (neighbour_cost + self._heuristic(neighbour, goal), neighbour))
+
+    if best_node is None:
+      return None
+
+    path = []
+    node = best_node
+    while node is not None:
+      path.append(node)
+      node = parent[node]
+    return path[::-1]
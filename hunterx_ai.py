@@ -1,26 +1,36 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
-from collections import defaultdict
 from enum import Enum, auto
-import math
 import numpy as np
 
+from .flowfield import FlowField
+from .mapstate import MapState
+from .params import load_params
+from .profiling import PhaseProfiler, profiled, timed
+from .randomness import BotRandom
+from .regions import Regions
+from .registry import BaseRegistry
+from .replay import recorded
+from .scheduler import BUILD, IDLE, THREATENED, TickScheduler
+from .sectors import SectorIndex
+from .sites import ConversionSites
+from .snapshot import WorldSnapshot
+from .spatial import SpatialHash
+from .terrain import LandHeadingField
+from .units import UnitStore
+
 # This is your team name
 CREATOR = "5monkeys"
 
-
-def heading_away_from_land(game_map: np.ndarray, x: int, y: int) -> np.ndarray:
-  offset = 5
-  surrounding = game_map[y - offset:y + offset + 1, x - offset:x + offset + 1]
-  samples = []
-
-  for sx, sy in np.ndindex(surrounding.shape):
-    if sx == offset and sy == offset:
-      continue
-    if surrounding[sx, sy] != 1:
-      samples.append(np.nan_to_num(np.arctan2(y - sy, x - sx)))
-
-  return np.nan_to_num(np.mean(samples)) * 180 / np.pi
+# Build and behavior constants (see params.SCHEMA), tuned values are loaded
+# from the parameters file at startup
+PARAMS = {
+  "max_mines": 3,
+  "min_tanks": 6,
+  "min_ships": 4,
+  "min_base_ship_distance": 20.0,
+  "tank_share": 0.8,
+}
 
 
 class BaseTactic(Enum):
@@ -32,14 +42,139 @@ class PlayerAi:
 
   def __init__(self):
     self.team = CREATOR  # Mandatory attribute
-
-    # Record the previous positions of all my vehicles
-    self.previous_positions = {}
-    self.historic_positions = set()
-    self.base_ntanks = defaultdict(lambda: 0)
-    self.base_nships = defaultdict(lambda: 0)
-    self.base_tactic = defaultdict(lambda: BaseTactic.TANK)
-
+    self.params = load_params(__name__, PARAMS)
+
+    # This tick's map, with a version and the tiles that changed
+    self.map = MapState()
+    self.land_headings = LandHeadingField()
+    self.tank_flow = FlowField("tanks")
+    self.regions = Regions()
+
+    # Record the previous positions of all my units and the build counters of
+    # my bases, both dropped as soon as the unit is gone
+    self.units = UnitStore({"ntanks": 0, "nships": 0, "tactic": BaseTactic.TANK.value})
+    # Every base seen so far, kept after it drops out of view
+    self.bases = BaseRegistry()
+    # Directions out of my bases that are free for launching ships
+    self.sectors = SectorIndex()
+    # Where ships can settle, and the way there over water
+    self.sites = ConversionSites()
+    # Commands for the units past the per-tick time budget are deferred
+    self.scheduler = TickScheduler(budget=0.02)
+    self.threat_radius = 100
+    # Per-phase timings, only collected when profiling is switched on
+    self.profiler = PhaseProfiler(CREATOR)
+    # Seeded random numbers, the match runner sets the seed
+    self.rng = BotRandom(CREATOR)
+
+  @timed("build")
+  def build(self, base):
+    base_tactic = BaseTactic(self.units.get(base.uid, "tactic"))
+    heading_away = self.land_headings.heading(base.x, base.y)
+    base_ntanks = self.units.get(base.uid, "ntanks")
+    base_nships = self.units.get(base.uid, "nships")
+
+    # First we need to prioritize building our 3 mines, that way we have
+    # ample production for all of our conquests.
+    if base.mines < self.params.max_mines:
+      if base.crystal > base.cost("mine"):
+        base.build_mine()
+    elif base.crystal > base.cost("tank") and base_ntanks < self.params.min_tanks:
+      base.build_tank(np.flip(heading_away))
+      self.units.add(base.uid, "ntanks")
+    # Time to divide like a bacteria! Send out the ships!
+    elif base_nships < self.params.min_ships:
+      if base.crystal > base.cost("ship"):
+        # Launch into the widest gap between my other bases and the land
+        # around this one
+        heading_away = self.sectors.heading(base.uid, heading_away)
+
+        base.build_ship(heading_away)
+        self.units.add(base.uid, "nships")
+    elif base.crystal > base.cost("tank") and base_tactic == BaseTactic.TANK:
+      base.build_tank(np.flip(heading_away))
+      self.units.add(base.uid, "ntanks")
+    # If everything else is satisfied, build a jet.
+    elif base.crystal > base.cost("jet") and base_tactic == BaseTactic.JET:
+      base.build_jet(np.flip(heading_away))
+
+  @timed("jets")
+  def command_jet(self, jet, enemy_bases: list):
+    if len(enemy_bases) >= 1:
+      jet.goto(enemy_bases[0].x, enemy_bases[0].y)
+    # else:
+    #   jet.goto(jet.owner.x, jet.owner.y)
+
+  @timed("tanks")
+  def command_tank(self, tank, world: WorldSnapshot, enemy_bases: list, enemy_tanks: list):
+    if self.units.is_tracked(tank.uid) and (not tank.stopped):
+      # If the tank position is the same as the previous position,
+      # set a random heading
+      if self.units.is_stationary(tank.uid):
+        tank.set_heading(self.rng.heading())
+      elif len(enemy_bases) > 0:
+        # Follow the flow field around the terrain, only drive straight
+        # at the base once we are next to it (and never at one on another
+        # island, we would drive into the coast forever)
+        heading = self.tank_flow.heading(tank.x, tank.y)
+        if heading is not None:
+          tank.set_heading(heading)
+        else:
+          closest_base_to_tank = self.regions.closest_reachable(
+              "tanks", tank.position, world.position[world.enemy("bases")])
+          if closest_base_to_tank >= 0:
+            tank.goto(*enemy_bases[closest_base_to_tank].position)
+      elif len(enemy_tanks) > 0:
+        closest_tank_to_tank = self.regions.closest_reachable(
+            "tanks", tank.position, world.position[world.enemy("tanks")])
+        if closest_tank_to_tank >= 0:
+          tank.goto(*enemy_tanks[closest_tank_to_tank].position)
+
+  def settle(self, ship) -> bool:
+    """Turn the ship into a base with a random tactic, False if that failed."""
+    base_uid = ship.convert_to_base()
+    if base_uid is not None:
+      self.units.set(base_uid, "tactic", (BaseTactic.TANK if self.rng.uniform() < self.params.tank_share else BaseTactic.JET).value)
+    return base_uid is not None
+
+  @timed("ships")
+  def command_ship(self, ship, base_index: SpatialHash, base_positions: list):
+    if self.units.is_tracked(ship.uid):
+      # Settle as soon as the ship is on a free site
+      if self.sites.is_free(ship.x, ship.y, ship.uid) and self.settle(ship):
+        return
+      # If the ship position is the same as the previous position,
+      # convert the ship to a base if it is far from the owning base,
+      # set a random heading otherwise
+      if self.units.is_stationary(ship.uid):
+        min_base_ship_distance = self.params.min_base_ship_distance
+        closest_base_distance, closest_base_row = base_index.nearest(ship.position)
+        closest_base_position = base_positions[closest_base_row]
+
+        if closest_base_distance > min_base_ship_distance:
+          # Try to convert the ship into a base, if we failed we most
+          # likely got stuck, lets move a tiny bit
+          if not self.settle(ship):
+            ship.set_heading((ship.heading - 5) % 360)
+          # Switch BaseTactic every other base
+          # elif base_tactic == BaseTactic.TANK:
+          #   self.base_tactic[base_uid] = BaseTactic.JET
+          # elif base_tactic == BaseTactic.JET:
+          #   self.base_tactic[base_uid] = BaseTactic.TANK
+
+        else:
+          ship.set_heading(self.rng.heading())
+          # next_heading = heading_away_from_land(game_map, *closest_base_position)
+          # Lets move in the next best direction
+          # ship.set_heading(self.land_headings.heading(*closest_base_position))
+      # Sail down the water distance to the site the ship claimed
+      elif self.sites.heading(ship.x, ship.y, ship.uid) is not None:
+        ship.set_heading(self.sites.heading(ship.x, ship.y, ship.uid))
+      else:
+        ship.set_heading((ship.heading + 5) % 360)
+
+  @recorded
+  @profiled
   def run(self, t: float, dt: float, info: dict, game_map: np.ndarray):
     """
         This is the main function that will be called by the game engine.
@@ -70,157 +205,62 @@ class PlayerAi:
             1 means land, 0 means water, -1 means no info.
         """
 
+    # The time budget of the tick covers everything below
+    self.scheduler.start()
+    self.profiler.begin("perceive")
     # Get information about my team
     myinfo = info[self.team]
+    self.map.update(game_map)
+    self.land_headings.update(self.map)
+    self.regions.update(self.map)
 
-    enemy_bases = []
-    enemy_tanks = []
-    enemy_ships = []
-    enemy_jets = []
+    world = WorldSnapshot(info, self.team, game_map.shape)
+    my_rows = world.my_rows()
+    self.sites.forget(self.units.update([world.uids[row] for row in my_rows], world.position[my_rows]))
 
-    if len(info) > 1:
-      for name in info:
-        if name == self.team:
-          continue
-
-        if "bases" in info[name]:
-          enemy_bases += info[name]["bases"]
-        if "tanks" in info[name]:
-          enemy_tanks += info[name]["tanks"]
-        if "ships" in info[name]:
-          enemy_ships += info[name]["ships"]
-        if "jets" in info[name]:
-          enemy_jets += info[name]["jets"]
+    enemy_bases = world.objects_in(world.enemy("bases"))
+    enemy_tanks = world.objects_in(world.enemy("tanks"))
+    enemy_ships = world.objects_in(world.enemy("ships"))
+    enemy_jets = world.objects_in(world.enemy("jets"))
 
     enemy_vehicles = enemy_tanks + enemy_ships + enemy_jets
     enemy_entities = enemy_bases + enemy_vehicles
 
-    base_grouped_tanks = defaultdict(list)
-    if "tanks" in myinfo:
-      for tank in myinfo["tanks"]:
-        base_grouped_tanks[tank.owner.uid].append(tank)
-
-    base_grouped_ships = defaultdict(list)
-    if "ships" in myinfo:
-      for ship in myinfo["ships"]:
-        base_grouped_ships[ship.owner.uid].append(ship)
-
-    base_grouped_jets = defaultdict(list)
-    if "jets" in myinfo:
-      for jet in myinfo["jets"]:
-        base_grouped_jets[jet.owner.uid].append(jet)
+    base_grouped_tanks = world.group_by_owner("tanks")
+    base_grouped_ships = world.group_by_owner("ships")
+    base_grouped_jets = world.group_by_owner("jets")
 
     base_positions = [(base.x, base.y) for base in myinfo["bases"]]
-    self.historic_positions.update(base_positions)
+    base_index = SpatialHash(base_positions, world.size)
+    self.tank_flow.update(self.map, world.position[world.enemy("bases")])
+    self.bases.update(t, world)
+    self.sectors.update(self.bases, self.map)
+    self.sites.update(self.map, self.bases.positions(True, 0.5), self.bases.positions(False),
+                      self.params.min_base_ship_distance)
+
+    # Vehicles with an enemy vehicle close by are commanded before idle ones
+    vehicle_rows = np.r_[world.mine("tanks"), world.mine("ships"), world.mine("jets")]
+    enemy_vehicle_index = SpatialHash(
+        world.position[np.r_[world.enemy("tanks"), world.enemy("ships"), world.enemy("jets")]],
+        world.size)
+    threat_distance, _ = enemy_vehicle_index.nearest(world.position[vehicle_rows])
+    threatened = {world.uids[row] for row in vehicle_rows[threat_distance < self.threat_radius]}
+    self.profiler.end()
 
     for base in myinfo["bases"]:
-      base_tanks = base_grouped_tanks[base.uid]
-      base_ships = base_grouped_ships[base.uid]
-      base_jets = base_grouped_jets[base.uid]
-      base_tactic = self.base_tactic[base.uid]
-      heading_away = heading_away_from_land(game_map, base.x, base.y)
-      base_ntanks = self.base_ntanks[base.uid]
-      base_nships = self.base_nships[base.uid]
-
-
-      # First we need to prioritize building our 3 mines, that way we have
-      # ample production for all of our conquests.
-      if base.mines < 3:
-        if base.crystal > base.cost("mine"):
-          base.build_mine()
-      elif base.crystal > base.cost("tank") and base_ntanks < 6:
-        base.build_tank(np.flip(heading_away))
-        self.base_ntanks[base.uid] += 1
-      # Time to divide like a bacteria! Send out the ships!
-      elif base_nships < 4:
-        if base.crystal > base.cost("ship"):
-          # We need to check that there is not a friendly base in the direct
-          # vicinity (a margin of 10 degrees in this case) of the heading we
-          # initially chose. If there is we want to shift our heading, here
-          # by 20 degrees.
-          for bx, by in base_positions:
-            margin = 10
-            heading_towards_base = math.atan2(base.y - by, base.x - bx)
-
-            if heading_towards_base - margin <= heading_away or heading_towards_base + margin >= heading_away:
-              heading_away = (heading_away + 20) % 360
-
-          base.build_ship(heading_away)
-          self.base_nships[base.uid] += 1
-      elif base.crystal > base.cost("tank") and base_tactic == BaseTactic.TANK:
-        base.build_tank(np.flip(heading_away))
-        self.base_ntanks[base.uid] += 1
-      # If everything else is satisfied, build a jet.
-      elif base.crystal > base.cost("jet") and base_tactic == BaseTactic.JET:
-        base.build_jet(np.flip(heading_away))
-
-      for jet in base_jets:
-        if len(enemy_bases) >= 1:
-          jet.goto(enemy_bases[0].x, enemy_bases[0].y)
-        # else:
-        #   jet.goto(jet.owner.x, jet.owner.y)
-
-      for tank in base_tanks:
-        if (tank.uid in self.previous_positions) and (not tank.stopped):
-          # If the tank position is the same as the previous position,
-          # set a random heading
-          if all(tank.position == self.previous_positions[tank.uid]):
-            tank.set_heading(np.random.random() * 360.0)
-          elif len(enemy_bases) > 0:
-            closest_base_to_tank = min(
-                enemy_bases, key=lambda enemy: tank.get_distance(enemy.x, enemy.y, False))
-            tank.goto(closest_base_to_tank.x, closest_base_to_tank.y)
-          elif len(enemy_tanks) > 0:
-            closest_tank_to_tank = min(
-                enemy_tanks, key=lambda enemy: tank.get_distance(enemy.x, enemy.y, False))
-            tank.goto(closest_tank_to_tank.x, closest_tank_to_tank.y)
-          elif len(enemy_tanks) > 0:
-            closest_tank_to_tank = min(
-                enemy_tanks, key=lambda enemy: tank.get_distance(enemy.x, enemy.y, False))
-            tank.goto(closest_tank_to_tank.x, closest_tank_to_tank.y)
-
-        # Store the previous position of this tank for the next time step
-        self.previous_positions[tank.uid] = tank.position
-
-      for ship in base_ships:
-        if ship.uid in self.previous_positions:
-          # If the ship position is the same as the previous position,
-          # convert the ship to a base if it is far from the owning base,
-          # set a random heading otherwise
-          if all(ship.position == self.previous_positions[ship.uid]):
-            min_base_ship_distance = 20
-            base_ship_distances = [((x, y), ship.get_distance(x, y, False))
-                                   for x, y in base_positions]
-            closest_base = min(
-                base_ship_distances,
-                key=lambda base_ship_distance: base_ship_distance[1])
-            closest_base_position = closest_base[0]
-            closest_base_distance = closest_base[1]
-
-            if closest_base_distance > min_base_ship_distance:
-              # Try to convert the ship into a base
-              base_uid = ship.convert_to_base()
-
-              # We failed and most likely got stuck, lets move a tiny bit
-              if base_uid is None:
-                ship.set_heading((ship.heading - 5) % 360)
-              else:
-                self.base_tactic[base_uid] = BaseTactic.TANK if np.random.random() < 0.8 else BaseTactic.JET
-              # Switch BaseTactic every other base
-              # elif base_tactic == BaseTactic.TANK:
-              #   self.base_tactic[base_uid] = BaseTactic.JET
-              # elif base_tactic == BaseTactic.JET:
-              #   self.base_tactic[base_uid] = BaseTactic.TANK
-
-            else:
-              ship.set_heading(np.random.random() * 360.0)
-              # next_heading = heading_away_from_land(game_map, *closest_base_position)
-              # Lets move in the next best direction
-              # ship.set_heading(heading_away_from_land(game_map, *closest_base_position))
-          else:
-            ship.set_heading((ship.heading + 5) % 360)
-        # Store the previous position of this ship for the next time step
-        self.previous_positions[ship.uid] = ship.position
+      self.scheduler.add(BUILD, base.uid, self.build, base)
+
+      for jet in base_grouped_jets[base.uid]:
+        self.scheduler.add(THREATENED if jet.uid in threatened else IDLE, jet.uid, self.command_jet,
+                           jet, enemy_bases)
+      for tank in base_grouped_tanks[base.uid]:
+        self.scheduler.add(THREATENED if tank.uid in threatened else IDLE, tank.uid, self.command_tank,
+                           tank, world, enemy_bases, enemy_tanks)
+      for ship in base_grouped_ships[base.uid]:
+        self.scheduler.add(THREATENED if ship.uid in threatened else IDLE, ship.uid, self.command_ship,
+                           ship, base_index, base_positions)
+
+    self.scheduler.run()
 
     # Controlling my bases =================================================
 
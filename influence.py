@@ -0,0 +1,126 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from .snapshot import WorldSnapshot
+
+# Layers of the map: attack of the enemy units and of mine
+THREAT, STRENGTH = 0, 1
+
+
+class InfluenceMap:
+  """
+  Attack of the enemy units (threat) and of mine (strength) within a radius
+  of every point, on a coarse grid of cell_size tiles that wraps around the
+  map edges.
+
+  Units are splatted onto the grid by their attack and the grid is blurred
+  with a disk of the given radius. update() is called once per tick: only
+  the units that moved to another cell, changed attack, appeared or were
+  destroyed touch the grid, and their disks are added to the blurred field
+  directly. When many units changed, the field is recomputed in one FFT
+  convolution instead. Queries are then array lookups. Positions are rounded
+  to their cells, so a unit counts for a point when it is within radius
+  give or take `margin`.
+  """
+
+  def __init__(self, cell_size: float = 16.0, radius: float = 100.0, refresh: int = 256):
+    self.cell_size = cell_size
+    self.radius = radius
+    self.refresh = refresh
+    self.shape = None
+    self.splat = None
+    self.field = None
+    self.units = {}
+    self._updates = 0
+
+  @property
+  def margin(self) -> float:
+    """How far the rounding to cells can move a unit, including across the map edges."""
+    return 3 * self.cell_size
+
+  def _resize(self, size: np.ndarray) -> None:
+    nx, ny = np.ceil(np.asarray(size, dtype=float) / self.cell_size).astype(int)
+    self.shape = (ny, nx)
+    self.splat = np.zeros((2, ny, nx))
+    self.field = np.zeros((2, ny, nx))
+    self.units = {}
+
+    # Offsets of the cells whose centers lie within the radius, and the same
+    # disk as a wrapped kernel for the FFT
+    reach = int(np.ceil(self.radius / self.cell_size))
+    dy, dx = np.mgrid[-reach:reach + 1, -reach:reach + 1]
+    inside = np.hypot(dx, dy) * self.cell_size <= self.radius
+    self._dy, self._dx = dy[inside], dx[inside]
+    kernel = np.zeros((ny, nx))
+    np.add.at(kernel, (self._dy % ny, self._dx % nx), 1.0)
+    self._kernel = np.fft.rfft2(kernel)
+
+  def _cells(self, points: np.ndarray) -> np.ndarray:
+    """Flat cell indices of (n, 2) points."""
+    ny, nx = self.shape
+    cells = np.floor(np.asarray(points, dtype=float).reshape(-1, 2) / self.cell_size).astype(np.int64)
+    return (cells[:, 1] % ny) * nx + cells[:, 0] % nx
+
+  def update(self, world: WorldSnapshot, radius: float = None) -> None:
+    """Move the units of this tick onto the grid, radius (if given) replaces the one of the disk."""
+    if radius is not None and radius != self.radius:
+      self.radius = radius
+      self.shape = None
+    if self.shape is None or self.shape != tuple(np.ceil(world.size[::-1] / self.cell_size).astype(int)):
+      self._resize(world.size)
+
+    # Keys are cell indices over both layers
+    cells = self.shape[0] * self.shape[1]
+    mine = np.zeros(len(world.uids), dtype=bool)
+    mine[world.my_rows()] = True
+    keys = self._cells(world.position) + np.where(mine, STRENGTH, THREAT) * cells
+    values = world.attack
+    old = [self.units.get(uid, (-1, 0.0)) for uid in world.uids]
+    old_keys = np.array([key for key, _ in old], dtype=np.int64)
+    old_values = np.array([value for _, value in old], dtype=float)
+    changed = (keys != old_keys) | (values != old_values)
+    gone = self.units.keys() - set(world.uids)
+
+    # Every change takes the unit's attack off its old cell and puts it on
+    # the new one
+    removed = [self.units[uid] for uid in gone]
+    delta_keys = np.concatenate([old_keys[changed & (old_keys >= 0)], keys[changed],
+                                 np.array([key for key, _ in removed], dtype=np.int64)])
+    delta_values = np.concatenate([-old_values[changed & (old_keys >= 0)], values[changed],
+                                   -np.array([value for _, value in removed], dtype=float)])
+    self.units = dict(zip(world.uids, zip(keys.tolist(), values.tolist())))
+    if not len(delta_keys):
+      return
+
+    np.add.at(self.splat.reshape(-1), delta_keys, delta_values)
+    self._updates += 1
+    if len(delta_keys) * len(self._dx) > cells or self._updates >= self.refresh:
+      # Recomputing from scratch also drops the rounding errors the
+      # incremental updates pile up
+      self.field = np.fft.irfft2(np.fft.rfft2(self.splat) * self._kernel, s=self.shape)
+      self.field[np.abs(self.field) < 1e-9] = 0
+      self._updates = 0
+    else:
+      ny, nx = self.shape
+      layer, cell = np.divmod(delta_keys, cells)
+      y, x = np.divmod(cell, nx)
+      np.add.at(self.field, (layer[:, None], (y[:, None] + self._dy) % ny, (x[:, None] + self._dx) % nx),
+                np.broadcast_to(delta_values[:, None], (len(delta_keys), len(self._dx))))
+
+  def threat(self, points: np.ndarray) -> np.ndarray:
+    """Total attack of the enemy units within the radius of each of the (n, 2) points."""
+    return self.field[THREAT].reshape(-1)[self._cells(points)]
+
+  def strength(self, points: np.ndarray) -> np.ndarray:
+    """Total attack of my units within the radius of each of the (n, 2) points."""
+    return self.field[STRENGTH].reshape(-1)[self._cells(points)]
+
+  def most_threatened(self, points: np.ndarray, excess: float = 1e-9) -> int:
+    """Index of the point where the threat exceeds my strength most, -1 if it does by excess nowhere."""
+    if self.field is None or not len(points):
+      return -1
+    cells = self._cells(points)
+    balance = self.field[THREAT].reshape(-1)[cells] - self.field[STRENGTH].reshape(-1)[cells]
+    index = int(np.argmax(balance))
+    return index if balance[index] > excess else -1
@@ -2,6 +2,15 @@
 
 import numpy as np
 
+from .assignment import TargetAssigner
+from .exploration import FrontierPlanner
+from .mapstate import MapState
+from .profiling import PhaseProfiler, profiled
+from .randomness import BotRandom
+from .replay import recorded
+from .snapshot import WorldSnapshot
+from .units import UnitStore
+
 # This is your team name
 CREATOR = "junior"
 
@@ -11,12 +20,23 @@ class PlayerAi:
     def __init__(self):
         self.team = CREATOR  # Mandatory attribute
 
-        # Record the previous positions of all my vehicles
-        self.previous_positions = {}
-        # Record the number of tanks and ships I have at each base
-        self.ntanks = {}
-        self.nships = {}
-
+        # This tick's map, with a version and the tiles that changed
+        self.map = MapState()
+        # Record the previous positions of all my vehicles, and the number of
+        # tanks and ships I have at each base
+        self.units = UnitStore({"ntanks": 0, "nships": 0})
+        # Which enemy each of my tanks and jets goes for
+        self.targets = TargetAssigner()
+        # Where my ships and idle jets go to see more of the map
+        self.explore = FrontierPlanner()
+
+        # Per-phase timings, only collected when profiling is switched on
+        self.profiler = PhaseProfiler(CREATOR)
+        # Seeded random numbers, the match runner sets the seed
+        self.rng = BotRandom(CREATOR)
+
+    @recorded
+    @profiled
     def run(self, t: float, dt: float, info: dict, game_map: np.ndarray):
         """
         This is the main function that will be called by the game engine.
@@ -47,8 +67,11 @@ class PlayerAi:
             1 means land, 0 means water, -1 means no info.
         """
 
+        self.profiler.begin("perceive")
         # Get information about my team
         myinfo = info[self.team]
+        units = [unit for kind in ("bases", "tanks", "ships", "jets") for unit in myinfo.get(kind, [])]
+        self.units.update([unit.uid for unit in units], [unit.position for unit in units])
 
         # Controlling my bases =================================================
 
@@ -79,61 +102,48 @@ class PlayerAi:
         # base.build_jet(): build a jet
 
         # Iterate through all my bases (vehicles belong to bases)
+        self.profiler.begin("build")
         for base in myinfo["bases"]:
-            # If this is a new base, initialize the tank & ship counters
-            if base.uid not in self.ntanks:
-                self.ntanks[base.uid] = 0
-            if base.uid not in self.nships:
-                self.nships[base.uid] = 0
             # Firstly, each base should build a mine if it has less than 3 mines
             if base.mines < 3:
                 if base.crystal > base.cost("mine"):
                     base.build_mine()
             # Secondly, each base should build a tank if it has less than 5 tanks
-            elif base.crystal > base.cost("tank") and self.ntanks[base.uid] < 5:
+            elif base.crystal > base.cost("tank") and self.units.get(base.uid, "ntanks") < 5:
                 # build_tank() returns the uid of the tank that was built
-                tank_uid = base.build_tank(heading=360 * np.random.random())
+                tank_uid = base.build_tank(heading=self.rng.heading())
                 # Add 1 to the tank counter for this base
-                self.ntanks[base.uid] += 1
+                self.units.add(base.uid, "ntanks")
             # Thirdly, each base should build a ship if it has less than 3 ships
-            elif base.crystal > base.cost("ship") and self.nships[base.uid] < 3:
+            elif base.crystal > base.cost("ship") and self.units.get(base.uid, "nships") < 3:
                 # build_ship() returns the uid of the ship that was built
-                ship_uid = base.build_ship(heading=360 * np.random.random())
+                ship_uid = base.build_ship(heading=self.rng.heading())
                 # Add 1 to the ship counter for this base
-                self.nships[base.uid] += 1
+                self.units.add(base.uid, "nships")
             # If everything else is satisfied, build a jet
             elif base.crystal > base.cost("jet"):
                 # build_jet() returns the uid of the jet that was built
-                if np.random.randint(0, 1) == 0:
-                    jet_uid = base.build_jet(heading=360 * np.random.random())
+                if self.rng.uniform() < 0.5:
+                    jet_uid = base.build_jet(heading=self.rng.heading())
                 else:
-                    base.build_ship(heading=360 * np.random.random())
-                    base.build_ship(heading=360 * np.random.random())
-
-
-        # Try to find an enemy target
-        targets = []
-        # If there are multiple teams in the info, find the first team that is not mine
-        if len(info) > 1:
-            for name in info:
-                if name != self.team:
-                    # Target only bases
-                    if "planes" in info[name]:
-                        # Simply target the first base
-                        t = info[name]["planes"][0]
-                        targets.append([t.x, t.y])
-                    if "bases" in info[name]:
-                        # Simply target the first base
-                        t = info[name]["bases"][0]
-                        targets.append([t.x, t.y])
-                    elif "ships" in info[name]:
-                        # Simply target the first base
-                        t = info[name]["ships"][0]
-                        targets.append([t.x, t.y])
-                    elif "tanks" in info[name]:
-                        # Simply target the first base
-                        t = info[name]["tanks"][0]
-                        targets.append([t.x, t.y])
+                    base.build_ship(heading=self.rng.heading())
+                    base.build_ship(heading=self.rng.heading())
+
+
+        # Spread my tanks and jets over the enemies in sight: each gets the one
+        # it can reach and destroy soonest, and no enemy more than its share
+        world = WorldSnapshot(info, self.team, game_map.shape)
+        enemies = np.r_[tuple(world.enemy(kind) for kind in ("bases", "tanks", "ships", "jets"))]
+        targets = self.targets.assign_rows(world, np.r_[world.mine("tanks"), world.mine("jets")], enemies)
+        target_positions = dict(zip(world.uids, world.position))
+
+        # Ships, and jets with no enemy to go for, head for the closest
+        # unexplored parts of the map, one part each
+        self.map.update(game_map)
+        self.explore.update(self.map)
+        idle_jets = [row for row in np.arange(len(world.uids))[world.mine("jets")] if world.uids[row] not in targets]
+        explore_positions = {**self.explore.assign_rows(world, world.mine("ships"), "ships"),
+                             **self.explore.assign_rows(world, idle_jets, "jets")}
 
         # Controlling my vehicles ==============================================
 
@@ -181,39 +191,40 @@ class PlayerAi:
         # shortest path on the map (i.e. they may go through the map boundaries).
 
         # Iterate through all my tanks
+        self.profiler.begin("tanks")
         if "tanks" in myinfo:
             for tank in myinfo["tanks"]:
-                if (tank.uid in self.previous_positions) and (not tank.stopped):
+                if self.units.is_tracked(tank.uid) and (not tank.stopped):
                     # If the tank position is the same as the previous position,
                     # set a random heading
-                    if all(tank.position == self.previous_positions[tank.uid]):
-                        tank.set_heading(np.random.random() * 360.0)
+                    if self.units.is_stationary(tank.uid):
+                        tank.set_heading(self.rng.heading())
                     # Else, if there is a target, go to the target
-                    if targets:
-                        target = targets.pop()
-                        tank.goto(*target)
-                # Store the previous position of this tank for the next time step
-                self.previous_positions[tank.uid] = tank.position
+                    if tank.uid in targets:
+                        tank.goto(*target_positions[targets[tank.uid]])
 
         # Iterate through all my ships
+        self.profiler.begin("ships")
         if "ships" in myinfo:
             for ship in myinfo["ships"]:
-                if ship.uid in self.previous_positions:
+                if self.units.is_tracked(ship.uid):
                     # If the ship position is the same as the previous position,
                     # convert the ship to a base if it is far from the owning base,
                     # set a random heading otherwise
-                    if all(ship.position == self.previous_positions[ship.uid]):
+                    if self.units.is_stationary(ship.uid):
                         if ship.get_distance(ship.owner.x, ship.owner.y) > 20:
                             ship.convert_to_base()
                         else:
-                            ship.set_heading(np.random.random() * 360.0)
-                # Store the previous position of this ship for the next time step
-                self.previous_positions[ship.uid] = ship.position
+                            ship.set_heading(self.rng.heading())
+                    elif ship.uid in explore_positions:
+                        ship.goto(*explore_positions[ship.uid])
 
         # Iterate through all my jets
+        self.profiler.begin("jets")
         if "jets" in myinfo:
             for jet in myinfo["jets"]:
                 # Jets simply go to the target if there is one, they never get stuck
-                if targets:
-                    target = targets.pop()
-                    jet.goto(*target)
+                if jet.uid in targets:
+                    jet.goto(*target_positions[targets[jet.uid]])
+                elif jet.uid in explore_positions:
+                    jet.goto(*explore_positions[jet.uid])
@@ -0,0 +1,89 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+from collections import deque
+import numpy as np
+
+
+class MapState:
+  """
+  The game map of the current tick, with a version number that goes up on
+  every tick it changed and a record of what changed.
+
+  update() is called once per tick and compares the new map with the stored
+  one into a reused buffer, so a tick without changes costs one comparison
+  and no allocation. The tiles that changed in the last `history` versions
+  are kept with their previous values: a derived cache remembers the
+  version it was built from and asks changes_since() what to redo, or
+  rebuilds when that returns None. dirty holds the blocks of block_size
+  tiles that changed in the last version as (x0, y0, x1, y1) rectangles,
+  end exclusive, one per run of blocks along a row.
+  """
+
+  def __init__(self, block_size: int = 16, history: int = 64):
+    self.block_size = block_size
+    self.history = history
+    self.game_map = None
+    self.version = 0
+    self.dirty = []
+    self._changes = deque()
+    self._diff = None
+
+  @property
+  def shape(self) -> tuple:
+    return self.game_map.shape
+
+  def update(self, game_map: np.ndarray) -> bool:
+    """Take this tick's map, True if it differs from the previous one."""
+    if self.game_map is None or self.game_map.shape != game_map.shape:
+      self.game_map = np.array(game_map)
+      self._diff = np.empty(game_map.shape, dtype=bool)
+      self._changes.clear()
+      self.version += 1
+      self.dirty = [(0, 0, game_map.shape[1], game_map.shape[0])]
+      return True
+
+    np.not_equal(self.game_map, game_map, out=self._diff)
+    if not self._diff.any():
+      return False
+
+    tiles = np.flatnonzero(self._diff)
+    flat = self.game_map.reshape(-1)
+    previous = flat[tiles]
+    flat[tiles] = game_map.reshape(-1)[tiles]
+    self.version += 1
+    self._changes.append((self.version, tiles, previous))
+    if len(self._changes) > self.history:
+      self._changes.popleft()
+    self.dirty = self.rectangles(tiles)
+    return True
+
+  def changes_since(self, version: int):
+    """
+    Flat indices of the tiles that differ from the map of the given version
+    and their values in it, None if that map is too old or of another shape.
+    """
+    first = self._changes[0][0] - 1 if self._changes else self.version
+    if version < first:
+      return None
+    changes = [(tiles, previous) for v, tiles, previous in self._changes if v > version]
+    if not changes:
+      return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=self.game_map.dtype)
+
+    # The value a tile had at that version is the one of its first change
+    tiles, first = np.unique(np.concatenate([tiles for tiles, _ in changes]), return_index=True)
+    previous = np.concatenate([previous for _, previous in changes])[first]
+    changed = self.game_map.reshape(-1)[tiles] != previous
+    return tiles[changed], previous[changed]
+
+  def rectangles(self, tiles: np.ndarray) -> list:
+    """Blocks holding the given flat tile indices, merged into (x0, y0, x1, y1) runs along rows."""
+    ny, nx = self.game_map.shape
+    size = self.block_size
+    columns = -(-nx // size)
+    y, x = np.divmod(tiles, nx)
+    blocks = np.unique((y // size) * columns + x // size)
+    rows, cols = np.divmod(blocks, columns)
+    starts = np.flatnonzero(np.r_[True, (np.diff(blocks) != 1) | (np.diff(rows) != 0)])
+    ends = np.r_[starts[1:], len(blocks)] - 1
+    return [(int(cols[start]) * size, int(rows[start]) * size, min((int(cols[end]) + 1) * size, nx),
+             min((int(rows[start]) + 1) * size, ny)) for start, end in zip(starts, ends)]
@@ -0,0 +1,85 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import json
+import os
+from types import SimpleNamespace
+
+# Set to the path of a parameters file, see load_params()
+PARAMS_ENV = "SUPREMACY_PARAMS"
+PARAMS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "params.json")
+
+# Name: (low, high) of the tunable build and behavior constants. Integer
+# bounds make an integer parameter.
+SCHEMA = {
+    # Mines a base builds before anything else
+    "max_mines": (1, 6),
+    # Tanks and ships a base builds in total (counters never go down)
+    "min_tanks": (0, 20),
+    "min_ships": (0, 10),
+    # Tanks alive per base kept up once the first builds are done
+    "max_tanks": (0, 30),
+    "max_ships": (0, 10),
+    # Jets stay within this distance of their base unless they attack
+    "defensive_radius": (20.0, 400.0),
+    # 1 to send the attack wings to my most outgunned base before the enemy's
+    "relieve_bases": (0, 1),
+    # Jets further than this from their base fly back
+    "home_distance": (100.0, 1000.0),
+    # Ships only turn into a base this far from my closest base
+    "min_base_ship_distance": (5.0, 100.0),
+    # Share of the new bases that build tanks rather than jets
+    "tank_share": (0.0, 1.0),
+}
+
+
+def clip(name: str, value):
+  """Value cast to the type of the parameter and clipped to its bounds."""
+  low, high = SCHEMA[name]
+  if isinstance(low, int):
+    value = int(round(value))
+  return type(low)(min(max(value, low), high))
+
+
+def resolve(defaults: dict, overrides: dict = None) -> SimpleNamespace:
+  """Parameters of a bot: its defaults, replaced by the given overrides."""
+  values = dict(defaults)
+  for name, value in (overrides or {}).items():
+    if name not in defaults:
+      raise ValueError(f"unknown parameter {name!r}, expected one of {sorted(defaults)}")
+    values[name] = clip(name, value)
+  return SimpleNamespace(**values)
+
+
+def load_params(module: str, defaults: dict, path: str = None) -> SimpleNamespace:
+  """
+  Parameters of the bot in `module` (its __name__), called once at startup.
+
+  The parameters file (the path in SUPREMACY_PARAMS, else params.json next
+  to this module, if any) maps bot module names to the parameters that
+  differ from the defaults, e.g. as written by the sweep:
+
+      {"hunterx_ai": {"min_tanks": 8, "tank_share": 0.65}}
+  """
+  return resolve(defaults, load_overrides(module, path))
+
+
+def load_overrides(module: str, path: str = None) -> dict:
+  """The parameters of the bot in `module` that the parameters file overrides."""
+  path = path or os.environ.get(PARAMS_ENV) or PARAMS_FILE
+  if not os.path.exists(path):
+    return {}
+  with open(path) as f:
+    return json.load(f).get(module.rsplit(".", 1)[-1], {})
+
+
+def save_params(module: str, values: dict, path: str = None) -> None:
+  """Store the parameters of one bot in the parameters file, keeping the other bots."""
+  path = path or os.environ.get(PARAMS_ENV) or PARAMS_FILE
+  stored = {}
+  if os.path.exists(path):
+    with open(path) as f:
+      stored = json.load(f)
+  stored[module.rsplit(".", 1)[-1]] = values
+  with open(path + ".tmp", "w") as f:
+    json.dump(stored, f, indent=2, sort_keys=True)
+  os.replace(path + ".tmp", path)
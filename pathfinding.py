@@ -0,0 +1,300 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+from collections import OrderedDict
+import heapq
+import math
+import numpy as np
+
+from .flowfield import NEIGHBOURS, passable_mask
+from .geometry import torus_delta, torus_distance
+from .hierarchy import ClusterGraph
+from .mapstate import MapState
+from .regions import Regions
+
+KINDS = ("tanks", "ships")
+STEP_COSTS = np.hypot(NEIGHBOURS[:, 0], NEIGHBOURS[:, 1]).tolist()
+
+
+def astar(passable: np.ndarray, start: tuple, goal: tuple, max_expansions: int = 50000,
+          wrap: bool = True):
+  """
+  A* over the 8-connected tiles of a map that wraps around its edges (or of a
+  bounded part of it, with wrap=False).
+
+  Start and goal are (x, y) tiles; the goal does not have to be passable so
+  that e.g. a tank can path onto a base. Returns the list of (x, y) tiles from
+  start to goal, or None if the goal is unreachable within max_expansions.
+  """
+  ny, nx = passable.shape
+  passable = passable.ravel().tolist()
+  offsets = NEIGHBOURS.tolist()
+  gx, gy = goal
+
+  def heuristic(x, y):
+    dx = abs(x - gx)
+    dy = abs(y - gy)
+    if wrap:
+      dx = min(dx, nx - dx)
+      dy = min(dy, ny - dy)
+    return max(dx, dy) + (math.sqrt(2) - 1) * min(dx, dy)
+
+  start_index = start[1] * nx + start[0]
+  goal_index = gy * nx + gx
+  cost = {start_index: 0.0}
+  parent = {start_index: None}
+  queue = [(heuristic(*start), start_index)]
+
+  expansions = 0
+  while queue:
+    _, index = heapq.heappop(queue)
+    if index == goal_index:
+      path = []
+      while index is not None:
+        path.append((index % nx, index // nx))
+        index = parent[index]
+      return path[::-1]
+
+    expansions += 1
+    if expansions > max_expansions:
+      return None
+
+    y, x = divmod(index, nx)
+    base_cost = cost[index]
+    for (dx, dy), step in zip(offsets, STEP_COSTS):
+      neighbour_x = x + dx
+      neighbour_y = y + dy
+      if wrap:
+        neighbour_x %= nx
+        neighbour_y %= ny
+      elif not (0 <= neighbour_x < nx and 0 <= neighbour_y < ny):
+        continue
+      neighbour = neighbour_y * nx + neighbour_x
+      if not passable[neighbour] and neighbour != goal_index:
+        continue
+      # Do not cut corners, vehicles would get stuck on them
+      if dx and dy and not (passable[y * nx + neighbour_x] and passable[neighbour_y * nx + x]):
+        continue
+      neighbour_cost = base_cost + step
+      if neighbour_cost < cost.get(neighbour, math.inf):
+        cost[neighbour] = neighbour_cost
+        parent[neighbour] = index
+        heapq.heappush(queue, (neighbour_cost + heuristic(neighbour_x, neighbour_y), neighbour))
+
+  return None
+
+
+class PathPlanner:
+  """
+  Cached A* routes for tanks (land) and ships (water).
+
+  Routes are lists of (x, y) waypoints that the vehicle loops can follow with
+  goto(). They are stored in an LRU cache keyed by vehicle kind, coarse start
+  cell, coarse goal cell and map version, so vehicles travelling between the
+  same areas share one search. When newly revealed tiles change passability,
+  only those tiles are masked again and only the clusters holding them are
+  rebuilt. Cached routes that cross a tile that became impassable, or long
+  routes through a changed cluster, are dropped and the remaining ones carry
+  over to the new map version.
+
+  Goals further away than long_range are planned on a ClusterGraph instead:
+  only the way out of the first cluster is refined into tiles, the rest of
+  the route goes from entrance to entrance, and steer() plans again once the
+  vehicle has left the refined part. Goals that lie in another land or water
+  region than the vehicle are rejected up front, without any search.
+  """
+
+  def __init__(self, coarse: int = 8, capacity: int = 256, spacing: int = 8,
+               cluster_size: int = 32, long_range: float = 96):
+    self.coarse = coarse
+    self.capacity = capacity
+    self.spacing = spacing
+    self.cluster_size = cluster_size
+    self.long_range = long_range
+    self.version = 0
+    self.size = None
+    self.masks = {}
+    self.graphs = {}
+    self.regions = Regions()
+    self._map_version = 0
+    self._cache = OrderedDict()
+    self._routes = {}
+
+  def update(self, map_state: MapState) -> bool:
+    if self._map_version == map_state.version:
+      return False
+
+    game_map = map_state.game_map
+    changes = map_state.changes_since(self._map_version) if self.masks else None
+    if changes is None:
+      self.masks = {kind: passable_mask(game_map, kind) for kind in KINDS}
+      self.graphs = {kind: ClusterGraph(self.masks[kind], self.cluster_size) for kind in KINDS}
+      self._cache.clear()
+    else:
+      # Only the changed tiles are masked again, and only the clusters they
+      # lie in are rebuilt
+      tiles = changes[0]
+      ny, nx = game_map.shape
+      blocked, dirty = {}, {}
+      for kind in KINDS:
+        mask = self.masks[kind].reshape(-1)
+        passable = passable_mask(game_map.reshape(-1)[tiles], kind)
+        switched = tiles[mask[tiles] != passable]
+        blocked[kind] = tiles[mask[tiles] & ~passable]
+        mask[tiles] = passable
+        if len(switched):
+          self.graphs[kind].update(switched)
+        dirty[kind] = np.unique(self.graphs[kind].cluster_of(switched % nx, switched // nx))
+
+      cache = OrderedDict()
+      for (kind, start, goal, _), (route, waypoints, refined) in self._cache.items():
+        # Failed searches are retried, the revealed tiles may open a way.
+        # Routes are dropped where a tile of theirs became impassable, long
+        # ones also where they pass through a cluster that changed.
+        if waypoints is None:
+          continue
+        if np.isin(route[:, 1] * nx + route[:, 0], blocked[kind]).any():
+          continue
+        if refined < len(waypoints) and np.isin(self.graphs[kind].cluster_of(route[:, 0], route[:, 1]),
+                                                dirty[kind]).any():
+          continue
+        cache[kind, start, goal, self.version + 1] = (route, waypoints, refined)
+      self._cache = cache
+
+    self.regions.update(map_state)
+    self._map_version = map_state.version
+    self.size = np.array([game_map.shape[1], game_map.shape[0]], dtype=float)
+    self.version += 1
+    return True
+
+  def _tile(self, position: np.ndarray) -> tuple:
+    nx, ny = self.size.astype(int)
+    return int(position[0]) % nx, int(position[1]) % ny
+
+  def _cell(self, tile: tuple) -> tuple:
+    return tile[0] // self.coarse, tile[1] // self.coarse
+
+  def _waypoints(self, path: list) -> list:
+    """
+    Thin a tile path down to its turns, plus one waypoint every `spacing`
+    tiles on long straight stretches, so that driving straight from one
+    waypoint to the next stays on the path.
+    """
+    waypoints = []
+    last = 0
+    for i in range(1, len(path)):
+      step = ((path[i][0] - path[i - 1][0]) % self.size[0], (path[i][1] - path[i - 1][1]) % self.size[1])
+      turn = i + 1 < len(path) and step != (
+          (path[i + 1][0] - path[i][0]) % self.size[0], (path[i + 1][1] - path[i][1]) % self.size[1])
+      if turn or i - last >= self.spacing or i == len(path) - 1:
+        waypoints.append((path[i][0] + 0.5, path[i][1] + 0.5))
+        last = i
+    if not waypoints and path:
+      waypoints.append((path[0][0] + 0.5, path[0][1] + 0.5))
+    return waypoints
+
+  def _plan(self, kind: str, start: tuple, goal: tuple) -> tuple:
+    """(tiles, waypoints, refined) of a fresh search, waypoints None if unreachable."""
+    if torus_distance(start, goal, self.size) <= self.long_range:
+      path = astar(self.masks[kind], start, goal)
+      if path is None:
+        return None, None, 0
+      waypoints = self._waypoints(path)
+      return np.array(path), waypoints, len(waypoints)
+
+    graph = self.graphs[kind]
+    nodes = graph.abstract_path(start, goal)
+    if nodes is None:
+      return None, None, 0
+
+    # Refine the way out of the start cluster, up to the first entrance crossed
+    exit_index = 0
+    while exit_index + 1 < len(nodes) and graph.partner[nodes[exit_index]] != nodes[exit_index + 1]:
+      exit_index += 1
+    if nodes:
+      exit_tile = (int(graph.node_x[nodes[exit_index]]), int(graph.node_y[nodes[exit_index]]))
+    else:
+      exit_tile = goal
+    x0, y0, x1, y1 = graph.cluster_bounds(int(graph.cluster_of(*start)))
+    local = astar(self.masks[kind][y0:y1, x0:x1], (start[0] - x0, start[1] - y0),
+                  (exit_tile[0] - x0, exit_tile[1] - y0), wrap=False)
+    if local is None:
+      return None, None, 0
+    path = [(x + x0, y + y0) for x, y in local]
+    waypoints = self._waypoints(path)
+    entrances = [(int(graph.node_x[node]), int(graph.node_y[node])) for node in nodes[exit_index + 1:]]
+    refined = len(waypoints) + min(1, len(entrances))
+
+    for tile in entrances + [goal]:
+      waypoint = (tile[0] + 0.5, tile[1] + 0.5)
+      if waypoint != waypoints[-1]:
+        waypoints.append(waypoint)
+    return np.array(path + entrances), waypoints, refined
+
+  def _clear(self, mask: np.ndarray, start: np.ndarray, end: tuple) -> bool:
+    """Whether the straight line from start to end only crosses passable tiles."""
+    delta = torus_delta(start, end, self.size)
+    samples = np.linspace(0, 1, int(np.hypot(*delta) * 4) + 2)[:, None]
+    points = (np.asarray(start) + samples * delta).astype(int) % self.size.astype(int)
+    return bool(mask[points[:, 1], points[:, 0]].all())
+
+  def _lookup(self, kind: str, start: np.ndarray, goal: np.ndarray) -> tuple:
+    start = self._tile(start)
+    goal = self._tile(goal)
+    key = (kind, self._cell(start), self._cell(goal), self.version)
+
+    if key in self._cache:
+      self._cache.move_to_end(key)
+      return self._cache[key]
+
+    # Failures are cached too, so unreachable goals are not searched again
+    if self.regions.reachable(kind, start, goal):
+      self._cache[key] = self._plan(kind, start, goal)
+    else:
+      self._cache[key] = (None, None, 0)
+    if len(self._cache) > self.capacity:
+      self._cache.popitem(last=False)
+    return self._cache[key]
+
+  def route(self, kind: str, start: np.ndarray, goal: np.ndarray):
+    """Waypoints from start to goal for a vehicle kind, None if unreachable."""
+    return self._lookup(kind, start, goal)[1]
+
+  def steer(self, vehicle, kind: str, goal: np.ndarray) -> bool:
+    """
+    Send the vehicle towards its next waypoint on the way to goal. Returns
+    False if there is no route, leaving the vehicle's command untouched.
+    """
+    goal_cell = self._cell(self._tile(goal))
+    state = self._routes.get(vehicle.uid)
+    for _ in range(2):
+      if state is None or state[0] != goal_cell or state[1] != self.version:
+        _, waypoints, refined = self._lookup(kind, vehicle.position, goal)
+        if waypoints is None:
+          self._routes.pop(vehicle.uid, None)
+          return False
+        state = [goal_cell, self.version, waypoints, 0, refined]
+        self._routes[vehicle.uid] = state
+
+      _, _, waypoints, index, refined = state
+      mask = self.masks[kind]
+      # Skip ahead to the furthest waypoint in a straight line of sight
+      while index < len(waypoints) - 1 and self._clear(mask, vehicle.position, waypoints[index + 1]):
+        index += 1
+      state[3] = index
+
+      # Past the refined part of a long route: plan again from here
+      if index < refined or refined >= len(waypoints):
+        break
+      state = None
+
+    # The goal may have moved within its cell since the route was planned
+    if index == len(waypoints) - 1:
+      vehicle.goto(*goal)
+    else:
+      vehicle.goto(*waypoints[index])
+    return True
+
+  def forget(self, uids) -> None:
+    """Drop the route state of vehicles that are gone."""
+    for uid in uids:
+      self._routes.pop(uid, None)
@@ -1,26 +1,38 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
-from collections import defaultdict
 from enum import Enum, auto
-import math
 import numpy as np
 
+from .influence import InfluenceMap
+from .mapstate import MapState
+from .params import load_params
+from .profiling import PhaseProfiler, profiled, timed
+from .randomness import BotRandom
+from .registry import BaseRegistry
+from .replay import recorded
+from .scheduler import BUILD, IDLE, THREATENED, TickScheduler
+from .sectors import SectorIndex
+from .sites import ConversionSites
+from .snapshot import WorldSnapshot
+from .spatial import SpatialHash
+from .terrain import LandHeadingField
+from .tracking import MotionTracker
+from .units import UnitStore
+
 # This is your team name
 CREATOR = "hunter"
 
-
-def heading_away_from_land(game_map: np.ndarray, x: int, y: int) -> np.ndarray:
-  offset = 5
-  surrounding = game_map[y - offset:y + offset + 1, x - offset:x + offset + 1]
-  samples = []
-
-  for sx, sy in np.ndindex(surrounding.shape):
-    if sx == offset and sy == offset:
-      continue
-    if surrounding[sx, sy] != 1:
-      samples.append(np.nan_to_num(np.arctan2(y - sy, x - sx)))
-
-  return np.nan_to_num(np.mean(samples)) * 180 / np.pi
+# Build and behavior constants (see params.SCHEMA), tuned values are loaded
+# from the parameters file at startup
+PARAMS = {
+  "max_mines": 3,
+  "min_tanks": 5,
+  "min_ships": 3,
+  "max_tanks": 10,
+  "defensive_radius": 100.0,
+  "relieve_bases": 0,
+  "min_base_ship_distance": 20.0,
+}
 
 
 # This is the AI bot that will be instantiated for the competition
@@ -28,15 +40,118 @@ class PlayerAi:
 
   def __init__(self):
     self.team = CREATOR  # Mandatory attribute
-
-    # Record the previous positions of all my vehicles
-    self.previous_positions = {}
-    self.historic_base_positions = set()
-
-    self.base_ntanks = defaultdict(lambda: 0)
-    self.base_nships = defaultdict(lambda: 0)
-    self.base_njets =  defaultdict(lambda: 0)
-
+    self.params = load_params(__name__, PARAMS)
+
+    # This tick's map, with a version and the tiles that changed
+    self.map = MapState()
+    self.land_headings = LandHeadingField()
+
+    # Record the previous positions of all my units and the build counters of
+    # my bases, both dropped as soon as the unit is gone
+    self.units = UnitStore({"ntanks": 0, "nships": 0, "njets": 0})
+    # Every base seen so far, kept after it drops out of view
+    self.bases = BaseRegistry()
+    # Directions out of my bases that are free for launching ships
+    self.sectors = SectorIndex()
+    # Where ships can settle, and the way there over water
+    self.sites = ConversionSites()
+    # Recent positions of the enemy vehicles, to lead moving targets
+    self.tracker = MotionTracker()
+    # Enemy and friendly attack around every point of the map
+    self.influence = InfluenceMap()
+
+    # Per-phase timings, only collected when profiling is switched on
+    self.profiler = PhaseProfiler(CREATOR)
+    # Seeded random numbers, the match runner sets the seed
+    self.rng = BotRandom(CREATOR)
+    # Commands for the units past the per-tick time budget are deferred
+    self.scheduler = TickScheduler(budget=0.02)
+
+  @timed("build")
+  def build(self, base, base_tanks: list):
+    base_ntanks = self.units.get(base.uid, "ntanks")
+    base_nships = self.units.get(base.uid, "nships")
+    base_njets =  self.units.get(base.uid, "njets")
+
+    heading_away = self.land_headings.heading(base.x, base.y)
+
+    # First we need to prioritize building our 3 mines, that way we have
+    # ample production for all of our conquests.
+    if base.mines < self.params.max_mines:
+      if base.crystal > base.cost("mine"):
+        base.build_mine()
+    elif base.crystal > base.cost("tank") and base_ntanks < self.params.min_tanks:
+      base.build_tank(np.flip(heading_away))
+      self.units.add(base.uid, "ntanks")
+    elif base.crystal > base.cost("ship") and base_nships < self.params.min_ships:
+        # Launch into the widest gap between my other bases and the land
+        # around this one
+        heading_away = self.sectors.heading(base.uid, heading_away)
+
+        base.build_ship(heading_away)
+        self.units.add(base.uid, "nships")
+    elif base.crystal > base.cost("tank") and len(base_tanks) < self.params.max_tanks:
+      base.build_tank(np.flip(heading_away))
+      self.units.add(base.uid, "ntanks")
+    elif base.crystal > base.cost("jet"):
+        jet_uid = base.build_jet(heading=self.rng.heading())
+        self.units.add(base.uid, "njets")
+
+  @timed("jets")
+  def command_jet(self, jet, base_njets: int, threatened_position, enemy_base_position, chase: bool, course: tuple):
+    defensive_radius = self.params.defensive_radius
+
+    if base_njets >= 3:
+      if threatened_position is not None:
+        jet.goto(*threatened_position)
+      elif enemy_base_position is not None:
+        jet.goto(*enemy_base_position)
+    elif jet.get_distance(jet.owner.x, jet.owner.y) > defensive_radius:
+      jet.goto(jet.owner.x, jet.owner.y)
+    elif chase:
+      closest_vehicle_distance, closest_vehicle_intercept = course
+      if closest_vehicle_distance < defensive_radius:
+        jet.goto(*closest_vehicle_intercept)
+
+  @timed("tanks")
+  def command_tank(self, tank):
+    if self.units.is_tracked(tank.uid) and (not tank.stopped):
+      # If the tank position is the same as the previous position,
+      # set a random heading
+      if self.units.is_stationary(tank.uid):
+        tank.set_heading(self.rng.heading())
+
+  @timed("ships")
+  def command_ship(self, ship, base_index: SpatialHash, base_positions: list):
+    if self.units.is_tracked(ship.uid):
+      # Settle as soon as the ship is on a free site
+      if self.sites.is_free(ship.x, ship.y, ship.uid) and ship.convert_to_base() is not None:
+        return
+      # If the ship position is the same as the previous position,
+      # convert the ship to a base if it is far from the owning base,
+      # set a random heading otherwise
+      if self.units.is_stationary(ship.uid):
+        min_base_ship_distance = self.params.min_base_ship_distance
+        closest_base_distance, closest_base_row = base_index.nearest(ship.position)
+        closest_base_position = base_positions[closest_base_row]
+
+        if closest_base_distance > min_base_ship_distance:
+          # Try to convert the ship into a base
+          base_uid = ship.convert_to_base()
+
+          # We failed and most likely got stuck, lets move a tiny bit
+          if base_uid is None:
+            ship.set_heading((ship.heading - 5) % 360)
+
+        else:
+          # Lets move in the next best direction
+          ship.set_heading(self.land_headings.heading(*closest_base_position))
+      # Sail down the water distance to the site the ship claimed
+      elif self.sites.heading(ship.x, ship.y, ship.uid) is not None:
+        ship.set_heading(self.sites.heading(ship.x, ship.y, ship.uid))
+
+  @recorded
+  @profiled
   def run(self, t: float, dt: float, info: dict, game_map: np.ndarray):
     """
         This is the main function that will be called by the game engine.
@@ -67,160 +182,91 @@ class PlayerAi:
             1 means land, 0 means water, -1 means no info.
         """
 
+    # The time budget of the tick covers everything below
+    self.scheduler.start()
+    self.profiler.begin("perceive")
     # Get information about my team
     myinfo = info[self.team]
+    self.map.update(game_map)
+    self.land_headings.update(self.map)
+
+    world = WorldSnapshot(info, self.team, game_map.shape)
+    my_rows = world.my_rows()
+    self.sites.forget(self.units.update([world.uids[row] for row in my_rows], world.position[my_rows]))
 
-    enemy_bases = []
-    enemy_tanks = []
-    enemy_ships = []
-    enemy_jets  = []
-
-    if len(info) > 1:
-      for name in info:
-        if name == self.team:
-          continue
-
-        if "bases" in info[name]:
-          enemy_bases += info[name]["bases"]
-        if "tanks" in info[name]:
-          enemy_tanks += info[name]["tanks"]
-        if "ships" in info[name]:
-          enemy_ships += info[name]["ships"]
-        if "jets" in info[name]:
-          enemy_jets += info[name]["jets"]
+    enemy_bases = world.objects_in(world.enemy("bases"))
+    enemy_tanks = world.objects_in(world.enemy("tanks"))
+    enemy_ships = world.objects_in(world.enemy("ships"))
+    enemy_jets = world.objects_in(world.enemy("jets"))
 
     enemy_vehicles = enemy_tanks + enemy_ships + enemy_jets
     enemy_entities = enemy_bases + enemy_vehicles
 
-    base_grouped_tanks = defaultdict(list)
-    if "tanks" in myinfo:
-      for tank in myinfo["tanks"]:
-        base_grouped_tanks[tank.owner.uid].append(tank)
-
-    base_grouped_ships = defaultdict(list)
-    if "ships" in myinfo:
-      for ship in myinfo["ships"]:
-        base_grouped_ships[ship.owner.uid].append(ship)
-
-    base_grouped_jets = defaultdict(list)
-    if "jets" in myinfo:
-      for jet in myinfo["jets"]:
-        base_grouped_jets[jet.owner.uid].append(jet)
+    base_grouped_tanks = world.group_by_owner("tanks")
+    base_grouped_ships = world.group_by_owner("ships")
+    base_grouped_jets = world.group_by_owner("jets")
 
     base_positions = [(base.x, base.y) for base in myinfo["bases"]]
-    self.historic_base_positions.update(base_positions)
-    destroyed_base_positions = self.historic_base_positions.difference(base_positions)
+    base_index = SpatialHash(base_positions, world.size)
+    enemy_vehicle_rows = np.r_[world.enemy("tanks"), world.enemy("ships"), world.enemy("jets")]
+    enemy_vehicle_index = SpatialHash(world.position[enemy_vehicle_rows], world.size)
+    self.tracker.update(t, [world.uids[row] for row in enemy_vehicle_rows], world.position[enemy_vehicle_rows],
+                        world.size)
+
+    # Every jet heads for where its closest enemy vehicle will be when it
+    # gets there, rather than for where the vehicle is now
+    jet_rows = np.arange(len(world.uids))[world.mine("jets")]
+    closest_vehicle_distances = np.full(len(jet_rows), np.inf)
+    closest_vehicle_intercepts = world.position[jet_rows]
+    if len(enemy_vehicles) >= 1:
+      closest_vehicle_distances, closest_vehicle_rows = enemy_vehicle_index.nearest(world.position[jet_rows])
+      closest_vehicle_rows = enemy_vehicle_rows[closest_vehicle_rows]
+      closest_vehicle_intercepts = self.tracker.intercepts(
+          world.position[jet_rows], world.speed[jet_rows], [world.uids[row] for row in closest_vehicle_rows],
+          world.position[closest_vehicle_rows])
+    jet_courses = {world.uids[row]: (distance, intercept) for row, distance, intercept in
+                   zip(jet_rows, closest_vehicle_distances, closest_vehicle_intercepts)}
+    self.bases.update(t, world)
+    self.sectors.update(self.bases, self.map)
+    self.sites.update(self.map, self.bases.positions(True, 0.5), self.bases.positions(False),
+                      self.params.min_base_ship_distance)
+    # Jets stay within the defensive radius of their base and chase what is
+    # within it of themselves, so only bases with an enemy vehicle within
+    # twice that need their jets. Half the weakest attack tells a vehicle
+    # apart from the rounding left by the incremental updates.
+    self.influence.update(world, 2 * self.params.defensive_radius + self.influence.margin)
+    enemy_attack = world.attack[enemy_vehicle_rows]
+    chase_threat = 0.5 * enemy_attack.min() if len(enemy_attack) else np.inf
+    # My base where the enemy outguns me most, if the attack wings relieve it
+    threatened_base = -1
+    if self.params.relieve_bases:
+      threatened_base = self.influence.most_threatened(base_positions, chase_threat)
+
+    # Vehicles with an enemy vehicle close by are commanded before idle ones
+    vehicle_rows = np.r_[world.mine("tanks"), world.mine("ships"), world.mine("jets")]
+    threat_distance, _ = enemy_vehicle_index.nearest(world.position[vehicle_rows])
+    threatened = {world.uids[row] for row in vehicle_rows[threat_distance < self.params.defensive_radius]}
+    self.profiler.end()
 
     for base in myinfo["bases"]:
-      base_tanks = base_grouped_tanks[base.uid]
-      base_ships = base_grouped_ships[base.uid]
       base_jets = base_grouped_jets[base.uid]
+      self.scheduler.add(BUILD, base.uid, self.build, base, base_grouped_tanks[base.uid])
 
-      base_ntanks = self.base_ntanks[base.uid]
-      base_nships = self.base_nships[base.uid]
-      base_njets =  self.base_njets[base.uid]
-
-      heading_away = heading_away_from_land(game_map, base.x, base.y)
-
-      # First we need to prioritize building our 3 mines, that way we have
-      # ample production for all of our conquests.
-      if base.mines < 3:
-        if base.crystal > base.cost("mine"):
-          base.build_mine()
-      elif base.crystal > base.cost("tank") and base_ntanks < 5:
-        base.build_tank(np.flip(heading_away))
-        self.base_ntanks[base.uid] += 1
-      elif base.crystal > base.cost("ship") and base_nships < 3:
-          # We need to check that there is not a friendly base in the direct
-          # vicinity (a margin of 10 degrees in this case) of the heading we
-          # initially chose. If there is we want to shift our heading, here
-          # by 20 degrees.
-          for bx, by in base_positions:
-            margin = 10
-            heading_towards_base = np.nan_to_num(np.arctan2(base.y - by, base.x - bx))
-
-            if heading_towards_base - margin <= heading_away or heading_towards_base + margin >= heading_away:
-              heading_away = (heading_away + 20) % 360
-
-          base.build_ship(heading_away)
-          self.base_nships[base.uid] += 1
-      elif base.crystal > base.cost("tank") and len(base_tanks) < 10:
-        base.build_tank(np.flip(heading_away))
-        self.base_ntanks[base.uid] += 1
-      elif base.crystal > base.cost("jet"):
-          jet_uid = base.build_jet(heading=360 * np.random.random())
-          self.base_njets[base.uid] += 1
-
+      # The closest enemy base in view or seen in the last minute or so
+      enemy_base_distance, enemy_base_position = self.bases.nearest(base.position, False, 0.25)
+      enemy_base_position = enemy_base_position if np.isfinite(enemy_base_distance) else None
+      threatened_position = base_positions[threatened_base] if threatened_base >= 0 else None
+      chase = len(enemy_vehicles) >= 1 and self.influence.threat(base.position)[0] >= chase_threat
       for jet in base_jets:
-        defensive_radius = 100
-
-        if len(base_jets) >= 3:
-          if len(enemy_bases) >= 1:
-            closest_base_to_base = min(
-                enemy_bases, key=lambda enemy: base.get_distance(enemy.x, enemy.y, False))
-            jet.goto(closest_base_to_base.x, closest_base_to_base.y)
-        elif jet.get_distance(jet.owner.x, jet.owner.y) > defensive_radius:
-          jet.goto(jet.owner.x, jet.owner.y)
-        elif len(enemy_vehicles) >= 1:
-          closest_vehicle_to_jet = min(
-              enemy_vehicles, key=lambda enemy: jet.get_distance(enemy.x, enemy.y, False))
-          if jet.get_distance(closest_vehicle_to_jet.x, closest_vehicle_to_jet.y, False) < defensive_radius:
-            jet.goto(closest_vehicle_to_jet.x, closest_vehicle_to_jet.y)
-
-      for tank in base_tanks:
-        if (tank.uid in self.previous_positions) and (not tank.stopped):
-          # If the tank position is the same as the previous position,
-          # set a random heading
-          if all(tank.position == self.previous_positions[tank.uid]):
-            tank.set_heading(np.random.random() * 360.0)
-          # elif len(enemy_bases) > 0:
-          #   closest_base_to_tank = min(
-          #       enemy_bases, key=lambda enemy: tank.get_distance(enemy.x, enemy.y, False))
-          #   tank.goto(closest_base_to_tank.x, closest_base_to_tank.y)
-          # elif len(enemy_tanks) > 0:
-          #   closest_tank_to_tank = min(
-          #       enemy_tanks, key=lambda enemy: tank.get_distance(enemy.x, enemy.y, False))
-          #   tank.goto(closest_tank_to_tank.x, closest_tank_to_tank.y)
-          # elif len(enemy_tanks) > 0:
-          #   closest_tank_to_tank = min(
-          #       enemy_tanks, key=lambda enemy: tank.get_distance(enemy.x, enemy.y, False))
-          #   tank.goto(closest_tank_to_tank.x, closest_tank_to_tank.y)
-
-        # Store the previous position of this tank for the next time step
-        self.previous_positions[tank.uid] = tank.position
-
-      for ship in base_ships:
-        if ship.uid in self.previous_positions:
-          # If the ship position is the same as the previous position,
-          # convert the ship to a base if it is far from the owning base,
-          # set a random heading otherwise
-          if all(ship.position == self.previous_positions[ship.uid]):
-            min_base_ship_distance = 20
-            base_ship_distances = [((x, y), ship.get_distance(x, y, False))
-                                   for x, y in base_positions]
-            closest_base = min(
-                base_ship_distances,
-                key=lambda base_ship_distance: base_ship_distance[1])
-            closest_base_position = closest_base[0]
-            closest_base_distance = closest_base[1]
-
-            if closest_base_distance > min_base_ship_distance:
-              # Try to convert the ship into a base
-              base_uid = ship.convert_to_base()
-
-              # We failed and most likely got stuck, lets move a tiny bit
-              if base_uid is None:
-                ship.set_heading((ship.heading - 5) % 360)
-
-            else:
-              # ship.set_heading(np.random.random() * 360.0)
-              # next_heading = heading_away_from_land(game_map, *closest_base_position)
-              # Lets move in the next best direction
-              ship.set_heading(heading_away_from_land(game_map, *closest_base_position))
-          # else:
-          #   ship.set_heading((ship.heading + 5) % 360)
-        # Store the previous position of this ship for the next time step
-        self.previous_positions[ship.uid] = ship.position
+        self.scheduler.add(THREATENED if jet.uid in threatened else IDLE, jet.uid, self.command_jet,
+                           jet, len(base_jets), threatened_position, enemy_base_position, chase, jet_courses[jet.uid])
+      for tank in base_grouped_tanks[base.uid]:
+        self.scheduler.add(THREATENED if tank.uid in threatened else IDLE, tank.uid, self.command_tank, tank)
+      for ship in base_grouped_ships[base.uid]:
+        self.scheduler.add(THREATENED if ship.uid in threatened else IDLE, ship.uid, self.command_ship,
+                           ship, base_index, base_positions)
+
+    self.scheduler.run()
 
     # Controlling my bases =================================================
 
@@ -0,0 +1,203 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import atexit
+from contextlib import nullcontext
+import functools
+import json
+import os
+import time
+
+# Set to a file path (or to 1 for profile.json) to profile all bots and dump
+# their latency histograms there when the process exits. Read once, here, so
+# that @timed and the profilers agree.
+PROFILE_ENV = "SUPREMACY_PROFILE"
+ENABLED = bool(os.environ.get(PROFILE_ENV))
+PHASES = ("perceive", "build", "jets", "tanks", "ships")
+
+_NULL = nullcontext()
+# Histograms by bot name then phase, shared by all the profilers of a bot
+_histograms = {}
+
+
+class LatencyHistogram:
+  """
+  HDR-style histogram of nanosecond latencies.
+
+  Values are bucketed by their highest set bit, and every power of two is
+  split into 2**significant_bits linear sub-buckets. Recording is a couple of
+  integer operations, memory is fixed, and every percentile is exact to
+  within 1 / 2**significant_bits of its value (about 3% by default).
+  """
+
+  def __init__(self, significant_bits: int = 5):
+    self.significant_bits = significant_bits
+    self.counts = [0] * (64 << significant_bits)
+    self.count = 0
+    self.total = 0
+    self.max = 0
+
+  def _index(self, value: int) -> int:
+    shift = max(value.bit_length() - self.significant_bits - 1, 0)
+    return (shift << self.significant_bits) + (value >> shift)
+
+  def _value(self, index: int) -> int:
+    """Highest value that falls into the bucket."""
+    shift, sub = divmod(index, 1 << self.significant_bits)
+    if shift > 0:
+      shift -= 1
+      sub += 1 << self.significant_bits
+    return ((sub + 1) << shift) - 1
+
+  def record(self, value: int) -> None:
+    value = int(value)
+    self.counts[self._index(value)] += 1
+    self.count += 1
+    self.total += value
+    self.max = max(self.max, value)
+
+  def percentile(self, q: float) -> int:
+    if self.count == 0:
+      return 0
+    rank = max(1, -(-self.count * q // 100))
+    seen = 0
+    for index, count in enumerate(self.counts):
+      seen += count
+      if seen >= rank:
+        return min(self._value(index), self.max)
+    return self.max
+
+  def summary(self) -> dict:
+    """Count and mean, p50, p95, p99 and max in milliseconds."""
+    return {
+        "count": self.count,
+        "mean_ms": self.total / self.count / 1e6 if self.count else 0.0,
+        "p50_ms": self.percentile(50) / 1e6,
+        "p95_ms": self.percentile(95) / 1e6,
+        "p99_ms": self.percentile(99) / 1e6,
+        "max_ms": self.max / 1e6,
+    }
+
+
+class _PhaseTimer:
+
+  def __init__(self, totals: dict, name: str):
+    self.totals = totals
+    self.name = name
+    self.start = 0
+
+  def __enter__(self):
+    self.start = time.perf_counter_ns()
+    return self
+
+  def __exit__(self, *exc):
+    self.totals[self.name] = self.totals.get(self.name, 0) + time.perf_counter_ns() - self.start
+    return False
+
+
+class PhaseProfiler:
+  """
+  Per-phase timers for PlayerAi.run().
+
+  The bots mark where each phase of run() starts with begin(), which also
+  ends the phase before it; the last one ends with end() or with the tick.
+  Helpers can be timed with phase() as a context or with @timed instead.
+  Phases may be entered several times per tick (e.g. once per tank when the
+  work is scheduled unit by unit); their times are summed and recorded into
+  one LatencyHistogram per phase when the tick ends, next to the time of the
+  whole tick. The histograms are those of the bot's name, so every instance
+  of a bot (one per match) adds to the same ones. When profiling is disabled, begin() and end() return right
+  away and phase() hands out a shared null context, so the hooks can stay in
+  the bots.
+  """
+
+  def __init__(self, name: str, enabled: bool = None):
+    self.name = name
+    self.enabled = ENABLED if enabled is None else enabled
+    self.histograms = _histograms.setdefault(name, {}) if self.enabled else {}
+    self._totals = {}
+    self._timers = {}
+    self._current = None
+    self._started = 0
+
+  def begin(self, name: str) -> None:
+    """End the current phase, if any, and start timing the named one."""
+    if not self.enabled:
+      return
+    now = time.perf_counter_ns()
+    if self._current is not None:
+      self._totals[self._current] = self._totals.get(self._current, 0) + now - self._started
+    self._current, self._started = name, now
+
+  def end(self) -> None:
+    if not self.enabled or self._current is None:
+      return
+    self._totals[self._current] = self._totals.get(self._current, 0) + time.perf_counter_ns() - self._started
+    self._current = None
+
+  def phase(self, name: str):
+    if not self.enabled:
+      return _NULL
+    if name not in self._timers:
+      self._timers[name] = _PhaseTimer(self._totals, name)
+    return self._timers[name]
+
+  def record_tick(self, elapsed: int) -> None:
+    self.end()
+    for name, total in list(self._totals.items()) + [("tick", elapsed)]:
+      if name not in self.histograms:
+        self.histograms[name] = LatencyHistogram()
+      self.histograms[name].record(total)
+    self._totals.clear()
+
+  def report(self) -> dict:
+    return {name: histogram.summary() for name, histogram in self.histograms.items()}
+
+
+def profiled(run):
+  """Decorator for PlayerAi.run() recording a tick into self.profiler."""
+
+  @functools.wraps(run)
+  def wrapper(self, *args, **kwargs):
+    if not self.profiler.enabled:
+      return run(self, *args, **kwargs)
+    start = time.perf_counter_ns()
+    try:
+      return run(self, *args, **kwargs)
+    finally:
+      self.profiler.record_tick(time.perf_counter_ns() - start)
+
+  return wrapper
+
+
+def timed(phase: str):
+  """
+  Decorator timing a PlayerAi helper method as the given phase. Without
+  profiling switched on the method is left as it is.
+  """
+
+  def decorator(method):
+    if not ENABLED:
+      return method
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+      with self.profiler.phase(phase):
+        return method(self, *args, **kwargs)
+
+    return wrapper
+
+  return decorator
+
+
+@atexit.register
+def dump(path: str = None) -> None:
+  """Write the latency summaries of every profiled bot, by default where SUPREMACY_PROFILE says."""
+  if not _histograms:
+    return
+  path = path or os.environ.get(PROFILE_ENV, "")
+  if path in ("", "1"):
+    path = "profile.json"
+  report = {name: {phase: histogram.summary() for phase, histogram in histograms.items()}
+            for name, histograms in _histograms.items()}
+  with open(path, "w") as f:
+    json.dump(report, f, indent=2)
@@ -0,0 +1,49 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+import zlib
+import numpy as np
+
+# Set to an integer to seed the generators of all bots
+SEED_ENV = "SUPREMACY_SEED"
+
+
+class BotRandom:
+  """
+  Seeded random numbers of one bot, so that its matches can be replayed.
+
+  The seed is mixed with the bot's name, so bots seeded alike still draw
+  different numbers. Numbers are drawn from the generator `batch` at a time
+  in one vectorized call and handed out from that block, which makes the
+  single draws of the vehicle loops cheap; headings() hands out many at once.
+  """
+
+  def __init__(self, name: str, seed: int = None, batch: int = 256):
+    self.name = name
+    self.batch = batch
+    self.seed(int(os.environ.get(SEED_ENV, 0)) if seed is None else seed)
+
+  def seed(self, seed: int) -> None:
+    """Restart the numbers from a seed, the match runner calls this before the first tick."""
+    self.seed_value = int(seed)
+    self.generator = np.random.default_rng([self.seed_value, zlib.crc32(self.name.encode())])
+    self._block = np.empty(0)
+    self._next = 0
+
+  def uniforms(self, n: int) -> np.ndarray:
+    """n numbers uniform in [0, 1)."""
+    if self._next + n > len(self._block):
+      self._block = np.concatenate([self._block[self._next:], self.generator.random(max(n, self.batch))])
+      self._next = 0
+    self._next += n
+    return self._block[self._next - n:self._next]
+
+  def uniform(self) -> float:
+    return float(self.uniforms(1)[0])
+
+  def headings(self, n: int) -> np.ndarray:
+    """n random headings in degrees."""
+    return 360.0 * self.uniforms(n)
+
+  def heading(self) -> float:
+    return 360.0 * self.uniform()
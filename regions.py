@@ -0,0 +1,213 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from .geometry import torus_distance
+from .mapstate import MapState
+
+# The value a tile must have to belong to the regions of a vehicle kind
+KIND_VALUES = {"tanks": 1, "ships": 0}
+
+
+def find_roots(parent: np.ndarray, indices: np.ndarray) -> np.ndarray:
+  """Roots of the given flat indices in a union-find forest, compressing their paths."""
+  roots = parent[indices]
+  while True:
+    up = parent[roots]
+    if np.array_equal(up, roots):
+      break
+    roots = up
+  parent[indices] = roots
+  return roots
+
+
+def merge(parent: np.ndarray, a: np.ndarray, b: np.ndarray) -> None:
+  """
+  Union the pairs (a[i], b[i]) of a union-find forest stored as a flat parent
+  array. All pairs are hooked at once, the larger root under the smaller one,
+  until every pair shares a root. Large batches (labeling a whole map) flatten
+  the entire forest after each round, small ones only the paths they touch.
+  """
+  flatten = len(a) * 8 > len(parent)
+  while len(a) > 0:
+    root_a = find_roots(parent, a)
+    root_b = find_roots(parent, b)
+    apart = root_a != root_b
+    a, b = a[apart], b[apart]
+    root_a, root_b = root_a[apart], root_b[apart]
+    np.minimum.at(parent, np.maximum(root_a, root_b), np.minimum(root_a, root_b))
+    while flatten:
+      up = parent[parent]
+      if np.array_equal(up, parent):
+        break
+      parent[:] = up
+
+
+def neighbour_pairs(tiles: np.ndarray, shape: tuple) -> tuple:
+  """Flat indices of each tile repeated, and of its 4 wrapped neighbours."""
+  ny, nx = shape
+  y, x = np.divmod(tiles, nx)
+  neighbours = np.concatenate([
+      y * nx + (x + 1) % nx,
+      y * nx + (x - 1) % nx,
+      ((y + 1) % ny) * nx + x,
+      ((y - 1) % ny) * nx + x,
+  ])
+  return np.tile(tiles, 4), neighbours
+
+
+def label(mask: np.ndarray) -> np.ndarray:
+  """
+  Flat union-find parent array of the 4-connected regions of a mask on a
+  wrapped map, with every tile pointing straight at its root.
+
+  Tiles are first grouped into horizontal runs; the runs are then joined where
+  they wrap around the map and where runs on neighbouring rows overlap, with
+  one pair per overlap rather than per tile.
+  """
+  ny, nx = mask.shape
+  flat = mask.ravel()
+  starts = mask & ~np.roll(mask, 1, axis=1)
+  starts[:, 0] = mask[:, 0]
+  run_of = np.cumsum(starts.ravel()) - 1
+  run_first = np.flatnonzero(starts)
+
+  rows = np.flatnonzero(mask[:, 0] & mask[:, -1])
+  a = [run_of[rows * nx], run_of[rows * nx + nx - 1]]
+  overlap = mask & np.roll(mask, -1, axis=0)
+  overlap_starts = overlap & ~np.roll(overlap, 1, axis=1)
+  overlap_starts[:, 0] = overlap[:, 0]
+  y, x = np.nonzero(overlap_starts)
+  a.append(run_of[y * nx + x])
+  a.append(run_of[((y + 1) % ny) * nx + x])
+
+  run_parent = np.arange(len(run_first))
+  merge(run_parent, np.concatenate(a[::2]), np.concatenate(a[1::2]))
+  run_root = find_roots(run_parent, np.arange(len(run_first)))
+
+  parent = np.arange(flat.size)
+  tiles = np.flatnonzero(flat)
+  parent[tiles] = run_first[run_root[run_of[tiles]]]
+  return parent
+
+
+class Regions:
+  """
+  Connected regions of known land (for tanks) and known water (for ships) on
+  the wrapped map, 4-connected since vehicles cannot cut corners.
+
+  Regions are kept as union-find forests over the tiles, so region lookups
+  are a couple of array reads. When unknown (-1) tiles are revealed only the
+  new tiles are joined to their neighbours; the map is relabeled from scratch
+  only if an already known tile changes. Regions that still border unknown
+  tiles are open: they may turn out to connect to anything, so reachable()
+  only rules out targets that are provably cut off.
+  """
+
+  def __init__(self):
+    self.parents = {}
+    self.open = {}
+    # Tiles of each kind next to an unknown tile
+    self.border = {}
+    self._game_map = None
+    self._version = 0
+
+  def update(self, map_state: MapState) -> bool:
+    if self._version == map_state.version:
+      return False
+    changes = map_state.changes_since(self._version)
+    if changes is not None:
+      changed, previous = changes
+      relabel = (previous != -1).any()
+    else:
+      changed = None
+      relabel = True
+
+    game_map = self._game_map = map_state.game_map
+    self._version = map_state.version
+    flat = game_map.ravel()
+    if not relabel:
+      # Only the revealed tiles and their neighbours can enter or leave the border
+      around = np.unique(np.concatenate(neighbour_pairs(changed, game_map.shape)))
+
+    for kind, value in KIND_VALUES.items():
+      if relabel:
+        self.parents[kind] = label(game_map == value)
+        self.border[kind] = self._border(np.flatnonzero(flat == value))
+      else:
+        tiles = changed[flat[changed] == value]
+        a, b = neighbour_pairs(tiles, game_map.shape)
+        same = flat[b] == value
+        merge(self.parents[kind], a[same], b[same])
+        kept = self.border[kind][~np.isin(self.border[kind], around)]
+        self.border[kind] = np.union1d(kept, self._border(around[flat[around] == value]))
+      self.open[kind] = np.unique(find_roots(self.parents[kind], self.border[kind]))
+    return True
+
+  def _border(self, tiles: np.ndarray) -> np.ndarray:
+    """Those of the given flat indices that are next to an unknown tile."""
+    _, neighbours = neighbour_pairs(tiles, self._game_map.shape)
+    return tiles[(self._game_map.ravel()[neighbours] == -1).reshape(4, -1).any(axis=0)]
+
+  def _tile(self, position) -> int:
+    ny, nx = self._game_map.shape
+    return (int(position[1]) % ny) * nx + int(position[0]) % nx
+
+  def _around(self, kind: str, positions) -> tuple:
+    """
+    Region ids of the 3x3 tiles around each position (-1 for tiles of another
+    kind), and whether each position may connect to anything: it is next to
+    an unknown tile or to an open region.
+    """
+    ny, nx = self._game_map.shape
+    positions = np.asarray(positions, dtype=float).reshape(-1, 2).astype(np.int64)
+    offsets = np.arange(-1, 2)
+    xs = (positions[:, 0, None] + offsets) % nx
+    ys = (positions[:, 1, None] + offsets) % ny
+    tiles = (ys[:, :, None] * nx + xs[:, None, :]).reshape(len(positions), 9)
+    values = self._game_map.ravel()[tiles]
+    regions = np.where(values == KIND_VALUES[kind], find_roots(self.parents[kind], tiles), -1)
+    unbounded = (values == -1).any(axis=1) | np.isin(regions, self.open[kind]).any(axis=1)
+    return regions, unbounded
+
+  def region(self, kind: str, position) -> int:
+    """Region id of the tile under position, -1 if it is not of the kind."""
+    tile = self._tile(position)
+    if self._game_map.ravel()[tile] != KIND_VALUES[kind]:
+      return -1
+    return int(find_roots(self.parents[kind], np.array([tile]))[0])
+
+  def same_region(self, kind: str, a, b) -> bool:
+    region = self.region(kind, a)
+    return region >= 0 and region == self.region(kind, b)
+
+  def reachable(self, kind: str, start, goals):
+    """
+    Whether a vehicle of the kind at start may be able to get next to each
+    goal, e.g. a tank to an enemy base or a ship to a base on the coast.
+    Takes a single (x, y) goal or an (m, 2) batch.
+    """
+    goals = np.asarray(goals, dtype=float)
+    start_regions, start_unbounded = self._around(kind, start)
+    start_regions = start_regions[start_regions >= 0]
+    goal_regions, goal_unbounded = self._around(kind, goals)
+    result = np.isin(goal_regions, start_regions).any(axis=1) | (start_unbounded[0] & goal_unbounded)
+    if goals.ndim == 1:
+      return bool(result[0])
+    return result
+
+  def closest_reachable(self, kind: str, start, goals: np.ndarray, origin=None) -> int:
+    """
+    Index of the goal closest to origin (start by default) among those that
+    may be reached from start, -1 if none.
+    """
+    goals = np.asarray(goals, dtype=float).reshape(-1, 2)
+    if len(goals) == 0:
+      return -1
+    candidates = np.flatnonzero(self.reachable(kind, start, goals))
+    if len(candidates) == 0:
+      return -1
+    ny, nx = self._game_map.shape
+    origin = start if origin is None else origin
+    distances = torus_distance(origin, goals[candidates], (nx, ny))
+    return int(candidates[np.argmin(distances)])
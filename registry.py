@@ -0,0 +1,118 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from .geometry import torus_distance
+from .snapshot import WorldSnapshot
+from .spatial import SpatialHash
+
+
+class BaseRegistry:
+  """
+  Every base seen during the match, mine and the enemies', by uid.
+
+  Bases do not move, so a base that drops out of the info dict is kept with
+  its position, team and the time it was last seen. Confidence that it still
+  stands is 1 while it is in view and halves every half_life seconds after
+  that; my own bases are always in view, so one of mine that is gone was
+  destroyed and has a confidence of 0. So was an enemy base that is missing
+  while one of my bases or vehicles is within vision of where it stood, until
+  it is seen again. Nearest-base queries go through a
+  spatial index that is only rebuilt when the set of bases they cover
+  changes, or compare with every base when there are at most brute_force.
+  """
+
+  def __init__(self, half_life: float = 30.0, capacity: int = 64, brute_force: int = 32, vision: float = 40.0):
+    self.half_life = half_life
+    self.vision = vision
+    self.brute_force = brute_force
+    self.slots = {}
+    self.teams = []
+    self.position = np.zeros((capacity, 2))
+    self.team = np.zeros(capacity, dtype=np.int16)
+    self.last_seen = np.zeros(capacity)
+    self.confidence = np.zeros(capacity)
+    self.destroyed = np.zeros(capacity, dtype=bool)
+    self.mine = np.zeros(capacity, dtype=bool)
+    self.size = np.ones(2)
+    self._indices = {}
+
+  def __len__(self) -> int:
+    return len(self.slots)
+
+  def __contains__(self, uid) -> bool:
+    return uid in self.slots
+
+  def _grow(self) -> None:
+    self.position = np.concatenate([self.position, np.zeros_like(self.position)])
+    for name in ("team", "last_seen", "confidence", "destroyed", "mine"):
+      values = getattr(self, name)
+      setattr(self, name, np.concatenate([values, np.zeros_like(values)]))
+
+  def update(self, t: float, world: WorldSnapshot) -> None:
+    """Record the bases in view at time t and age the others."""
+    self.size = world.size
+    rows = np.arange(len(world.uids))[world.rows_of("bases")]
+    for row in rows:
+      uid = world.uids[row]
+      if uid not in self.slots:
+        if len(self.slots) == len(self.position):
+          self._grow()
+        slot = self.slots[uid] = len(self.slots)
+        team = world.objects[row].team
+        if team not in self.teams:
+          self.teams.append(team)
+        self.position[slot] = world.position[row]
+        self.team[slot] = self.teams.index(team)
+        self.mine[slot] = team == world.team
+
+    n = len(self.slots)
+    slots = np.array([self.slots[world.uids[row]] for row in rows], dtype=np.int64)
+    seen = np.zeros(n, dtype=bool)
+    seen[slots] = True
+    self.last_seen[slots] = t
+    # An enemy base stays destroyed until it is seen again, and one that
+    # should be in view of my units but is not was destroyed
+    gone = ~self.mine[:n] & ~seen & self.destroyed[:n]
+    missing = np.flatnonzero(~self.mine[:n] & ~seen & ~gone)
+    my_rows = world.my_rows()
+    if len(missing) and len(my_rows):
+      distances, _ = SpatialHash(world.position[my_rows], self.size).nearest(self.position[missing])
+      gone[missing[distances <= self.vision]] = True
+    self.destroyed[:n] = (self.mine[:n] & ~seen) | gone
+    # Bases in view are there for sure, an enemy base seen again included
+    self.confidence[:n] = np.where(self.destroyed[:n], 0.0, 0.5**((t - self.last_seen[:n]) / self.half_life))
+
+  def select(self, mine: bool, min_confidence: float = 0.0) -> np.ndarray:
+    """
+    Slots of my bases or of the enemy bases with at least the given
+    confidence. With none asked for, my destroyed bases are included.
+    """
+    n = len(self.slots)
+    return np.flatnonzero((self.mine[:n] == mine) & (self.confidence[:n] >= min_confidence))
+
+  def positions(self, mine: bool, min_confidence: float = 0.0) -> np.ndarray:
+    return self.position[self.select(mine, min_confidence)]
+
+  def nearest(self, points: np.ndarray, mine: bool, min_confidence: float = 0.0) -> tuple:
+    """
+    Distance to and position of the nearest selected base (inf and nan if
+    there is none), for a single point or an (m, 2) batch.
+    """
+    slots = self.select(mine, min_confidence)
+    if len(slots) <= self.brute_force:
+      # A handful of bases is faster to compare with directly
+      distances = torus_distance(np.asarray(points, dtype=float)[..., None, :], self.position[slots], self.size)
+      rows = np.argmin(distances, axis=-1) if len(slots) else np.full(distances.shape[:-1], -1)
+      distances = np.min(distances, axis=-1, initial=np.inf)
+    else:
+      key = slots.tobytes()
+      if key not in self._indices:
+        if len(self._indices) >= 8:
+          self._indices.clear()
+        self._indices[key] = SpatialHash(self.position[slots], self.size)
+      distances, rows = self._indices[key].nearest(points)
+    rows = np.asarray(rows)
+    positions = np.full(rows.shape + (2,), np.nan)
+    positions[rows >= 0] = self.position[slots[rows[rows >= 0]]]
+    return distances, positions
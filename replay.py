@@ -0,0 +1,661 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Replays of the matches of the bots, and re-running a bot on a replay.
+
+    SUPREMACY_REPLAY=replays python -m <package>.tournament
+    python -m <package>.replay replays/<team>-<...>.replay hunterx_ai --save before.npz
+    python -m <package>.replay replays/<team>-<...>.replay hunterx_ai --compare before.npz
+
+While SUPREMACY_REPLAY is set, every bot records what it saw and did to a
+file there. Re-running a bot feeds the recorded ticks to a fresh PlayerAi as
+fast as it can take them, for latencies on real match states that are the
+same from run to run, and its commands can be compared with those of an
+earlier version or of the recorded match. The bot only sees the same states
+as long as it gives the same commands: the match is not simulated.
+"""
+
+import argparse
+import atexit
+import functools
+import importlib
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import types
+import weakref
+import numpy as np
+
+from .geometry import torus_distance
+from .profiling import LatencyHistogram
+from .snapshot import KINDS
+
+# Set to a directory to record a replay of every match of every bot there
+REPLAY_ENV = "SUPREMACY_REPLAY"
+MAGIC = b"SUPRPLY1"
+# Arrays start at multiples of this in the file, so they can be memory-mapped
+ALIGN = 64
+COMMANDS = ("goto", "set_heading", "set_vector", "stop", "start", "build_mine", "build_tank", "build_ship",
+            "build_jet", "convert_to_base")
+# Positions are stored in fixed point, in 1/256 of a tile
+POSITION_SCALE = 256
+# Attributes of the objects in info recorded besides their position, with
+# their type in the file (0 for objects that lack one)
+FIELDS = {
+    "health": np.float32,
+    "heading": np.float32,
+    "speed": np.float32,
+    "attack": np.float32,
+    "stopped": np.bool_,
+    "number": np.int32,
+    "mines": np.int16,
+    "crystal": np.float32,
+}
+CHUNK_TICKS = 64
+# What the cost() of a base is asked about, recorded once
+COSTS = ("mine", "tank", "ship", "jet")
+
+_open = []
+
+
+def write_record(f, header: dict, arrays: dict) -> None:
+  """
+  One record of a replay file: the length of a JSON header, the header with
+  the dtype, shape and offset of every array, then the arrays, each aligned
+  to ALIGN bytes in the file.
+  """
+  layout = {}
+  offset = 0
+  for name, array in arrays.items():
+    layout[name] = [array.dtype.str, list(array.shape), offset]
+    offset += array.nbytes + -array.nbytes % ALIGN
+  blob = json.dumps(dict(header, arrays=layout, size=offset)).encode()
+  f.write(struct.pack("<Q", len(blob)) + blob)
+  f.write(bytes(-f.tell() % ALIGN))
+  for array in arrays.values():
+    f.write(np.ascontiguousarray(array).tobytes())
+    f.write(bytes(-array.nbytes % ALIGN))
+
+
+def _tracks(uids: np.ndarray, ticks: np.ndarray) -> tuple:
+  """Rows sorted by unit then tick, and whether each sorted row starts a unit's track."""
+  order = np.lexsort((ticks, uids))
+  starts = np.ones(len(order), dtype=bool)
+  starts[1:] = uids[order][1:] != uids[order][:-1]
+  return order, starts
+
+
+def delta_encode(values: np.ndarray, uids: np.ndarray, ticks: np.ndarray) -> tuple:
+  """
+  Integer values as differences to the value of the same unit at its previous
+  tick, in the narrowest dtype that holds them (0 where a unit first appears),
+  and the first value of every unit's track, in order of uid.
+  """
+  order, starts = _tracks(uids, ticks)
+  track = values[order]
+  deltas = np.zeros_like(track)
+  deltas[1:][~starts[1:]] = track[1:][~starts[1:]] - track[:-1][~starts[1:]]
+  encoded = np.empty_like(deltas)
+  encoded[order] = deltas
+  for dtype in (np.int8, np.int16, np.int32):
+    info = np.iinfo(dtype)
+    if len(encoded) == 0 or (encoded.min() >= info.min and encoded.max() <= info.max):
+      encoded = encoded.astype(dtype)
+      break
+  return encoded, track[starts]
+
+
+def delta_decode(encoded: np.ndarray, first: np.ndarray, uids: np.ndarray, ticks: np.ndarray) -> np.ndarray:
+  order, starts = _tracks(uids, ticks)
+  deltas = encoded[order].astype(np.int64)
+  total = np.cumsum(deltas, axis=0)
+  # Restart the running sum at the first value of every track
+  track = np.cumsum(starts) - 1
+  values = np.empty_like(deltas)
+  values[order] = total - total[starts][track] + first[track]
+  return values
+
+
+def _command(uid: int, name: str, args: tuple, kwargs: dict, result: int) -> tuple:
+  """A command as recorded: unit, command code, up to two arguments (NaN if fewer) and result."""
+  values = [float(value) for value in np.ravel(np.array(list(args) + list(kwargs.values()), dtype=float))]
+  return (uid, COMMANDS.index(name), *(values + [np.nan, np.nan])[:2], result)
+
+
+class _Commanded:
+  """One of my units as seen by the bot while recording: commands to it are logged."""
+
+  __slots__ = ("_unit", "_recorder")
+
+  def __init__(self, unit, recorder: "ReplayRecorder"):
+    self._unit = unit
+    self._recorder = recorder
+
+  def __getattr__(self, name: str):
+    value = getattr(self._unit, name)
+    if name in COMMANDS:
+      return functools.partial(self._recorder.command, self._unit, name, value)
+    return value
+
+
+class ReplayRecorder:
+  """
+  Records what a bot saw and did in every tick of a match.
+
+  Per tick, the uid, team, kind, owner, position and FIELDS of every object
+  in the info dict and the commands my units were given (with their
+  arguments and, for builds and conversions, the uid they returned) are
+  collected into columns. Every CHUNK_TICKS ticks the columns are handed to
+  a background thread, which delta-codes the positions along each unit's
+  track, narrows the dtypes and appends the chunk to the file, so run()
+  never waits for the disk. The map is written once, then only the tiles
+  that change. Uids and team names are numbered in order of appearance,
+  each chunk lists the new ones.
+  """
+
+  def __init__(self, path: str, team: str, chunk_ticks: int = CHUNK_TICKS, seed: int = None):
+    self.path = path
+    self.team = team
+    self.seed = seed
+    self.chunk_ticks = chunk_ticks
+    self._ids = {}
+    self._teams = {}
+    self._new_uids = []
+    self._new_teams = []
+    self._map = None
+    self._costs = None
+    self._ticks = []
+    self._commands = []
+    self._queue = queue.Queue()
+    self._thread = threading.Thread(target=self._write, daemon=True)
+    self._thread.start()
+    _open.append(self)
+
+  def _id(self, uid) -> int:
+    uid = str(uid)
+    if uid not in self._ids:
+      self._ids[uid] = len(self._ids)
+      self._new_uids.append(uid)
+    return self._ids[uid]
+
+  def _team_id(self, team: str) -> int:
+    if team not in self._teams:
+      self._teams[team] = len(self._teams)
+      self._new_teams.append(team)
+    return self._teams[team]
+
+  def begin_tick(self, t: float, dt: float, info: dict, game_map: np.ndarray) -> dict:
+    """Records the tick's info and map, returns the info to hand to run()."""
+    if self._map is not None and self._map.shape != game_map.shape:
+      self._flush()
+    tick = {"t": t, "dt": dt, "map": None, "map_index": np.empty(0, dtype=np.int64)}
+    if self._map is None or self._map.shape != game_map.shape:
+      tick["map"] = game_map.astype(np.int8)
+      self._map = game_map.copy()
+    elif not np.array_equal(self._map, game_map):
+      tick["map_index"] = np.flatnonzero(self._map != game_map)
+      self._map = game_map.copy()
+    tick["map_value"] = self._map.ravel()[tick["map_index"]].astype(np.int8)
+
+    uids, teams, kinds, owners, positions, fields = [], [], [], [], [], []
+    for name, objects in info.items():
+      team = self._team_id(name)
+      for kind, group in objects.items():
+        kind_index = KINDS.index(kind)
+        for obj in group:
+          uids.append(self._id(obj.uid))
+          teams.append(team)
+          kinds.append(kind_index)
+          owner = getattr(obj, "owner", None)
+          owners.append(-1 if owner is None else self._id(owner.uid))
+          positions.append((obj.x, obj.y))
+          fields.append([float(getattr(obj, name, 0)) for name in FIELDS])
+    tick.update(uid=uids, team=teams, kind=kinds, owner=owners, position=positions, fields=fields)
+    self._ticks.append(tick)
+    self._commands = []
+
+    mine = info.get(self.team, {})
+    if self._costs is None and mine.get("bases"):
+      self._costs = {kind: float(mine["bases"][0].cost(kind)) for kind in COSTS}
+    return dict(info, **{self.team: {kind: [_Commanded(obj, self) for obj in group]
+                                     for kind, group in mine.items()}})
+
+  def command(self, unit, name: str, method, *args, **kwargs):
+    result = method(*args, **kwargs)
+    self._commands.append(_command(self._id(unit.uid), name, args, kwargs,
+                                   -1 if result is None else self._id(result)))
+    return result
+
+  def end_tick(self) -> None:
+    self._ticks[-1]["commands"] = self._commands
+    if len(self._ticks) >= self.chunk_ticks:
+      self._flush()
+
+  def _flush(self) -> None:
+    if self._ticks:
+      self._queue.put((self._ticks, self._new_uids, self._new_teams, self._costs))
+    self._ticks = []
+    self._new_uids = []
+    self._new_teams = []
+
+  def close(self) -> None:
+    if self in _open:
+      _open.remove(self)
+      self._flush()
+      self._queue.put(None)
+      self._thread.join()
+
+  def _write(self) -> None:
+    with open(self.path, "wb") as f:
+      f.write(MAGIC)
+      match = {"type": "match", "team": self.team, "chunk_ticks": self.chunk_ticks, "seed": self.seed}
+      write_record(f, match, {})
+      while True:
+        item = self._queue.get()
+        if item is None:
+          break
+        header, arrays = self._encode(*item)
+        write_record(f, header, arrays)
+        f.flush()
+
+  def _encode(self, ticks: list, new_uids: list, new_teams: list, costs: dict) -> tuple:
+    counts = [len(tick["uid"]) for tick in ticks]
+    rows = np.repeat(np.arange(len(ticks)), counts)
+    uids = np.concatenate([np.asarray(tick["uid"], dtype=np.int32) for tick in ticks])
+    positions = np.concatenate([np.asarray(tick["position"], dtype=float).reshape(-1, 2) for tick in ticks])
+    fields = np.concatenate([np.asarray(tick["fields"], dtype=float).reshape(-1, len(FIELDS)) for tick in ticks])
+    commands = [np.asarray(tick.get("commands", []), dtype=float).reshape(-1, 5) for tick in ticks]
+    command_counts = [len(c) for c in commands]
+    commands = np.concatenate(commands)
+    position, position_first = delta_encode(np.round(positions * POSITION_SCALE).astype(np.int64), uids, rows)
+
+    arrays = {
+        "t": np.array([tick["t"] for tick in ticks], dtype=np.float64),
+        "dt": np.array([tick["dt"] for tick in ticks], dtype=np.float64),
+        "offsets": np.r_[0, np.cumsum(counts)].astype(np.int64),
+        "uid": uids,
+        "team": np.concatenate([np.asarray(tick["team"], dtype=np.int16) for tick in ticks]),
+        "kind": np.concatenate([np.asarray(tick["kind"], dtype=np.int8) for tick in ticks]),
+        "owner": np.concatenate([np.asarray(tick["owner"], dtype=np.int32) for tick in ticks]),
+        "position": position,
+        "position_first": position_first,
+        **{name: fields[:, i].astype(dtype) for i, (name, dtype) in enumerate(FIELDS.items())},
+        "command_offsets": np.r_[0, np.cumsum(command_counts)].astype(np.int64),
+        "command_uid": commands[:, 0].astype(np.int32),
+        "command_code": commands[:, 1].astype(np.int8),
+        "command_args": commands[:, 2:4],
+        "command_result": commands[:, 4].astype(np.int32),
+        "map_offsets": np.r_[0, np.cumsum([len(tick["map_index"]) for tick in ticks])].astype(np.int64),
+        "map_index": np.concatenate([tick["map_index"] for tick in ticks]).astype(np.int64),
+        "map_value": np.concatenate([tick["map_value"] for tick in ticks]),
+    }
+    if ticks[0]["map"] is not None:
+      arrays["map"] = ticks[0]["map"]
+    return {"type": "chunk", "uids": new_uids, "teams": new_teams, "costs": costs}, arrays
+
+
+def read_records(buffer, offset: int = len(MAGIC)):
+  """
+  The (header, arrays) records of a replay file from a buffer such as a
+  memory map. Arrays are read-only views into the buffer. A record that was
+  not completely written (the match is still going) ends the iteration.
+  """
+  while offset + 8 <= len(buffer):
+    (length,) = struct.unpack_from("<Q", buffer, offset)
+    start = offset + 8 + length
+    if start > len(buffer):
+      break
+    header = json.loads(bytes(buffer[offset + 8:start]))
+    start += -start % ALIGN
+    if start + header["size"] > len(buffer):
+      break
+    arrays = {}
+    for name, (dtype, shape, at) in header.pop("arrays").items():
+      count = int(np.prod(shape))
+      arrays[name] = np.frombuffer(buffer, dtype, count, start + at).reshape(shape)
+    yield header, arrays
+    offset = start + header["size"]
+
+
+class _Chunk:
+  """The arrays of one chunk, with the positions decoded on first use."""
+
+  def __init__(self, first: int, arrays: dict):
+    self.first = first
+    self.arrays = arrays
+    self.ticks = len(arrays["t"])
+    self._position = None
+
+  @property
+  def position(self) -> np.ndarray:
+    if self._position is None:
+      offsets = self.arrays["offsets"]
+      rows = np.repeat(np.arange(self.ticks), np.diff(offsets))
+      values = delta_decode(self.arrays["position"], self.arrays["position_first"], self.arrays["uid"], rows)
+      self._position = values / POSITION_SCALE
+    return self._position
+
+
+class ReplayObject:
+  """
+  A base or vehicle of a replayed tick, with the attributes and methods of
+  the objects in the info dict. Attributes are read from the tick's columns
+  when asked for. Commands are collected in the tick's `issued`, builds and
+  conversions return what they returned in the recorded match.
+  """
+
+  __slots__ = ("_tick", "_row")
+
+  def __init__(self, tick: "ReplayTick", row: int):
+    self._tick = tick
+    self._row = row
+
+  def __getattr__(self, name: str):
+    if name in FIELDS:
+      return self._tick.columns[name][self._row].item()
+    if name in COMMANDS:
+      return functools.partial(self._tick.command, self, name)
+    raise AttributeError(name)
+
+  @property
+  def uid(self) -> str:
+    return self._tick.reader.uids[self._tick.columns["uid"][self._row]]
+
+  @property
+  def team(self) -> str:
+    return self._tick.reader.teams[self._tick.columns["team"][self._row]]
+
+  @property
+  def kind(self) -> str:
+    return KINDS[self._tick.columns["kind"][self._row]]
+
+  @property
+  def owner(self):
+    owner = self._tick.columns["owner"][self._row]
+    return None if owner < 0 else self._tick.object(owner)
+
+  @property
+  def x(self) -> float:
+    return float(self._tick.columns["position"][self._row, 0])
+
+  @property
+  def y(self) -> float:
+    return float(self._tick.columns["position"][self._row, 1])
+
+  @property
+  def position(self) -> np.ndarray:
+    return self._tick.columns["position"][self._row].copy()
+
+  @property
+  def vector(self) -> np.ndarray:
+    angle = np.radians(self.heading)
+    return np.array([np.cos(angle), np.sin(angle)])
+
+  def get_position(self) -> np.ndarray:
+    return self.position
+
+  def get_heading(self) -> float:
+    return self.heading
+
+  def get_vector(self) -> np.ndarray:
+    return self.vector
+
+  def get_distance(self, x: float, y: float, shortest: bool = True) -> float:
+    if shortest:
+      return float(torus_distance(self.position, (x, y), self._tick.game_map.shape[::-1]))
+    return float(np.hypot(x - self.x, y - self.y))
+
+  def cost(self, kind: str) -> float:
+    return self._tick.reader.costs[kind]
+
+
+class ReplayTick:
+  """
+  One tick of a replay. `columns` are views of the tick's rows in the
+  chunk's arrays, `commands` the (unit, code, argument, argument, result)
+  rows of the commands given in the recorded match.
+  """
+
+  def __init__(self, reader: "ReplayReader", chunk: _Chunk, index: int, game_map: np.ndarray):
+    arrays = chunk.arrays
+    rows = slice(arrays["offsets"][index], arrays["offsets"][index + 1])
+    commands = slice(arrays["command_offsets"][index], arrays["command_offsets"][index + 1])
+    self.reader = reader
+    self.t = float(arrays["t"][index])
+    self.dt = float(arrays["dt"][index])
+    self.game_map = game_map
+    self.columns = {name: arrays[name][rows] for name in ("uid", "team", "kind", "owner", *FIELDS)}
+    self.columns["position"] = chunk.position[rows]
+    self.commands = np.column_stack([arrays["command_uid"][commands], arrays["command_code"][commands],
+                                     arrays["command_args"][commands], arrays["command_result"][commands]])
+    self.issued = []
+    self._objects = {}
+    self._results = {}
+
+  def object(self, uid: int):
+    """The object of the tick with the numbered uid, a bare one if it is not in the info dict."""
+    if not self._objects:
+      self._objects = {uid: ReplayObject(self, row) for row, uid in enumerate(self.columns["uid"].tolist())}
+    if uid not in self._objects:
+      return types.SimpleNamespace(uid=self.reader.uids[uid])
+    return self._objects[uid]
+
+  def info(self) -> dict:
+    """The info dict of the tick, as the bot got it."""
+    info = {self.reader.team: {}}
+    for row, (team, kind) in enumerate(zip(self.columns["team"].tolist(), self.columns["kind"].tolist())):
+      uid = self.columns["uid"][row]
+      info.setdefault(self.reader.teams[team], {}).setdefault(KINDS[kind], []).append(self.object(uid))
+    return info
+
+  def command(self, unit: ReplayObject, name: str, *args, **kwargs):
+    uid = self.reader.ids[unit.uid]
+    code = COMMANDS.index(name)
+    if not self._results:
+      for row in self.commands:
+        self._results.setdefault((int(row[0]), int(row[1])), []).append(int(row[4]))
+    # The n-th build of the unit gets the result of its n-th build in the match
+    results = self._results.get((uid, code))
+    result = results.pop(0) if results else -1
+    self.issued.append(_command(uid, name, args, kwargs, result))
+    return None if result < 0 else self.reader.uids[result]
+
+
+class ReplayReader:
+  """
+  A replay file, memory-mapped. Iterating over it yields a ReplayTick per
+  tick: the arrays of the file are not copied, only the positions of a chunk
+  are decoded when one of its ticks is first looked at, and the info dict is
+  only built when asked for.
+  """
+
+  def __init__(self, path: str):
+    self.path = path
+    self._buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    if bytes(self._buffer[:len(MAGIC)]) != MAGIC:
+      raise ValueError(f"{path} is not a replay file")
+    records = read_records(self._buffer)
+    header, _ = next(records)
+    self.team = header["team"]
+    # Of the bot's generator, see randomness.py
+    self.seed = header.get("seed")
+    self.uids = []
+    self.teams = []
+    self.costs = {}
+    self._chunks = []
+    ticks = 0
+    for header, arrays in records:
+      self.uids += header["uids"]
+      self.teams += header["teams"]
+      self.costs = header["costs"] or self.costs
+      chunk = _Chunk(ticks, arrays)
+      self._chunks.append(chunk)
+      ticks += chunk.ticks
+    self.ids = {uid: i for i, uid in enumerate(self.uids)}
+    self.ticks = ticks
+
+  def __len__(self) -> int:
+    return self.ticks
+
+  def __iter__(self):
+    game_map = None
+    for chunk in self._chunks:
+      for index in range(chunk.ticks):
+        game_map = self._update_map(game_map, chunk, index)
+        yield ReplayTick(self, chunk, index, game_map)
+
+  def __getitem__(self, tick: int) -> ReplayTick:
+    """A tick by number. Its map is rebuilt from the last full map before it."""
+    if not 0 <= tick < self.ticks:
+      raise IndexError(tick)
+    game_map = None
+    for chunk in self._chunks:
+      if chunk.first > tick:
+        break
+      if "map" in chunk.arrays or game_map is not None:
+        for index in range(min(chunk.ticks, tick - chunk.first + 1)):
+          game_map = self._update_map(game_map, chunk, index)
+      if chunk.first + chunk.ticks > tick:
+        return ReplayTick(self, chunk, tick - chunk.first, game_map)
+
+  @staticmethod
+  def _update_map(game_map: np.ndarray, chunk: _Chunk, index: int) -> np.ndarray:
+    """The map after a tick, a new array only where tiles change."""
+    arrays = chunk.arrays
+    if index == 0 and "map" in arrays:
+      game_map = arrays["map"].astype(int)
+    changed = slice(arrays["map_offsets"][index], arrays["map_offsets"][index + 1])
+    if changed.stop > changed.start:
+      game_map = game_map.copy()
+      game_map.flat[arrays["map_index"][changed]] = arrays["map_value"][changed]
+    return game_map
+
+
+_recorders = weakref.WeakKeyDictionary()
+
+
+def recorded(run):
+  """
+  Decorator for PlayerAi.run() recording every tick of the bot to a replay
+  file when SUPREMACY_REPLAY names a directory, and doing nothing otherwise.
+  """
+
+  @functools.wraps(run)
+  def wrapper(self, t, dt, info, game_map):
+    directory = os.environ.get(REPLAY_ENV)
+    if not directory:
+      return run(self, t, dt, info, game_map)
+    recorder = _recorders.get(self)
+    if recorder is None:
+      os.makedirs(directory, exist_ok=True)
+      path = os.path.join(directory, f"{self.team}-{os.getpid()}-{id(self):x}.replay")
+      rng = getattr(self, "rng", None)
+      recorder = _recorders[self] = ReplayRecorder(path, self.team, seed=None if rng is None else rng.seed_value)
+    info = recorder.begin_tick(t, dt, info, game_map)
+    try:
+      return run(self, t, dt, info, game_map)
+    finally:
+      recorder.end_tick()
+
+  return wrapper
+
+
+@atexit.register
+def _close_all() -> None:
+  for recorder in list(_open):
+    recorder.close()
+
+
+def execute(reader: ReplayReader, bot: str, histogram: LatencyHistogram = None) -> dict:
+  """
+  Run a fresh PlayerAi of a bot module of the package on every tick of a
+  replay, without an engine. Returns the latency histogram of its run()
+  calls (in ns, building the info dict is not timed, given histograms are
+  added to), the number of calls
+  that raised, and the commands it gave in every tick: `offsets` into the
+  (unit, code, argument, argument, result) rows of `commands`.
+  """
+  player = importlib.import_module(f".{bot}", __package__).PlayerAi()
+  player.team = reader.team
+  if reader.seed is not None and hasattr(player, "rng"):
+    player.rng.seed(reader.seed)
+  histogram = LatencyHistogram() if histogram is None else histogram
+  errors = 0
+  issued = []
+  for tick in reader:
+    info = tick.info()
+    start = time.perf_counter_ns()
+    try:
+      player.run(tick.t, tick.dt, info, tick.game_map)
+    except Exception:
+      errors += 1
+    histogram.record(time.perf_counter_ns() - start)
+    issued.append(np.asarray(tick.issued, dtype=float).reshape(-1, 5))
+  return {
+      "histogram": histogram,
+      "errors": errors,
+      "offsets": np.r_[0, np.cumsum([len(commands) for commands in issued])].astype(np.int64),
+      "commands": np.concatenate(issued) if issued else np.empty((0, 5)),
+  }
+
+
+def differences(a: dict, b: dict, tolerance: float = 1e-6) -> list:
+  """
+  Ticks in which two sets of commands (see execute() and recorded_commands()) are not
+  the same, with arguments equal within the tolerance.
+  """
+  ticks = []
+  for tick in range(max(len(a["offsets"]), len(b["offsets"])) - 1):
+    if tick + 1 >= min(len(a["offsets"]), len(b["offsets"])):
+      ticks.append(tick)
+      continue
+    first = a["commands"][a["offsets"][tick]:a["offsets"][tick + 1]]
+    second = b["commands"][b["offsets"][tick]:b["offsets"][tick + 1]]
+    if first.shape != second.shape or not np.allclose(first, second, rtol=0, atol=tolerance, equal_nan=True):
+      ticks.append(tick)
+  return ticks
+
+
+def recorded_commands(reader: ReplayReader) -> dict:
+  """The commands of the recorded match, in the form returned by execute()."""
+  commands = [tick.commands for tick in reader]
+  return {
+      "offsets": np.r_[0, np.cumsum([len(rows) for rows in commands])].astype(np.int64),
+      "commands": np.concatenate(commands).astype(float) if commands else np.empty((0, 5)),
+  }
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument("replay", help="replay file")
+  parser.add_argument("bot", help="bot module of the package, e.g. hunterx_ai")
+  parser.add_argument("--repeat", type=int, default=1, help="times to run through the match")
+  parser.add_argument("--save", help="write the bot's commands to this .npz file")
+  parser.add_argument("--compare", help="commands to compare with: an .npz file from --save, "
+                                        "or 'recorded' for the recorded match")
+  parser.add_argument("--tolerance", type=float, default=1e-6, help="of command arguments")
+  args = parser.parse_args(argv)
+
+  reader = ReplayReader(args.replay)
+  histogram = LatencyHistogram()
+  for _ in range(args.repeat):
+    result = execute(reader, args.bot, histogram)
+  summary = histogram.summary()
+  print(f"{args.bot} on {reader.ticks} ticks of {reader.team}: " +
+        " ".join(f"{key} {value:.3f}" if isinstance(value, float) else f"{key} {value}"
+                 for key, value in summary.items()) + f" errors {result['errors']}")
+
+  if args.save:
+    np.savez(args.save, offsets=result["offsets"], commands=result["commands"])
+  if args.compare:
+    other = recorded_commands(reader) if args.compare == "recorded" else dict(np.load(args.compare))
+    ticks = differences(result, other, args.tolerance)
+    print(f"{len(ticks)} of {reader.ticks} ticks with different commands" +
+          (f", first at tick {ticks[0]}" if ticks else ""))
+
+
+if __name__ == "__main__":
+  main()
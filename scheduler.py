@@ -0,0 +1,102 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import time
+import numpy as np
+
+# Task priorities, lowest runs first
+BUILD = 0
+THREATENED = 1
+IDLE = 2
+
+
+class TickScheduler:
+  """
+  Deadline-aware work queue for one call of PlayerAi.run().
+
+  start() is called first thing in PlayerAi.run(), so the budget also covers
+  the work done before the tasks (snapshot, indexes, field updates). The run
+  loop then queues one task per base build and per vehicle command with a
+  priority, and run() executes them in priority order until the per-tick
+  time budget is spent. Builds always run; a vehicle task is deferred when
+  the time left is less than the average cost of a task of its priority, so
+  the tick ends within the budget however many units there are. Deferred
+  vehicles simply keep the command they were given on an earlier tick. Within
+  a priority the units that were served longest ago go first, so none starves.
+  """
+
+  def __init__(self, budget: float = 0.02, clock=time.perf_counter):
+    self.budget = budget
+    self.clock = clock
+    self.done = 0
+    self.deferred = 0
+    self.elapsed = 0.0
+    self.totals = {"ticks": 0, "done": 0, "deferred": 0, "overruns": 0}
+    self._tasks = []
+    self._keys = []
+    self._priorities = []
+    self._last_served = []
+    self._served = {}
+    self._cost = {}
+    self._start = None
+
+  def __len__(self) -> int:
+    return len(self._tasks)
+
+  def start(self) -> None:
+    """Start the clock of this tick's budget."""
+    self._start = self.clock()
+
+  def add(self, priority: int, key, task, *args) -> None:
+    """Queue task(*args); key identifies the unit, e.g. its uid."""
+    self._tasks.append((task, args))
+    self._keys.append(key)
+    self._priorities.append(priority)
+    self._last_served.append(self._served.get(key, -1))
+
+  def run(self) -> int:
+    """
+    Run the queued tasks within what is left of the budget since start() (the
+    whole budget without it), returns how many were deferred.
+    """
+    start = self.clock() if self._start is None else self._start
+    self._start = None
+    deadline = start + self.budget
+    tick = self.totals["ticks"]
+    self.done = 0
+    self.deferred = 0
+
+    order = np.lexsort((self._last_served, self._priorities)).tolist()
+    for i, index in enumerate(order):
+      priority = self._priorities[index]
+      now = self.clock()
+      if priority != BUILD and now + self._cost.get(priority, 0.0) > deadline:
+        if now >= deadline:
+          # Nothing else fits, defer the rest in one go
+          self.deferred += len(order) - i
+          break
+        self.deferred += 1
+        continue
+
+      task, args = self._tasks[index]
+      task(*args)
+      # Exponential moving average of the cost of a task of this priority
+      cost = self.clock() - now
+      self._cost[priority] = 0.9 * self._cost.get(priority, cost) + 0.1 * cost
+      self._served[self._keys[index]] = tick
+      self.done += 1
+
+    # Forget the units that are gone once they make up most of the table
+    if len(self._served) > 2 * len(self._keys) + 64:
+      keys = set(self._keys)
+      self._served = {key: last for key, last in self._served.items() if key in keys}
+
+    self._tasks = []
+    self._keys = []
+    self._priorities = []
+    self._last_served = []
+    self.elapsed = self.clock() - start
+    self.totals["ticks"] += 1
+    self.totals["done"] += self.done
+    self.totals["deferred"] += self.deferred
+    self.totals["overruns"] += self.elapsed > self.budget
+    return self.deferred
@@ -0,0 +1,126 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from .geometry import torus_delta, vector_heading
+from .mapstate import MapState
+from .registry import BaseRegistry
+
+
+class SectorIndex:
+  """
+  Which directions out of each of my bases are taken, for launching ships.
+
+  Every base has a histogram of the bearings, in `sectors` equal angular
+  sectors, to my other bases within base_radius and to the land tiles within
+  coast_radius. A new base only adds its bearing to the bases around it (and
+  theirs to its own histogram), a destroyed one is dropped and the bases
+  around it count theirs again; the land part is redone for the bases near
+  tiles that changed. heading() then picks the middle of the widest run of
+  empty sectors, however many bases there ever were.
+  """
+
+  def __init__(self, sectors: int = 36, base_radius: float = 300.0, coast_radius: int = 12):
+    self.sectors = sectors
+    self.base_radius = base_radius
+    self.rows = {}
+    self.position = np.zeros((0, 2))
+    self.bases = np.zeros((0, sectors), dtype=np.int32)
+    self.coast = np.zeros((0, sectors), dtype=np.int32)
+    self.coast_radius = coast_radius
+    self._version = 0
+
+    dy, dx = np.mgrid[-coast_radius:coast_radius + 1, -coast_radius:coast_radius + 1]
+    inside = (np.hypot(dx, dy) <= coast_radius) & ((dx != 0) | (dy != 0))
+    self._dy, self._dx = dy[inside], dx[inside]
+    self._offset_sector = self.sector(vector_heading(np.stack([self._dx, self._dy], axis=1)))
+
+  def sector(self, heading: np.ndarray) -> np.ndarray:
+    return (np.asarray(heading) // (360 / self.sectors)).astype(np.int64) % self.sectors
+
+  def update(self, registry: BaseRegistry, map_state: MapState) -> None:
+    """Add my bases that are new in the registry and drop the destroyed ones."""
+    game_map = map_state.game_map
+    size = np.array([game_map.shape[1], game_map.shape[0]], dtype=float)
+    destroyed = [self.rows[uid] for uid, slot in registry.slots.items()
+                 if registry.destroyed[slot] and uid in self.rows]
+    if destroyed:
+      self._remove(np.array(destroyed), size)
+    new = [(uid, slot) for uid, slot in registry.slots.items()
+           if registry.mine[slot] and not registry.destroyed[slot] and uid not in self.rows]
+    for uid, slot in new:
+      position = registry.position[slot]
+      row = len(self.rows)
+      self.rows[uid] = row
+      self.position = np.concatenate([self.position, position[None]])
+      self.bases = np.concatenate([self.bases, np.zeros((1, self.sectors), dtype=np.int32)])
+      self.coast = np.concatenate([self.coast, np.zeros((1, self.sectors), dtype=np.int32)])
+
+      # Bearings both ways between the new base and the ones around it
+      delta = torus_delta(position, self.position[:row], size)
+      near = np.flatnonzero(np.hypot(delta[:, 0], delta[:, 1]) <= self.base_radius)
+      np.add.at(self.bases, (near, self.sector(vector_heading(-delta[near]))), 1)
+      np.add.at(self.bases[row], self.sector(vector_heading(delta[near])), 1)
+
+    changes = map_state.changes_since(self._version)
+    self._version = map_state.version
+    old = len(self.position) - len(new)
+    if changes is None:
+      rows = np.arange(len(self.position))
+    else:
+      # Only new bases and those with a changed tile in reach see other land
+      y, x = np.divmod(changes[0], game_map.shape[1])
+      delta = torus_delta(self.position[:old, None], np.stack([x + 0.5, y + 0.5], axis=1)[None], size)
+      near = (np.abs(delta) <= self.coast_radius + 1).all(axis=2).any(axis=1)
+      rows = np.concatenate([np.flatnonzero(near), np.arange(old, len(self.position))])
+    if len(rows):
+      self._update_coast(game_map, rows)
+
+  def _remove(self, rows: np.ndarray, size: np.ndarray) -> None:
+    keep = np.ones(len(self.position), dtype=bool)
+    keep[rows] = False
+    # The bases that had a destroyed one around count the others again
+    delta = torus_delta(self.position[rows][:, None], self.position[None], size)
+    near = np.flatnonzero(keep & (np.hypot(delta[..., 0], delta[..., 1]) <= self.base_radius).any(axis=0))
+    kept = np.flatnonzero(keep)
+    delta = torus_delta(self.position[near][:, None], self.position[kept][None], size)
+    around = (np.hypot(delta[..., 0], delta[..., 1]) <= self.base_radius) & (near[:, None] != kept[None])
+    self.bases[near] = 0
+    np.add.at(self.bases, (np.broadcast_to(near[:, None], around.shape)[around],
+                           self.sector(vector_heading(delta[around]))), 1)
+
+    self.position = self.position[keep]
+    self.bases = self.bases[keep]
+    self.coast = self.coast[keep]
+    order = sorted(self.rows, key=self.rows.get)
+    self.rows = {uid: row for row, uid in enumerate(uid for uid in order if keep[self.rows[uid]])}
+
+  def _update_coast(self, game_map: np.ndarray, rows: np.ndarray) -> None:
+    ny, nx = game_map.shape
+    x = np.floor(self.position[rows, 0]).astype(np.int64)
+    y = np.floor(self.position[rows, 1]).astype(np.int64)
+    land = game_map[(y[:, None] + self._dy) % ny, (x[:, None] + self._dx) % nx] == 1
+    self.coast[rows] = 0
+    np.add.at(self.coast, (np.broadcast_to(rows[:, None], land.shape)[land],
+                           np.broadcast_to(self._offset_sector, land.shape)[land]), 1)
+
+  def heading(self, uid, preferred: float) -> float:
+    """
+    Middle of the widest run of sectors out of the base with the fewest
+    bases and land tiles in them, preferred when the base is unknown or no
+    direction is taken.
+    """
+    if uid not in self.rows:
+      return preferred
+    counts = self.bases[self.rows[uid]] + self.coast[self.rows[uid]]
+    free = counts == counts.min()
+    if free.all():
+      return preferred
+
+    # Rotate a taken sector to the front, so that no run wraps around
+    shift = int(np.argmin(free))
+    edges = np.diff(np.concatenate([[0], np.roll(free, -shift).astype(np.int8), [0]]))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    widest = np.argmax(ends - starts)
+    middle = (starts[widest] + ends[widest]) / 2 + shift
+    return float(middle * 360 / self.sectors % 360)
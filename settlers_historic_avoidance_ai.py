@@ -1,28 +1,35 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
-from collections import defaultdict
 from enum import Enum, auto
-import math
 import numpy as np
 
+from .mapstate import MapState
+from .params import load_params
+from .pathfinding import PathPlanner
+from .profiling import PhaseProfiler, profiled
+from .randomness import BotRandom
+from .registry import BaseRegistry
+from .replay import recorded
+from .sectors import SectorIndex
+from .snapshot import WorldSnapshot
+from .terrain import LandHeadingField
+from .units import UnitStore
+
 # This is your team name
 CREATOR = "settlers-historic-avoidance"
 
+# Build and behavior constants (see params.SCHEMA), tuned values are loaded
+# from the parameters file at startup
+PARAMS = {
+  "max_mines": 3,
+  "min_tanks": 8,
+  "min_ships": 3,
+  "max_tanks": 1,
+  "max_ships": 1,
+  "min_base_ship_distance": 20.0,
+}
 
 
-def heading_away_from_land(game_map: np.ndarray, x: int, y: int) -> np.ndarray:
-  offset = 5
-  surrounding = game_map[y - offset:y + offset + 1, x - offset:x + offset + 1]
-  samples = []
-
-  for sx, sy in np.ndindex(surrounding.shape):
-    if sx == offset and sy == offset:
-      continue
-    if surrounding[sx, sy] != 1:
-      samples.append(np.nan_to_num(np.arctan2(y - sy, x - sx)))
-
-  return np.nan_to_num(np.mean(samples)) * 180 / np.pi
-
 
 class BaseState(Enum):
   INITIALIZE = auto()
@@ -33,14 +40,28 @@ class PlayerAi:
 
   def __init__(self):
     self.team = CREATOR  # Mandatory attribute
-
-    # Record the previous positions of all my vehicles
-    self.previous_positions = {}
-    self.historic_positions = set()
-    self.base_ntanks = defaultdict(lambda: 0)
-    self.base_nships = defaultdict(lambda: 0)
-    self.base_states = defaultdict(lambda: BaseState.INITIALIZE)
-
+    self.params = load_params(__name__, PARAMS)
+
+    # This tick's map, with a version and the tiles that changed
+    self.map = MapState()
+    self.land_headings = LandHeadingField()
+    self.paths = PathPlanner()
+
+    # Record the previous positions of all my units and the build counters of
+    # my bases, both dropped as soon as the unit is gone
+    self.units = UnitStore({"ntanks": 0, "nships": 0, "state": BaseState.INITIALIZE.value})
+    # Every base seen so far, kept after it drops out of view
+    self.bases = BaseRegistry()
+    # Directions out of my bases that are free for launching ships
+    self.sectors = SectorIndex()
+
+    # Per-phase timings, only collected when profiling is switched on
+    self.profiler = PhaseProfiler(CREATOR)
+    # Seeded random numbers, the match runner sets the seed
+    self.rng = BotRandom(CREATOR)
+
+  @recorded
+  @profiled
   def run(self, t: float, dt: float, info: dict, game_map: np.ndarray):
     """
         This is the main function that will be called by the game engine.
@@ -71,85 +92,64 @@ class PlayerAi:
             1 means land, 0 means water, -1 means no info.
         """
 
+    self.profiler.begin("perceive")
     # Get information about my team
     myinfo = info[self.team]
+    self.map.update(game_map)
+    self.land_headings.update(self.map)
+    self.paths.update(self.map)
 
-    enemy_bases = []
-    enemy_tanks = []
-    enemy_ships = []
-    enemy_jets = []
+    world = WorldSnapshot(info, self.team, game_map.shape)
+    my_rows = world.my_rows()
+    self.paths.forget(self.units.update([world.uids[row] for row in my_rows], world.position[my_rows]))
 
-    if len(info) > 1:
-      for name in info:
-        if name == self.team:
-          continue
-
-        if "bases" in info[name]:
-          enemy_bases += info[name]["bases"]
-        if "tanks" in info[name]:
-          enemy_tanks += info[name]["tanks"]
-        if "ships" in info[name]:
-          enemy_ships += info[name]["ships"]
-        if "jets" in info[name]:
-          enemy_jets += info[name]["jets"]
+    enemy_bases = world.objects_in(world.enemy("bases"))
+    enemy_tanks = world.objects_in(world.enemy("tanks"))
+    enemy_ships = world.objects_in(world.enemy("ships"))
+    enemy_jets = world.objects_in(world.enemy("jets"))
 
     enemy_vehicles = enemy_tanks + enemy_ships + enemy_jets
     enemy_entities = enemy_bases + enemy_vehicles
 
-    base_grouped_tanks = defaultdict(list)
-    if "tanks" in myinfo:
-      for tank in myinfo["tanks"]:
-        base_grouped_tanks[tank.owner.uid].append(tank)
-
-    base_grouped_ships = defaultdict(list)
-    if "ships" in myinfo:
-      for ship in myinfo["ships"]:
-        base_grouped_ships[ship.owner.uid].append(ship)
-
-    base_grouped_jets = defaultdict(list)
-    if "jets" in myinfo:
-      for jet in myinfo["jets"]:
-        base_grouped_jets[jet.owner.uid].append(jet)
+    base_grouped_tanks = world.group_by_owner("tanks")
+    base_grouped_ships = world.group_by_owner("ships")
+    base_grouped_jets = world.group_by_owner("jets")
 
     base_positions = [(base.x, base.y) for base in myinfo["bases"]]
-    self.historic_positions.update(base_positions)
+    self.bases.update(t, world)
+    self.sectors.update(self.bases, self.map)
 
     for base in myinfo["bases"]:
       base_tanks = base_grouped_tanks[base.uid]
       base_ships = base_grouped_ships[base.uid]
       base_jets = base_grouped_jets[base.uid]
-      base_state = self.base_states[base.uid]
-      heading_away = heading_away_from_land(game_map, base.x, base.y)
-      base_ntanks = self.base_ntanks[base.uid]
-      base_nships = self.base_nships[base.uid]
+      base_state = BaseState(self.units.get(base.uid, "state"))
+      heading_away = self.land_headings.heading(base.x, base.y)
+      base_ntanks = self.units.get(base.uid, "ntanks")
+      base_nships = self.units.get(base.uid, "nships")
 
+      self.profiler.begin("build")
       # First we need to prioritize building our 3 mines, that way we have
       # ample production for all of our conquests.
-      if base.mines < 3:
+      if base.mines < self.params.max_mines:
         if base.crystal > base.cost("mine"):
           base.build_mine()
-      elif base.crystal > base.cost("tank") and (len(base_tanks) < 1) or base_ntanks < 8:
+      elif base.crystal > base.cost("tank") and (len(base_tanks) < self.params.max_tanks) or base_ntanks < self.params.min_tanks:
         base.build_tank(np.flip(heading_away))
-        self.base_ntanks[base.uid] += 1
+        self.units.add(base.uid, "ntanks")
       # Time to divide like a bacteria! Send out the ships!
-      elif base.crystal > base.cost("ship") and (len(base_ships) < 1) or base_nships < 3:
-        # We need to check that there is not a friendly base in the direct
-        # vicinity (a margin of 10 degrees in this case) of the heading we
-        # initially chose. If there is we want to shift our heading, here
-        # by 20 degrees.
-        for bx, by in self.historic_positions:
-          margin = 10
-          heading_towards_base = math.atan2(base.y - by, base.x - bx)
-
-          if heading_towards_base - margin <= heading_away or heading_towards_base + margin >= heading_away:
-            heading_away = (heading_away + 20) % 360
+      elif base.crystal > base.cost("ship") and (len(base_ships) < self.params.max_ships) or base_nships < self.params.min_ships:
+        # Launch into the widest gap between my other bases and the land
+        # around this one
+        heading_away = self.sectors.heading(base.uid, heading_away)
 
         base.build_ship(heading_away)
-        self.base_nships[base.uid] += 1
+        self.units.add(base.uid, "nships")
       # If everything else is satisfied, build a jet.
       elif base.crystal > base.cost("jet"):
         base.build_jet(np.flip(heading_away))
 
+      self.profiler.begin("jets")
       for jet in base_jets:
         if len(enemy_bases) >= 1:
           jet.goto(enemy_bases[0].x, enemy_bases[0].y)
@@ -270,35 +270,38 @@ class PlayerAi:
     # shortest path on the map (i.e. they may go through the map boundaries).
 
     # Iterate through all my tanks
+    self.profiler.begin("tanks")
     if "tanks" in myinfo:
       for tank in myinfo["tanks"]:
-        if (tank.uid in self.previous_positions) and (not tank.stopped):
+        if self.units.is_tracked(tank.uid) and (not tank.stopped):
           # If the tank position is the same as the previous position,
           # set a random heading
-          if all(tank.position == self.previous_positions[tank.uid]):
-            tank.set_heading(np.random.random() * 360.0)
+          if self.units.is_stationary(tank.uid):
+            tank.set_heading(self.rng.heading())
           # Else, if there is a target, go to the target
           elif target is not None:
-            tank.goto(*target)
-        # Store the previous position of this tank for the next time step
-        self.previous_positions[tank.uid] = tank.position
+            # Fall back to the closest enemy base on the same piece of land
+            # when the target cannot be reached by land
+            if not self.paths.regions.reachable("tanks", tank.position, target):
+              closest_base = self.paths.regions.closest_reachable(
+                  "tanks", tank.position, world.position[world.enemy("bases")])
+              tank_target = None if closest_base < 0 else enemy_bases[closest_base].position
+            else:
+              tank_target = target
+            if tank_target is not None and not self.paths.steer(tank, "tanks", tank_target):
+              tank.goto(*tank_target)
 
     # Iterate through all my ships
+    self.profiler.begin("ships")
     if "ships" in myinfo:
       for ship in myinfo["ships"]:
-        if ship.uid in self.previous_positions:
+        if self.units.is_tracked(ship.uid):
           # If the ship position is the same as the previous position,
           # convert the ship to a base if it is far from the owning base,
           # set a random heading otherwise
-          if all(ship.position == self.previous_positions[ship.uid]):
-            min_base_ship_distance = 20
-            base_ship_distances = [((x, y), ship.get_distance(x, y))
-                                   for x, y in self.historic_positions]
-            closest_base = min(
-                base_ship_distances,
-                key=lambda base_ship_distance: base_ship_distance[1])
-            closest_base_position = closest_base[0]
-            closest_base_distance = closest_base[1]
+          if self.units.is_stationary(ship.uid):
+            min_base_ship_distance = self.params.min_base_ship_distance
+            closest_base_distance, closest_base_position = self.bases.nearest(ship.position, True)
 
             if closest_base_distance > min_base_ship_distance:
               # Try to convert the ship into a base
@@ -308,13 +311,10 @@ class PlayerAi:
               if base_uid is None:
                 ship.set_heading((ship.heading + 10) % 360)
             else:
-              ship.set_heading(np.random.random() * 360.0)
+              ship.set_heading(self.rng.heading())
               # next_heading = heading_away_from_land(game_map, *closest_base_position)
               # Lets move in the next best direction
-              # ship.set_heading(heading_away_from_land(game_map, *closest_base_position))
-
-        # Store the previous position of this ship for the next time step
-        self.previous_positions[ship.uid] = ship.position
+              # ship.set_heading(self.land_headings.heading(*closest_base_position))
 
     # Iterate through all my jets
     # if "jets" in myinfo:
@@ -0,0 +1,288 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from .flowfield import FlowField, bfs_distance, descent_headings, passable_mask
+from .geometry import torus_distance
+from .mapstate import MapState
+
+
+def land_counts(game_map: np.ndarray, radius: int) -> np.ndarray:
+  """Land tiles in the (2 * radius + 1)^2 window around every tile, wrapped."""
+  land = (game_map == 1).astype(np.int32)
+  rows = sum(np.roll(land, shift, axis=0) for shift in range(-radius, radius + 1))
+  return sum(np.roll(rows, shift, axis=1) for shift in range(-radius, radius + 1))
+
+
+class _Claim:
+  """A site claimed by a ship, with the water distance to it over the window of tiles around the ship."""
+
+  __slots__ = ("site", "radius", "origin", "size", "distance")
+
+  def __init__(self, site: np.ndarray, radius: float, origin: tuple, size: tuple, distance: np.ndarray):
+    self.site = site
+    self.radius = radius
+    # (x, y) of the first tile of the window and (nx, ny) of the map
+    self.origin = origin
+    self.size = size
+    self.distance = distance
+
+  def index(self, x: float, y: float) -> int:
+    """Flat index of the tile under (x, y) in the window, -1 outside of it."""
+    height, width = self.distance.shape
+    column = (int(x) - self.origin[0]) % self.size[0]
+    row = (int(y) - self.origin[1]) % self.size[1]
+    return row * width + column if column < width and row < height else -1
+
+
+class ConversionSites:
+  """
+  Water tiles where a ship can turn into a base, scored by how far they are
+  from the bases, and claimed by the ships heading for them.
+
+  A site is a known water tile with at least min_land land tiles within
+  radius tiles (the reach of convert_to_base()). Land counts are kept for
+  the whole map and only the windows around tiles that changed since the
+  previous tick are updated, so revealing a few tiles costs little. Sites
+  are free when they are at least `spacing` away from my bases and from the
+  sites my ships claimed, and enemy_spacing away from the enemy's. Every
+  base and claim stamps a disk of that radius into a cover count when it
+  appears and takes it out when it goes, so only the tiles under the disk
+  are redone.
+
+  heading() sends a ship to the site it claimed, and makes it claim one
+  first: the best free site within reach tiles over water, where a site is
+  worth its wrapped distance to the closest base or claim (see score()), up
+  to `spread` spacings, less the water distance to it. The claim keeps the
+  water distance to its site over the window around the ship. Ships without
+  a free site in reach follow a flow field towards the closest free site.
+  Sites taken by a claim or a base leave that field right away, map changes
+  reach it every refresh ticks. forget() releases the claims of ships that
+  converted or were destroyed.
+  """
+
+  def __init__(self, radius: int = 3, min_land: int = 3, enemy_spacing: float = 60.0, refresh: int = 20,
+               reach: int = 32, spread: float = 2.0):
+    self.radius = radius
+    self.refresh = refresh
+    self.min_land = min_land
+    self.enemy_spacing = enemy_spacing
+    self.reach = reach
+    self.spread = spread
+    self.spacing = 0.0
+    self.flow = FlowField("ships")
+    self.land = None
+    self.sites = None
+    self.free = None
+    # Number of base and claim disks over each tile
+    self.cover = None
+    self.claims = {}
+    self._game_map = None
+    self._version = 0
+    self._stamps = set()
+    self._released = []
+    self._stale = False
+    self._flow_map = MapState()
+    self._flow_tick = 0
+    self._ticks = 0
+
+    dy, dx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    self._dy, self._dx = dy.ravel(), dx.ravel()
+
+  def _update_land(self, map_state: MapState):
+    """
+    Update the land counts and sites, and return the windows of tiles that
+    changed as index tuples (None if the whole map was redone).
+    """
+    if self._version == map_state.version:
+      return []
+    game_map = map_state.game_map
+    changes = map_state.changes_since(self._version)
+    self._version = map_state.version
+    if changes is None:
+      self.land = land_counts(game_map, self.radius)
+      self.sites = (game_map == 0) & (self.land >= self.min_land)
+      return None
+
+    changed, previous = changes
+    ny, nx = game_map.shape
+    delta = (game_map.ravel()[changed] == 1).astype(np.int32) - (previous == 1)
+    y, x = np.divmod(changed[delta != 0], nx)
+    np.add.at(self.land, ((y[:, None] + self._dy) % ny, (x[:, None] + self._dx) % nx),
+              np.broadcast_to(delta[delta != 0][:, None], (len(y), len(self._dy))))
+
+    windows = []
+    radius = self.radius
+    for x0, y0, x1, y1 in map_state.rectangles(changed):
+      window = np.ix_(np.arange(y0 - radius, y1 + radius) % ny, np.arange(x0 - radius, x1 + radius) % nx)
+      self.sites[window] = (game_map[window] == 0) & (self.land[window] >= self.min_land)
+      windows.append(window)
+    return windows
+
+  def _stamp(self, x: float, y: float, radius: float, sign: int) -> tuple:
+    """Add sign to the cover of the tiles centered within radius of (x, y), return their window."""
+    ny, nx = self.cover.shape
+    xs = np.arange(np.floor(x - radius), np.floor(x + radius) + 1).astype(np.int64)
+    ys = np.arange(np.floor(y - radius), np.floor(y + radius) + 1).astype(np.int64)
+    inside = (ys[:, None] + 0.5 - y) ** 2 + (xs[None, :] + 0.5 - x) ** 2 < radius ** 2
+    window = np.ix_(ys % ny, xs % nx)
+    np.add.at(self.cover, window, np.where(inside, sign, 0))
+    return window
+
+  def _refree(self, windows: list) -> tuple:
+    """Redo the free sites in the windows, return the flat indices of those taken and those freed."""
+    nx = self.free.shape[1]
+    taken, freed = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    for window in windows:
+      free = self.sites[window] & (self.cover[window] == 0)
+      ys, xs = window
+      if isinstance(ys, np.ndarray):
+        tiles = ys * nx + xs
+        taken.append(tiles[self.free[window] & ~free])
+        freed.append(tiles[free & ~self.free[window]])
+      self.free[window] = free
+    return np.concatenate(taken), np.concatenate(freed)
+
+  def update(self, map_state: MapState, bases: np.ndarray, enemy_bases: np.ndarray, spacing: float) -> None:
+    """Sites for this tick's map, free of my bases, my claims and the known enemy bases."""
+    bases = np.asarray(bases, dtype=float).reshape(-1, 2)
+    enemy_bases = np.asarray(enemy_bases, dtype=float).reshape(-1, 2)
+    self._ticks += 1
+    self.spacing = spacing
+    game_map = self._game_map = map_state.game_map
+    nx = game_map.shape[1]
+
+    windows = self._update_land(map_state)
+    redone = windows is None
+    if redone:
+      self.cover = np.zeros(game_map.shape, dtype=np.int32)
+      self.free = np.zeros(game_map.shape, dtype=bool)
+      self._stamps = set()
+      self._released = []
+      for claim in self.claims.values():
+        self._stamp(*claim.site, claim.radius, 1)
+      windows = [(slice(None), slice(None))]
+    self._stale |= len(windows) > 0
+
+    # New bases first, the claims of the ships that settled there go after
+    stamps = ({(x, y, spacing) for x, y in bases.tolist()} |
+              {(x, y, self.enemy_spacing) for x, y in enemy_bases.tolist()})
+    windows += [self._stamp(*stamp, 1) for stamp in stamps - self._stamps]
+    windows += [self._stamp(*stamp, -1) for stamp in self._stamps - stamps]
+    windows += [self._stamp(*claim.site, claim.radius, -1) for claim in self._released]
+    self._stamps = stamps
+    self._released = []
+    taken, freed = self._refree(windows)
+
+    # The water distances follow the map every refresh ticks only, a full
+    # search per change is too slow
+    if redone or (self._stale and self._ticks - self._flow_tick >= self.refresh):
+      self._flow_map.update(game_map)
+      self._flow_tick = self._ticks
+      self._stale = False
+      y, x = np.divmod(np.flatnonzero(self.free), nx)
+      self.flow.update(self._flow_map, np.stack([x + 0.5, y + 0.5], axis=1))
+    else:
+      self.flow.remove(taken)
+      self.flow.add(freed)
+
+  def score(self, points: np.ndarray) -> np.ndarray:
+    """
+    Wrapped distance of each (n, 2) point to the closest of my bases, my
+    claims and the enemy bases, in units of the spacing kept from it (inf
+    if there is none). Points on free sites score at least 1.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    stamps = [(x, y, radius) for x, y, radius in self._stamps]
+    stamps += [(*claim.site, claim.radius) for claim in self.claims.values()]
+    if not stamps:
+      return np.full(len(points), np.inf)
+    stamps = np.array(stamps, dtype=float)
+    ny, nx = self.free.shape
+    distances = torus_distance(points[:, None], stamps[None, :, :2], np.array([nx, ny], dtype=float))
+    return (distances / stamps[:, 2]).min(axis=1)
+
+  def _claim(self, uid, x: float, y: float):
+    """Claim the best free site within reach of a ship over water, None if there is none."""
+    ny, nx = self.free.shape
+    reach = self.reach
+    xs = np.arange(int(x) - reach, int(x) + reach + 1) % nx
+    ys = np.arange(int(y) - reach, int(y) + reach + 1) % ny
+    window = np.ix_(ys, xs)
+    free = self.free[window].ravel()
+    if not free.any():
+      return None
+
+    passable = passable_mask(self._game_map[window], "ships")
+    width = 2 * reach + 1
+    distance = bfs_distance(passable, [reach * width + reach], wrap=False).ravel()
+    candidates = np.flatnonzero(free & np.isfinite(distance))
+    if not len(candidates):
+      return None
+    row, column = np.divmod(candidates, width)
+    points = np.stack([xs[column] + 0.5, ys[row] + 0.5], axis=1)
+    value = np.minimum(self.score(points), self.spread) * self.spacing - distance[candidates]
+    best = int(np.argmax(value))
+
+    claim = _Claim(points[best], self.spacing, (int(xs[0]), int(ys[0])), (nx, ny),
+                   bfs_distance(passable, [candidates[best]], wrap=False))
+    self.claims[uid] = claim
+    taken, _ = self._refree([self._stamp(*claim.site, claim.radius, 1)])
+    self.flow.remove(taken)
+    return claim
+
+  def _unclaim(self, uid) -> None:
+    claim = self.claims.pop(uid)
+    _, freed = self._refree([self._stamp(*claim.site, claim.radius, -1)])
+    self.flow.add(freed)
+
+  def forget(self, uids) -> None:
+    """
+    Release the claims of ships that are gone. Their sites become free again
+    at the next update(), after the bases the ships settled there are added.
+    """
+    self._released += [self.claims.pop(uid) for uid in uids if uid in self.claims]
+
+  def _covers(self, claim: _Claim, x: float, y: float) -> bool:
+    """Whether the disk of a claim covers the tile under (x, y)."""
+    ny, nx = self.free.shape
+    center = np.array([int(x) % nx + 0.5, int(y) % ny + 0.5])
+    return bool(torus_distance(center, claim.site, np.array([nx, ny], dtype=float)) < claim.radius)
+
+  def is_free(self, x: float, y: float, uid=None) -> bool:
+    """Whether the tile under (x, y) is a free site, for the ship uid (if given) its own claim does not count."""
+    ny, nx = self.free.shape
+    tile = int(y) % ny, int(x) % nx
+    if not self.sites[tile]:
+      return False
+    cover = self.cover[tile]
+    claim = self.claims.get(uid)
+    if claim is not None and self._covers(claim, x, y):
+      cover -= 1
+    return cover == 0
+
+  def heading(self, x: float, y: float, uid=None):
+    """
+    Heading of the ship uid towards the site it claimed, claiming one if
+    needed, or without one (or no uid) towards the closest free site. None
+    if there is none or the ship arrived.
+    """
+    if self.free is None:
+      return None
+    claim = self.claims.get(uid) if uid is not None else None
+    if uid is not None and claim is None:
+      claim = self._claim(uid, x, y)
+    if claim is not None:
+      index = claim.index(x, y)
+      if index >= 0:
+        if claim.distance.ravel()[index] == 0:
+          return None
+        heading = descent_headings(claim.distance, np.array([index]), wrap=False)[0]
+        if not np.isnan(heading):
+          return float(heading)
+      # Off the way to its site, e.g. revealed land cut it: let it go
+      self._unclaim(uid)
+
+    if self.flow.distance is None:
+      return None
+    return self.flow.heading(x, y)
@@ -0,0 +1,90 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+from collections import defaultdict
+import numpy as np
+
+KINDS = ("bases", "tanks", "ships", "jets")
+
+
+class WorldSnapshot:
+  """
+  Struct-of-arrays view of all bases and vehicles in the info dict of a tick.
+
+  Rows are ordered by kind (see KINDS) and, within a kind, by team with my
+  own team first. That makes every (kind, team) pair, all of my units of a
+  kind and all enemy units of a kind contiguous slices of the arrays:
+
+      world.position[world.enemy("jets")]   # (n, 2) positions of enemy jets
+      world.objects_in(world.mine("tanks")) # my tank objects
+
+  Vehicles reference their base through `owner`, the row of the owning base
+  (-1 for bases and for vehicles whose base is not in the info dict).
+  """
+
+  def __init__(self, info: dict, team: str, shape: tuple):
+    self.team = team
+    self.teams = [team] + [name for name in info if name != team]
+    self.size = np.array([shape[1], shape[0]], dtype=float)
+
+    objects = []
+    self.slices = {}
+    for kind in KINDS:
+      for name in self.teams:
+        start = len(objects)
+        objects += info.get(name, {}).get(kind, [])
+        self.slices[kind, name] = slice(start, len(objects))
+      self.slices[kind, None] = slice(self.slices[kind, self.teams[0]].start, len(objects))
+
+    n = len(objects)
+    self.objects = objects
+    self.uids = [obj.uid for obj in objects]
+    self.rows = {uid: row for row, uid in enumerate(self.uids)}
+
+    self.position = np.array([(obj.x, obj.y) for obj in objects], dtype=float).reshape(n, 2)
+    self.health = np.fromiter((getattr(obj, "health", 0) for obj in objects), float, n)
+    self.attack = np.fromiter((getattr(obj, "attack", 0) for obj in objects), float, n)
+    self.speed = np.fromiter((getattr(obj, "speed", 0) for obj in objects), float, n)
+    self.heading = np.fromiter((getattr(obj, "heading", 0) for obj in objects), float, n)
+
+    self.kind = np.empty(n, dtype=np.int8)
+    self.team_index = np.empty(n, dtype=np.int16)
+    for (kind, name), rows in self.slices.items():
+      if name is not None:
+        self.kind[rows] = KINDS.index(kind)
+        self.team_index[rows] = self.teams.index(name)
+
+    self.owner = np.full(n, -1, dtype=np.int64)
+    vehicles = slice(self.slices["bases", None].stop, n)
+    self.owner[vehicles] = [self.rows.get(obj.owner.uid, -1) for obj in objects[vehicles]]
+
+  def rows_of(self, kind: str, team: str = None) -> slice:
+    return self.slices[kind, team]
+
+  def mine(self, kind: str) -> slice:
+    return self.slices[kind, self.team]
+
+  def enemy(self, kind: str) -> slice:
+    return slice(self.slices[kind, self.team].stop, self.slices[kind, None].stop)
+
+  def my_rows(self) -> np.ndarray:
+    """Rows of all my bases and vehicles."""
+    return np.r_[tuple(self.mine(kind) for kind in KINDS)]
+
+  def objects_in(self, rows) -> list:
+    if isinstance(rows, slice):
+      return self.objects[rows]
+    return [self.objects[row] for row in rows]
+
+  def group_by_owner(self, kind: str) -> defaultdict:
+    """My vehicles of the given kind, grouped by the uid of their base."""
+    rows = self.mine(kind)
+    owners = self.owner[rows]
+    order = np.argsort(owners, kind="stable")
+    owner_rows, starts = np.unique(owners[order], return_index=True)
+
+    grouped = defaultdict(list)
+    objects = self.objects[rows]
+    for owner_row, group in zip(owner_rows, np.split(order, starts[1:])):
+      if owner_row >= 0:
+        grouped[self.uids[owner_row]] = [objects[i] for i in group]
+    return grouped
@@ -0,0 +1,147 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from .geometry import torus_distance
+
+# Most point pairs k_nearest() measures at once for all queries together
+BATCH = 1 << 22
+
+
+class SpatialHash:
+  """
+  Uniform grid of points on a map that wraps around its edges.
+
+  Build one per tick from the positions of interest, e.g. the enemy bases of
+  a WorldSnapshot, and answer nearest, k-nearest and within-radius queries.
+  Queries take either a single (x, y) point or an (m, 2) batch of points;
+  the returned indices refer to rows of the positions the hash was built from.
+  """
+
+  def __init__(self, positions: np.ndarray, size: np.ndarray, cell_size: float = 32.0):
+    self.size = np.asarray(size, dtype=float)
+    self.positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+    self.ncells = np.maximum((self.size // cell_size).astype(int), 1)
+    self.cell_size = self.size / self.ncells
+
+    ids = self._cell_ids(self.positions)
+    self.order = np.argsort(ids, kind="stable")
+    self.starts = np.searchsorted(ids[self.order], np.arange(self.ncells.prod() + 1))
+    # The points of every cell in a row, padded with -1
+    self.table = np.full((self.ncells.prod(), max(np.diff(self.starts).max(initial=0), 1)), -1, dtype=np.int64)
+    self.table[ids[self.order], np.arange(len(ids)) - self.starts[ids[self.order]]] = self.order
+
+  def __len__(self) -> int:
+    return len(self.positions)
+
+  def nearest(self, points: np.ndarray) -> tuple:
+    """Distance to and index of the nearest point (inf and -1 if empty)."""
+    distances, indices = self.k_nearest(points, 1)
+    return distances[..., 0], indices[..., 0]
+
+  def k_nearest(self, points: np.ndarray, k: int) -> tuple:
+    """
+    Distances and indices of the k nearest points, sorted by distance and
+    padded with inf and -1 when there are fewer than k points.
+    """
+    points, single = self._as_batch(points)
+    distances = np.full((len(points), k), np.inf)
+    indices = np.full((len(points), k), -1, dtype=np.int64)
+    found = min(k, len(self.positions))
+
+    if found > 0:
+      query_ids = self._cell_ids(points)
+      pending = np.arange(len(points))
+      width = 9 * self.table.shape[1]
+      if self.ncells.min() >= 5 and found <= width and width * len(points) <= BATCH:
+        # Most queries find their points in the cells around their own, all
+        # queries look there together first. The cells are close enough
+        # that unwrapping them gives the shortest vectors.
+        cells = self._cells(points)[:, None] + np.stack(np.meshgrid([-1, 0, 1], [-1, 0, 1]), -1).reshape(-1, 2)
+        shift = cells // self.ncells * self.size - points[:, None]
+        cells %= self.ncells
+        candidates = self.table[cells[..., 1] * self.ncells[0] + cells[..., 0]]
+        dx = self.positions[:, 0][candidates] + shift[:, :, None, 0]
+        dy = self.positions[:, 1][candidates] + shift[:, :, None, 1]
+        candidates = candidates.reshape(len(points), -1)
+        # Squared distances, the root only of the ones kept
+        dist = (dx * dx + dy * dy).reshape(len(points), -1)
+        dist[candidates < 0] = np.inf
+        best = np.argpartition(dist, found - 1, axis=1)[:, :found]
+        best = np.take_along_axis(best, np.argsort(np.take_along_axis(dist, best, axis=1), axis=1), axis=1)
+        best_dist = np.sqrt(np.take_along_axis(dist, best, axis=1))
+        done = best_dist[:, -1] <= self.cell_size.min()
+        distances[done, :found] = best_dist[done]
+        indices[done, :found] = np.take_along_axis(candidates, best, axis=1)[done]
+        pending = np.flatnonzero(~done)
+
+      # Queries in the same cell share their candidates, so they are answered
+      # together with one distance matrix per ring of cells.
+      for cell_id in np.unique(query_ids[pending]):
+        queries = pending[query_ids[pending] == cell_id]
+        cell = np.array([cell_id % self.ncells[0], cell_id // self.ncells[0]])
+
+        ring = 0
+        while True:
+          candidates = self._candidates(self._ring_cells(cell, ring))
+          covers_map = 2 * ring + 1 >= self.ncells.max()
+          if len(candidates) >= found:
+            dist = torus_distance(points[queries, None], self.positions[candidates], self.size)
+            best = np.argsort(dist, axis=1, kind="stable")[:, :found]
+            best_dist = np.take_along_axis(dist, best, axis=1)
+            # Anything closer than `ring` cells is guaranteed to be among the
+            # candidates already.
+            if covers_map or best_dist[:, -1].max() <= ring * self.cell_size.min():
+              distances[queries, :found] = best_dist
+              indices[queries, :found] = candidates[best]
+              break
+          ring += 1
+
+    if single:
+      return distances[0], indices[0]
+    return distances, indices
+
+  def within(self, points: np.ndarray, radius: float):
+    """Indices of the points within radius, one array per query point."""
+    points, single = self._as_batch(points)
+    rings = int(np.ceil(radius / self.cell_size.min()))
+
+    result = []
+    for point in points:
+      cell = self._cells(point[None])[0]
+      candidates = self._candidates(self._ring_cells(cell, rings))
+      dist = torus_distance(point, self.positions[candidates], self.size)
+      result.append(candidates[dist <= radius])
+
+    if single:
+      return result[0]
+    return result
+
+  def _as_batch(self, points: np.ndarray) -> tuple:
+    points = np.asarray(points, dtype=float)
+    single = points.ndim == 1
+    return points.reshape(-1, 2), single
+
+  def _cells(self, points: np.ndarray) -> np.ndarray:
+    return (np.floor(points / self.cell_size).astype(np.int64) % self.ncells)
+
+  def _cell_ids(self, points: np.ndarray) -> np.ndarray:
+    cells = self._cells(points)
+    return cells[:, 1] * self.ncells[0] + cells[:, 0]
+
+  def _ring_cells(self, cell: np.ndarray, ring: int) -> np.ndarray:
+    """Ids of all cells within `ring` cells of the given one, wrapped."""
+    offsets = np.arange(-ring, ring + 1)
+    xs = np.unique((cell[0] + offsets) % self.ncells[0])
+    ys = np.unique((cell[1] + offsets) % self.ncells[1])
+    return (ys[:, None] * self.ncells[0] + xs[None, :]).ravel()
+
+  def _candidates(self, cell_ids: np.ndarray) -> np.ndarray:
+    starts = self.starts[cell_ids]
+    lengths = self.starts[cell_ids + 1] - starts
+    total = lengths.sum()
+    if total == 0:
+      return np.empty(0, dtype=np.int64)
+    # Concatenate order[start:start + length] of every cell without a loop
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return self.order[offsets + np.arange(total)]
@@ -0,0 +1,97 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Parameter search for one bot, with successive halving on the stand-in engine.
+
+    python -m <package>.sweep hunterx_ai --candidates 27 --seeds 2 --eta 3
+
+Candidates are the bot's current PARAMS and random settings within
+params.SCHEMA. Every rung, each remaining candidate plays all opponents on
+more seeds (eta times as many as the rung before, on a process pool), then
+only the best 1/eta of them go on, so bad candidates are dropped after a few
+matches. The winner is written to the parameters file, which the bot loads
+at startup.
+"""
+
+import argparse
+import concurrent.futures
+import importlib
+import numpy as np
+
+from .benchmark import BOTS
+from .params import SCHEMA, clip, save_params
+from .tournament import play
+
+
+def sample(defaults: dict, rng: np.random.Generator) -> dict:
+  """Random values for the parameters of a bot, uniform within their bounds."""
+  values = {}
+  for name in defaults:
+    low, high = SCHEMA[name]
+    values[name] = clip(name, rng.integers(low, high + 1) if isinstance(low, int) else rng.uniform(low, high))
+  return values
+
+
+def successive_halving(bot: str, opponents: list, candidates: int = 27, seeds: int = 2, eta: int = 3,
+                       map_size: int = 256, ticks: int = 600, workers: int = None, seed: int = 0):
+  """Returns the best parameters and their mean score against the opponents."""
+  defaults = importlib.import_module(f".{bot}", __package__).PARAMS
+  rng = np.random.default_rng(seed)
+  settings = [dict(defaults)] + [sample(defaults, rng) for _ in range(candidates - 1)]
+  scores = [[] for _ in settings]
+  alive = list(range(len(settings)))
+  played = 0
+  rung_seeds = seeds
+
+  with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+    while True:
+      futures = {}
+      for index in alive:
+        for opponent in opponents:
+          for match_seed in range(played, rung_seeds):
+            # Alternate who is placed first, the score is always the bot's
+            first = match_seed % 2 == 0
+            a, b = (bot, opponent) if first else (opponent, bot)
+            future = pool.submit(play, a, b, match_seed, map_size, ticks, {bot: settings[index]})
+            futures[future] = index, first
+      for future in concurrent.futures.as_completed(futures):
+        index, first = futures[future]
+        score = future.result()["score"]
+        scores[index].append(score if first else 1 - score)
+
+      alive.sort(key=lambda index: -np.mean(scores[index]))
+      print(f"{len(alive)} candidates after {rung_seeds} seeds, best {np.mean(scores[alive[0]]):.2f}: "
+            f"{settings[alive[0]]}", flush=True)
+      if len(alive) == 1:
+        break
+      alive = alive[:max(1, len(alive) // eta)]
+      played = rung_seeds
+      rung_seeds *= eta
+
+  return settings[alive[0]], float(np.mean(scores[alive[0]]))
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument("bot", choices=[bot for bot in BOTS
+                                      if hasattr(importlib.import_module(f".{bot}", __package__), "PARAMS")])
+  parser.add_argument("--opponents", nargs="+", choices=BOTS, help="all other bots by default")
+  parser.add_argument("--candidates", type=int, default=27)
+  parser.add_argument("--seeds", type=int, default=2, help="seeds per opponent in the first rung")
+  parser.add_argument("--eta", type=int, default=3, help="1/eta of the candidates survive each rung")
+  parser.add_argument("--map", type=int, default=256)
+  parser.add_argument("--ticks", type=int, default=600)
+  parser.add_argument("--workers", type=int, help="processes, all cores by default")
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--output", help="parameters file, see params.load_params()")
+  args = parser.parse_args(argv)
+
+  opponents = args.opponents or [bot for bot in BOTS if bot != args.bot]
+  best, score = successive_halving(args.bot, opponents, args.candidates, args.seeds, args.eta, args.map,
+                                   args.ticks, args.workers, args.seed)
+  save_params(args.bot, best, args.output)
+  print(f"{args.bot}: {best} (score {score:.2f})")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,101 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from .mapstate import MapState
+
+
+def away_from_land_headings(game_map: np.ndarray, offset: int = 5) -> np.ndarray:
+  """
+  Heading (in degrees) pointing away from land for every tile of the map.
+
+  Each land tile within a (2 * offset + 1)^2 window pushes the tile away with
+  a unit vector; the pushes of the whole map are summed in one FFT
+  convolution, which wraps around the map edges like the game does. Tiles
+  without land in their window get a heading of 0.
+  """
+  ny, nx = game_map.shape
+  land = (game_map == 1).astype(np.float64)
+
+  dy, dx = np.mgrid[-offset:offset + 1, -offset:offset + 1]
+  r = np.hypot(dx, dy)
+  r[offset, offset] = np.inf
+
+  # The land tile at (y + dy, x + dx) pushes (x, y) along (-dx, -dy), which is
+  # a correlation with the window; store the mirrored kernel to convolve.
+  kx = np.zeros((ny, nx))
+  ky = np.zeros((ny, nx))
+  rows = -dy % ny
+  cols = -dx % nx
+  np.add.at(kx, (rows, cols), -dx / r)
+  np.add.at(ky, (rows, cols), -dy / r)
+
+  land_f = np.fft.rfft2(land)
+  vx = np.fft.irfft2(land_f * np.fft.rfft2(kx), s=(ny, nx))
+  vy = np.fft.irfft2(land_f * np.fft.rfft2(ky), s=(ny, nx))
+
+  # Round off the FFT noise so that land-free tiles end up exactly at 0
+  vx[np.abs(vx) < 1e-9] = 0
+  vy[np.abs(vy) < 1e-9] = 0
+  return np.degrees(np.arctan2(vy, vx)) % 360
+
+
+def window_headings(game_map: np.ndarray, x0: int, y0: int, x1: int, y1: int, offset: int = 5) -> np.ndarray:
+  """
+  away_from_land_headings() of the tiles x0 <= x < x1, y0 <= y < y1 only
+  (wrapped), with the pushes summed directly instead of by FFT.
+  """
+  ny, nx = game_map.shape
+  height, width = y1 - y0, x1 - x0
+  land = (game_map[np.ix_(np.arange(y0 - offset, y1 + offset) % ny,
+                          np.arange(x0 - offset, x1 + offset) % nx)] == 1).astype(np.float64)
+  vx = np.zeros((height, width))
+  vy = np.zeros((height, width))
+  for dy in range(-offset, offset + 1):
+    for dx in range(-offset, offset + 1):
+      if dx or dy:
+        r = np.hypot(dx, dy)
+        window = land[offset + dy:offset + dy + height, offset + dx:offset + dx + width]
+        vx -= dx / r * window
+        vy -= dy / r * window
+
+  vx[np.abs(vx) < 1e-9] = 0
+  vy[np.abs(vy) < 1e-9] = 0
+  return np.degrees(np.arctan2(vy, vx)) % 360
+
+
+class LandHeadingField:
+  """
+  Cached away-from-land headings for the whole map.
+
+  Call update() once per tick; the headings are only recomputed around the
+  blocks of the map that changed since the previous tick, or for the whole
+  map when much of it did, after which heading() is an array lookup.
+  """
+
+  def __init__(self, offset: int = 5):
+    self.offset = offset
+    self.headings = None
+    self._version = 0
+
+  def update(self, map_state: MapState) -> bool:
+    if self._version == map_state.version:
+      return False
+
+    ny, nx = map_state.shape
+    reach = self.offset
+    windows = [(x0 - reach, y0 - reach, x1 + reach, y1 + reach) for x0, y0, x1, y1 in map_state.dirty]
+    area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in windows)
+    if self.headings is None or self._version != map_state.version - 1 or area * 8 > ny * nx:
+      self.headings = away_from_land_headings(map_state.game_map, self.offset)
+    else:
+      # The tiles within offset of a change are the only ones it pushes
+      for x0, y0, x1, y1 in windows:
+        self.headings[np.ix_(np.arange(y0, y1) % ny, np.arange(x0, x1) % nx)] = \
+            window_headings(map_state.game_map, x0, y0, x1, y1, self.offset)
+    self._version = map_state.version
+    return True
+
+  def heading(self, x: float, y: float) -> float:
+    ny, nx = self.headings.shape
+    return float(self.headings[int(y) % ny, int(x) % nx])
@@ -0,0 +1,13 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import importlib.util
+import pathlib
+import sys
+
+# The bots live in a directory that is imported as a package by the game,
+# under whatever name it has there: load it as `bots` for the tests.
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+if "bots" not in sys.modules:
+  spec = importlib.util.spec_from_file_location("bots", ROOT / "__init__.py", submodule_search_locations=[str(ROOT)])
+  sys.modules["bots"] = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(sys.modules["bots"])
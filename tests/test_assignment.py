@@ -0,0 +1,99 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+
+import bots.assignment
+from bots.assignment import TargetAssigner, auction, cost_matrix
+
+
+def brute_force(cost, capacity):
+  """Best total benefit over all assignments, with the benefits of auction()."""
+  n, m = cost.shape
+  feasible = np.isfinite(cost)
+  low, high = cost[feasible].min(), cost[feasible].max()
+  benefit = np.where(feasible, high + max(high - low, 1e-9) - cost, -np.inf)
+  slots = [j for j in range(m) for _ in range(capacity[j])] + [-1] * n
+  best = -np.inf
+  for choice in itertools.permutations(slots, n):
+    best = max(best, sum(benefit[i, j] for i, j in enumerate(choice) if j >= 0))
+  return best, benefit
+
+
+def test_auction_matches_brute_force():
+  rng = np.random.default_rng(0)
+  for _ in range(150):
+    n, m = rng.integers(1, 5, 2)
+    capacity = rng.integers(1, 3, m)
+    cost = rng.uniform(0, 10, (n, m))
+    cost[rng.random((n, m)) < 0.2] = np.inf
+    if not np.isfinite(cost).any():
+      continue
+    eps = 1e-4
+    result, _ = auction(cost, capacity, eps=eps)
+    best, benefit = brute_force(cost, capacity)
+    assigned = result >= 0
+    assert np.all(np.bincount(result[assigned], minlength=m) <= capacity)
+    assert np.all(np.isfinite(cost[assigned, result[assigned]]))
+    assert benefit[assigned, result[assigned]].sum() >= best - n * eps - 1e-9
+
+
+def test_warm_start_keeps_solution():
+  rng = np.random.default_rng(1)
+  cost = rng.uniform(0, 100, (40, 30))
+  result, prices = auction(cost, 2)
+  warm, _ = auction(cost, 2, prices, result)
+  rows = np.arange(40)
+  assert cost[rows, warm].sum() <= cost[rows, result].sum() + 40 * np.ptp(cost) / 100
+
+
+def test_sparse_auction_stays_on_candidates():
+  rng = np.random.default_rng(2)
+  n, m, k = 60, 50, 4
+  columns = np.array([rng.choice(m, k, replace=False) for _ in range(n)])
+  cost = rng.uniform(0, 10, (n, k))
+  result, _ = auction(cost, np.ones(m, dtype=int), columns=columns)
+  assigned = result >= 0
+  assert np.all((columns[assigned] == result[assigned, None]).any(axis=1))
+  assert len(set(result[assigned])) == assigned.sum()
+
+
+def test_cost_matrix_columns_match_dense():
+  rng = np.random.default_rng(3)
+  positions, targets = rng.uniform(0, 100, (20, 2)), rng.uniform(0, 100, (15, 2))
+  args = (np.array([100.0, 100.0]), rng.uniform(1, 5, 20), rng.uniform(1, 5, 20), rng.uniform(10, 50, 15))
+  dense = cost_matrix(positions, targets, *args)
+  columns = rng.integers(-1, 15, (20, 4))
+  sparse = cost_matrix(positions, targets, *args, columns=columns)
+  expected = np.where(columns >= 0, np.take_along_axis(dense, np.maximum(columns, 0), axis=1), np.inf)
+  np.testing.assert_allclose(sparse, expected)
+
+
+def test_assign_rows_1000_by_1000_stays_sparse(monkeypatch):
+  rng = np.random.default_rng(4)
+  n = 1000
+  world = SimpleNamespace(
+      uids=[str(i) for i in range(2 * n)], position=rng.uniform(0, 256, (2 * n, 2)), size=np.array([256.0, 256.0]),
+      speed=np.r_[np.full(n, 20.0), np.zeros(n)], attack=np.r_[np.full(n, 30.0), np.zeros(n)],
+      health=np.full(2 * n, 50.0), kind=np.r_[np.full(n, 3), np.full(n, 1)].astype(np.int8))
+  assigner = TargetAssigner()
+  assigner.assign_rows(world, slice(0, n), slice(n, 2 * n))
+
+  # What every auction of a tick is given, instead of how long it takes here
+  calls = []
+  def recorded_auction(cost, capacity=1, prices=None, assignment=None, eps=None, columns=None, rounds=None):
+    calls.append((cost.shape, None if columns is None else columns.shape, rounds))
+    return auction(cost, capacity, prices, assignment, eps, columns, rounds)
+  monkeypatch.setattr(bots.assignment, "auction", recorded_auction)
+
+  for _ in range(5):
+    world.position[:n] = (world.position[:n] + rng.normal(0, 0.5, (n, 2))) % 256
+    targets = assigner.assign_rows(world, slice(0, n), slice(n, 2 * n))
+    assert len(targets) == n and len(set(targets.values())) == n
+  # Every unit bids for its 8 nearest targets for at most 20 rounds, the
+  # units left over after that for the few targets left
+  sparse = [call for call in calls if call[1] is not None]
+  assert len(sparse) == 5 and all(call[:2] == ((n, 8), (n, 8)) and call[2] == 20 for call in sparse)
+  assert all(shape[0] * shape[1] <= (n // 10) ** 2 for shape, columns, _ in calls if columns is None)
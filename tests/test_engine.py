@@ -0,0 +1,100 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+from types import SimpleNamespace
+
+import numpy as np
+
+from bots.engine import BASE_HEALTH, STATS, VIEW_RADIUS, Engine, make_map
+
+
+class Driver:
+  """Player that builds a tank and a ship at once and sends every vehicle along a heading."""
+
+  def __init__(self, team: str, heading: float = 0.0):
+    self.team = team
+    self.heading = heading
+    self.infos = []
+
+  def run(self, t, dt, info, game_map):
+    self.infos.append(info)
+    base = info[self.team]["bases"][0]
+    if base.crystal > base.cost("tank"):
+      base.build_tank(self.heading)
+    for vehicle in info[self.team].get("tanks", []) + info[self.team].get("ships", []):
+      vehicle.set_heading(self.heading)
+
+
+def strip_map(nx=64, ny=32):
+  """Land in the left half of the map, water in the right half."""
+  game_map = np.zeros((ny, nx), dtype=int)
+  game_map[:, :nx // 2] = 1
+  return game_map
+
+
+def test_same_seed_same_match():
+  runs = []
+  for _ in range(2):
+    engine = Engine([Driver("a", 30.0), Driver("b", 200.0)], nx=128, ny=64, seed=3)
+    engine.run(50)
+    runs.append((engine.game_map, engine.position[engine.alive].copy(),
+                 [(base.x, base.y) for team in engine.teams for base in engine.bases[team]]))
+  for first, second in zip(*runs):
+    assert np.array_equal(first, second)
+  assert np.array_equal(runs[0][0], make_map(128, 64, np.random.default_rng(3)))
+
+
+def test_tanks_stay_on_land_and_ships_on_water():
+  engine = Engine([SimpleNamespace(team="a")], game_map=strip_map(), dt=1.0)
+  base = engine.add_base("a", 30.5, 10.5)
+  tank = engine.add_vehicle(base, "tanks", 0.0)
+  ship = engine.add_vehicle(engine.add_base("a", 34.5, 20.5), "ships", 180.0)
+  for _ in range(5):
+    engine.move()
+  assert tank.x < 32 and ship.x >= 32
+  jet = engine.add_vehicle(base, "jets", 0.0)
+  engine.move()
+  assert jet.x == 30.5 + STATS["jets"]["speed"]
+
+
+def test_fog_hides_what_is_out_of_view():
+  engine = Engine([Driver("a"), Driver("b")], game_map=strip_map(256, 64), fog=True)
+  engine.bases["a"][0].x, engine.bases["a"][0].y = 10.5, 10.5
+  engine.bases["b"][0].x, engine.bases["b"][0].y = 10.5 + VIEW_RADIUS + 20, 10.5
+  assert "b" not in engine.info("a")
+  view = engine.view("a")
+  assert view[10, 10] == 1 and view[10, 200] == -1
+  # A jet flies close enough to see the enemy base
+  engine.add_vehicle(engine.bases["a"][0], "jets", 0.0)
+  engine.position[engine.alive] = (10.5 + 30, 10.5)
+  assert [base.uid for base in engine.info("a")["b"]["bases"]] == [engine.bases["b"][0].uid]
+  assert engine.view("a")[10, 80] == 1
+
+
+def test_fights_crashes_and_conversions():
+  class Crasher:
+    team = "b"
+    def run(self, t, dt, info, game_map):
+      raise RuntimeError("crash")
+
+  engine = Engine([Driver("a"), Crasher()], game_map=strip_map(), dt=1.0)
+  target = engine.bases["b"][0]
+  target.x, target.y = 10.5, 10.5
+  tank = engine.add_vehicle(engine.add_base("a", 12.5, 10.5), "tanks", 0.0)
+  tank.stop()
+  for _ in range(int(BASE_HEALTH // STATS["tanks"]["attack"]) - 1):
+    engine.fight()
+  assert target in engine.bases["b"]
+  engine.fight()
+  assert target not in engine.bases["b"]
+
+  engine.bases["b"].append(target)
+  engine.step()
+  assert engine.errors == {"a": 0, "b": 1} and "crash" in engine.last_error["b"]
+
+  ship = engine.add_vehicle(engine.bases["a"][0], "ships", 0.0)
+  engine.position[ship._slot] = (50.5, 10.5)
+  assert ship.convert_to_base() is None
+  engine.position[ship._slot] = (33.5, 10.5)
+  uid = ship.convert_to_base()
+  assert uid is not None and uid in [base.uid for base in engine.bases["a"]]
+  assert ship not in engine.vehicles["a"]["ships"]
@@ -0,0 +1,86 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from bots.exploration import FrontierPlanner, frontier_mask
+from bots.mapstate import MapState
+
+
+def reveal(rng, seen, truth, windows=3):
+  ny, nx = seen.shape
+  for _ in range(windows):
+    y, x = rng.integers(0, (ny, nx))
+    h, w = rng.integers(1, 10, 2)
+    ys, xs = np.arange(y, y + h) % ny, np.arange(x, x + w) % nx
+    seen[np.ix_(ys, xs)] = truth[np.ix_(ys, xs)]
+
+
+def test_incremental_frontier_matches_full_recompute():
+  rng = np.random.default_rng(0)
+  for _ in range(5):
+    shape = rng.integers(20, 70, 2)
+    truth = (rng.random(shape) > 0.6).astype(np.int64)
+    seen = np.full(shape, -1)
+    map_state = MapState()
+    planner = FrontierPlanner(cell_size=8)
+    for _ in range(20):
+      reveal(rng, seen, truth)
+      map_state.update(seen)
+      planner.update(map_state)
+      full = FrontierPlanner(cell_size=8)
+      fresh = MapState()
+      fresh.update(seen)
+      full.update(fresh)
+      assert np.array_equal(planner.frontier, frontier_mask(seen))
+      assert np.array_equal(planner.counts, full.counts)
+      assert np.allclose(planner.sums, full.sums)
+      assert planner.known == full.known
+
+
+def test_cluster_targets_are_the_frontier_tiles_closest_to_the_mean():
+  rng = np.random.default_rng(1)
+  shape = (45, 60)
+  truth = (rng.random(shape) > 0.6).astype(np.int64)
+  seen = np.full(shape, -1)
+  map_state = MapState()
+  planner = FrontierPlanner(cell_size=8)
+  for _ in range(10):
+    reveal(rng, seen, truth)
+    map_state.update(seen)
+    planner.update(map_state)
+    frontier = frontier_mask(seen)
+    for kind, mask in (("jets", frontier), ("ships", frontier & (seen == 0))):
+      ids, targets, counts = planner.clusters(kind)
+      for cluster, target, count in zip(ids, targets, counts):
+        cy, cx = divmod(cluster, -(-shape[1] // 8))
+        window = np.zeros(shape, dtype=bool)
+        window[cy * 8:(cy + 1) * 8, cx * 8:(cx + 1) * 8] = True
+        y, x = np.nonzero(mask & window)
+        assert len(x) == count
+        offset = (x - x.mean()) ** 2 + (y - y.mean()) ** 2
+        tile = np.floor(target).astype(int)
+        assert mask[tile[1], tile[0]] and window[tile[1], tile[0]]
+        assert np.isclose((tile[0] - x.mean()) ** 2 + (tile[1] - y.mean()) ** 2, offset.min())
+
+
+def test_kept_targets_match_fresh_planner():
+  rng = np.random.default_rng(2)
+  shape = (40, 72)
+  truth = (rng.random(shape) > 0.5).astype(np.int64)
+  seen = np.full(shape, -1)
+  map_state = MapState()
+  planner = FrontierPlanner(cell_size=8)
+  for step in range(30):
+    reveal(rng, seen, truth)
+    map_state.update(seen)
+    planner.update(map_state)
+    # Targets asked for now and then, with several updates in between
+    if step % 3:
+      continue
+    fresh = FrontierPlanner(cell_size=8)
+    full = MapState()
+    full.update(seen)
+    fresh.update(full)
+    for kind in FrontierPlanner.KINDS:
+      for kept, expected in zip(planner.clusters(kind), fresh.clusters(kind)):
+        assert np.array_equal(kept, expected)
@@ -0,0 +1,116 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+from collections import deque
+
+import numpy as np
+
+from bots.flowfield import NEIGHBOURS, NEIGHBOUR_HEADINGS, FlowField, bfs_distance, bfs_repair, passable_mask
+from bots.mapstate import MapState
+
+
+def bfs(passable, sources):
+  """Steps from the closest source to every tile, 8-connected and wrapped, without cutting corners."""
+  ny, nx = passable.shape
+  steps = np.full(passable.shape, np.inf)
+  queue = deque()
+  for source in sources:
+    y, x = divmod(int(source), nx)
+    steps[y, x] = 0
+    queue.append((x, y))
+  while queue:
+    x, y = queue.popleft()
+    for dx, dy in NEIGHBOURS:
+      tx, ty = (x + dx) % nx, (y + dy) % ny
+      if not passable[ty, tx] or steps[ty, tx] <= steps[y, x] + 1:
+        continue
+      if dx and dy and not (passable[y, tx] and passable[ty, x]):
+        continue
+      steps[ty, tx] = steps[y, x] + 1
+      queue.append((tx, ty))
+  return steps
+
+
+def random_map(rng, shape):
+  return rng.choice([-1, 0, 1], size=shape, p=[0.2, 0.5, 0.3])
+
+
+def test_bfs_distance_matches_queue_bfs():
+  rng = np.random.default_rng(0)
+  for _ in range(30):
+    passable = rng.random(rng.integers(3, 40, 2)) > 0.35
+    sources = rng.integers(0, passable.size, rng.integers(1, 5))
+    assert np.array_equal(bfs_distance(passable, sources), bfs(passable, sources))
+
+
+def test_added_sources_match_full_search():
+  rng = np.random.default_rng(1)
+  for _ in range(30):
+    passable = rng.random(rng.integers(3, 40, 2)) > 0.35
+    first, second = rng.integers(0, passable.size, (2, 3))
+    grown = bfs_distance(passable, second, bfs_distance(passable, first))
+    assert np.array_equal(grown, bfs_distance(passable, np.r_[first, second]))
+
+
+def test_removed_sources_match_full_search():
+  rng = np.random.default_rng(4)
+  for _ in range(60):
+    passable = rng.random(rng.integers(3, 40, 2)) > 0.35
+    sources = np.unique(rng.integers(0, passable.size, rng.integers(1, 8)))
+    removed = rng.choice(sources, rng.integers(1, len(sources) + 1), replace=False)
+    kept = np.setdiff1d(sources, removed)
+    repaired = bfs_repair(passable, removed, bfs_distance(passable, sources))
+    assert np.array_equal(repaired, bfs_distance(passable, kept) if len(kept) else bfs(passable, []))
+
+
+def check_headings(field):
+  """Every heading steps to a closer neighbour, reachable tiles away from the sources have one."""
+  ny, nx = field.distance.shape
+  for y in range(ny):
+    for x in range(nx):
+      heading = field.heading(x, y)
+      if heading is None:
+        assert not 0 < field.distance[y, x] < np.inf
+        continue
+      dx, dy = NEIGHBOURS[np.flatnonzero(np.isclose(NEIGHBOUR_HEADINGS, heading))[0]]
+      assert field.distance[(y + dy) % ny, (x + dx) % nx] < field.distance[y, x]
+
+
+def test_flow_field_follows_map_and_sources():
+  rng = np.random.default_rng(2)
+  truth = random_map(rng, (30, 40))
+  seen = np.where(rng.random(truth.shape) < 0.5, truth, -1)
+  map_state = MapState()
+  map_state.update(seen)
+  field = FlowField("ships")
+  sources = [tuple(rng.uniform(0, (40, 30))) for _ in range(2)]
+  for tick in range(12):
+    if tick % 3 == 0:
+      seen = np.where(rng.random(truth.shape) < 0.2, truth, seen)
+      map_state.update(seen)
+    if tick % 4 == 1:
+      sources.pop(0)
+    sources.append(tuple(rng.uniform(0, (40, 30))))
+    field.update(map_state, sources)
+    tiles = [int(y) * 40 + int(x) for x, y in sources]
+    assert np.array_equal(field.distance, bfs(passable_mask(seen, "ships"), tiles))
+    check_headings(field)
+
+
+def test_add_and_remove_match_update():
+  rng = np.random.default_rng(3)
+  game_map = random_map(rng, (25, 35))
+  map_state = MapState()
+  map_state.update(game_map)
+  field = FlowField("tanks")
+  field.update(map_state, [(3.5, 4.5)])
+  tiles = rng.integers(0, game_map.size, 5)
+  assert field.add(tiles)
+  assert not field.add(tiles[:2])
+  assert field.sources == {4 * 35 + 3} | set(tiles.tolist())
+  assert np.array_equal(field.distance, bfs(passable_mask(game_map, "tanks"), list(field.sources)))
+  check_headings(field)
+  assert field.remove(tiles[1:])
+  assert not field.remove(tiles[1:])
+  assert field.sources == {4 * 35 + 3, int(tiles[0])}
+  assert np.array_equal(field.distance, bfs(passable_mask(game_map, "tanks"), list(field.sources)))
+  check_headings(field)
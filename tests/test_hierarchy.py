@@ -0,0 +1,88 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+from collections import deque
+
+import numpy as np
+
+from bots.hierarchy import ClusterGraph, block_distances
+from bots.pathfinding import astar
+
+
+def bfs(passable, source):
+  """Steps from source to every tile of a block, 8-connected without cutting corners or wrapping."""
+  height, width = passable.shape
+  steps = np.full(passable.shape, np.inf)
+  steps[source[1], source[0]] = 0
+  queue = deque([source])
+  while queue:
+    x, y = queue.popleft()
+    for dx in (-1, 0, 1):
+      for dy in (-1, 0, 1):
+        nx_, ny_ = x + dx, y + dy
+        if not (0 <= nx_ < width and 0 <= ny_ < height) or not passable[ny_, nx_] or steps[ny_, nx_] < np.inf:
+          continue
+        if dx and dy and not (passable[y, nx_] and passable[ny_, x]):
+          continue
+        steps[ny_, nx_] = steps[y, x] + 1
+        queue.append((nx_, ny_))
+  return steps
+
+
+def test_block_distances_match_bfs():
+  rng = np.random.default_rng(0)
+  for _ in range(40):
+    height, width = rng.integers(1, 40), rng.integers(1, 65)
+    passable = rng.random((height, width)) > 0.3
+    tiles = np.argwhere(passable)[:, ::-1]
+    if len(tiles) == 0:
+      continue
+    sources = tiles[rng.integers(0, len(tiles), 3)]
+    targets = tiles[rng.integers(0, len(tiles), 5)]
+    distances = block_distances(passable, sources, targets)
+    for row, source in enumerate(sources):
+      np.testing.assert_array_equal(distances[row], bfs(passable, tuple(source))[targets[:, 1], targets[:, 0]])
+
+
+def entrances(graph):
+  return sorted(zip(graph.node_x.tolist(), graph.node_y.tolist(), graph.node_x[graph.partner].tolist(),
+                    graph.node_y[graph.partner].tolist()))
+
+
+def costs(graph, cluster):
+  nodes, matrix = graph._costs_of(cluster)
+  tiles = list(zip(graph.node_x[nodes].tolist(), graph.node_y[nodes].tolist()))
+  return {(a, b): matrix[i, j] for i, a in enumerate(tiles) for j, b in enumerate(tiles)}
+
+
+def test_update_matches_rebuild():
+  rng = np.random.default_rng(1)
+  for _ in range(20):
+    ny, nx = rng.integers(10, 64, 2)
+    cluster_size = int(rng.integers(3, 33))
+    graph = ClusterGraph(rng.random((ny, nx)) > 0.3, cluster_size)
+    for cluster in list(graph.cluster_nodes)[:4]:
+      graph._costs_of(cluster)
+    for _ in range(3):
+      tiles = np.unique(rng.integers(0, nx * ny, rng.integers(1, 20)))
+      flat = graph.passable.reshape(-1)
+      flat[tiles] = ~flat[tiles]
+      graph.update(tiles)
+      fresh = ClusterGraph(graph.passable.copy(), cluster_size)
+      assert entrances(graph) == entrances(fresh)
+      assert all(costs(graph, cluster) == costs(fresh, cluster) for cluster in graph.cluster_nodes)
+
+
+def test_abstract_path_finds_what_astar_finds():
+  rng = np.random.default_rng(2)
+  for _ in range(30):
+    ny, nx = rng.integers(20, 70, 2)
+    passable = rng.random((ny, nx)) > 0.35
+    graph = ClusterGraph(passable, 8)
+    tiles = np.argwhere(passable)[:, ::-1]
+    for start, goal in tiles[rng.integers(0, len(tiles), (5, 2))]:
+      start, goal = tuple(start.tolist()), tuple(goal.tolist())
+      nodes = graph.abstract_path(start, goal)
+      assert (nodes is None) == (astar(passable, start, goal, max_expansions=10 ** 6) is None)
+      # Consecutive nodes are partners across a border or share a cluster
+      for a, b in zip(nodes or [], (nodes or [])[1:]):
+        assert graph.partner[a] == b or graph.node_cluster[a] == graph.node_cluster[b]
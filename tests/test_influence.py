@@ -0,0 +1,68 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+from types import SimpleNamespace
+
+import numpy as np
+
+from bots.influence import STRENGTH, THREAT, InfluenceMap
+
+
+def snapshot(units, size):
+  """A stand-in for WorldSnapshot with what InfluenceMap reads, units are uid: (x, y, attack, mine)."""
+  uids = list(units)
+  values = np.array([units[uid] for uid in uids], dtype=float).reshape(-1, 4)
+  return SimpleNamespace(uids=uids, position=values[:, :2], attack=values[:, 2], size=np.asarray(size, dtype=float),
+                         my_rows=lambda: np.flatnonzero(values[:, 3]))
+
+
+def brute_force(units, size, cell_size, radius):
+  """Both layers from the wrapped distance between the centers of every cell and every unit's cell."""
+  nx, ny = np.ceil(np.asarray(size, dtype=float) / cell_size).astype(int)
+  field = np.zeros((2, ny, nx))
+  y, x = np.mgrid[0:ny, 0:nx]
+  for ux, uy, attack, mine in units.values():
+    dx = np.abs(x - int(ux // cell_size) % nx)
+    dy = np.abs(y - int(uy // cell_size) % ny)
+    dx, dy = np.minimum(dx, nx - dx), np.minimum(dy, ny - dy)
+    field[STRENGTH if mine else THREAT] += attack * (np.hypot(dx, dy) * cell_size <= radius)
+  return field
+
+
+def test_incremental_field_matches_brute_force():
+  rng = np.random.default_rng(0)
+  size = (640, 480)
+  for refresh in (3, 256):
+    influence = InfluenceMap(cell_size=16.0, radius=100.0, refresh=refresh)
+    units = {}
+    count = 0
+    incremental = 0
+    for _ in range(40):
+      # Units move, change attack, appear and get destroyed
+      for uid in list(units):
+        x, y, attack, mine = units[uid]
+        roll = rng.random()
+        if roll < 0.03:
+          del units[uid]
+        elif roll < 0.15:
+          units[uid] = ((x + rng.normal(0, 20)) % size[0], (y + rng.normal(0, 20)) % size[1], attack, mine)
+        elif roll < 0.2:
+          units[uid] = (x, y, float(rng.integers(1, 10)), mine)
+      for _ in range(rng.integers(0, 2)):
+        units[str(count)] = (*rng.uniform(0, size), float(rng.integers(1, 10)), bool(rng.random() < 0.5))
+        count += 1
+      influence.update(snapshot(units, size))
+      incremental += influence._updates > 0
+      assert np.allclose(influence.field, brute_force(units, size, 16.0, 100.0), atol=1e-6)
+    assert incremental > 0
+
+
+def test_queries_read_the_cell_of_each_point():
+  size = (640, 480)
+  units = {"a": (5.0, 5.0, 3.0, False), "b": (630.0, 470.0, 2.0, True), "c": (320.0, 240.0, 7.0, False)}
+  influence = InfluenceMap(cell_size=16.0, radius=100.0)
+  influence.update(snapshot(units, size))
+  # Across the corner of the map from both a and b
+  points = np.array([[635.0, 5.0], [320.0, 240.0], [160.0, 400.0]])
+  assert np.allclose(influence.threat(points), [3.0, 7.0, 0.0])
+  assert np.allclose(influence.strength(points), [2.0, 0.0, 0.0])
+  assert influence.most_threatened(points) == 1
@@ -0,0 +1,66 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from bots.mapstate import MapState
+
+
+def test_changes_since_any_kept_version():
+  rng = np.random.default_rng(0)
+  game_map = rng.choice([-1, 0, 1], size=(40, 50))
+  map_state = MapState(history=8)
+  map_state.update(game_map)
+  maps = {map_state.version: game_map.copy()}
+  for _ in range(30):
+    game_map = game_map.copy()
+    if rng.random() < 0.8:
+      # Tiles may be set back to what they were, those must not show up
+      tiles = rng.integers(0, game_map.size, rng.integers(1, 20))
+      game_map.ravel()[tiles] = rng.choice([-1, 0, 1], len(tiles))
+    changed = map_state.update(game_map)
+    assert changed == (map_state.version not in maps)
+    maps[map_state.version] = game_map.copy()
+    assert np.array_equal(map_state.game_map, game_map)
+
+    for version, old in maps.items():
+      changes = map_state.changes_since(version)
+      if version < map_state.version - 8:
+        assert changes is None
+        continue
+      tiles, previous = changes
+      assert np.array_equal(tiles, np.flatnonzero(old != game_map))
+      assert np.array_equal(previous, old.ravel()[tiles])
+
+
+def test_dirty_rectangles_cover_the_changed_blocks():
+  rng = np.random.default_rng(1)
+  map_state = MapState(block_size=8)
+  game_map = np.zeros((50, 70), dtype=np.int64)
+  map_state.update(game_map)
+  assert map_state.dirty == [(0, 0, 70, 50)]
+  for _ in range(20):
+    game_map = game_map.copy()
+    tiles = rng.integers(0, game_map.size, rng.integers(1, 10))
+    game_map.ravel()[tiles] += 1
+    map_state.update(game_map)
+    covered = np.zeros(game_map.shape, dtype=int)
+    for x0, y0, x1, y1 in map_state.dirty:
+      assert x0 % 8 == 0 and y0 % 8 == 0 and y1 - y0 <= 8
+      covered[y0:y1, x0:x1] += 1
+    blocks = np.zeros(game_map.shape, dtype=bool)
+    for y, x in zip(*np.divmod(tiles, 70)):
+      blocks[y // 8 * 8:(y // 8 + 1) * 8, x // 8 * 8:(x // 8 + 1) * 8] = True
+    assert np.array_equal(covered, blocks)
+
+
+def test_unchanged_and_resized_maps():
+  map_state = MapState()
+  game_map = np.zeros((10, 12))
+  assert map_state.update(game_map)
+  version = map_state.version
+  assert not map_state.update(game_map.copy())
+  assert map_state.version == version
+  tiles, previous = map_state.changes_since(version)
+  assert len(tiles) == len(previous) == 0
+  assert map_state.update(np.zeros((11, 12)))
+  assert map_state.changes_since(version) is None
@@ -0,0 +1,120 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import heapq
+import math
+
+import numpy as np
+
+from bots.flowfield import passable_mask
+from bots.mapstate import MapState
+from bots.pathfinding import KINDS, PathPlanner, astar
+
+
+def dijkstra(passable, start, goal):
+  """Shortest path length under the rules of astar(), by plain Dijkstra."""
+  ny, nx = passable.shape
+  cost = {start: 0.0}
+  queue = [(0.0, start)]
+  while queue:
+    distance, (x, y) = heapq.heappop(queue)
+    if (x, y) == goal:
+      return distance
+    if distance > cost[x, y]:
+      continue
+    for dx in (-1, 0, 1):
+      for dy in (-1, 0, 1):
+        tile = ((x + dx) % nx, (y + dy) % ny)
+        if (dx, dy) == (0, 0) or not (passable[tile[1], tile[0]] or tile == goal):
+          continue
+        if dx and dy and not (passable[y, tile[0]] and passable[tile[1], x]):
+          continue
+        step = distance + math.hypot(dx, dy)
+        if step < cost.get(tile, math.inf):
+          cost[tile] = step
+          heapq.heappush(queue, (step, tile))
+  return None
+
+
+def check_path(passable, path, start, goal):
+  ny, nx = passable.shape
+  assert path[0] == start and path[-1] == goal
+  length = 0.0
+  for (x0, y0), (x1, y1) in zip(path, path[1:]):
+    dx = (x1 - x0 + 1) % nx - 1
+    dy = (y1 - y0 + 1) % ny - 1
+    assert abs(dx) <= 1 and abs(dy) <= 1 and (dx or dy)
+    if dx and dy:
+      assert passable[y0, x1] and passable[y1, x0]
+    length += math.hypot(dx, dy)
+  assert all(passable[y, x] for x, y in path[:-1])
+  return length
+
+
+def test_astar_paths_are_valid_and_shortest():
+  rng = np.random.default_rng(0)
+  for _ in range(60):
+    ny, nx = rng.integers(5, 25, 2)
+    passable = rng.random((ny, nx)) > 0.3
+    start = tuple(int(v) for v in rng.integers(0, (nx, ny)))
+    goal = tuple(int(v) for v in rng.integers(0, (nx, ny)))
+    passable[start[1], start[0]] = True
+    path = astar(passable, start, goal)
+    expected = dijkstra(passable, start, goal)
+    if expected is None:
+      assert path is None
+    else:
+      assert math.isclose(check_path(passable, path, start, goal), expected)
+
+
+def random_map(rng, shape):
+  game_map = np.where(rng.random(shape) > 0.5, 1, 0)
+  game_map[rng.random(shape) > 0.6] = -1
+  return game_map
+
+
+def entrances(graph):
+  """Every entrance node of a ClusterGraph as its tile and that of its partner."""
+  partner = graph.partner
+  return sorted(zip(graph.node_x.tolist(), graph.node_y.tolist(), graph.node_x[partner].tolist(),
+                    graph.node_y[partner].tolist()))
+
+
+def test_incremental_update_matches_rebuild():
+  rng = np.random.default_rng(1)
+  game_map = random_map(rng, (96, 128))
+  truth = np.where(rng.random(game_map.shape) > 0.5, 1, 0)
+  state, planner = MapState(), PathPlanner(cluster_size=16, long_range=24)
+  state.update(game_map)
+  planner.update(state)
+  for _ in range(10):
+    for _ in range(5):
+      start, goal = rng.uniform(0, 96, 2), rng.uniform(0, 96, 2)
+      planner.route(KINDS[rng.integers(2)], start, goal)
+    x, y = rng.integers(0, 112), rng.integers(0, 80)
+    game_map[y:y + 16, x:x + 16] = truth[y:y + 16, x:x + 16]
+    state.update(game_map)
+    planner.update(state)
+
+    fresh = PathPlanner(cluster_size=16)
+    fresh.update(state)
+    for kind in KINDS:
+      np.testing.assert_array_equal(planner.masks[kind], passable_mask(game_map, kind))
+      assert entrances(planner.graphs[kind]) == entrances(fresh.graphs[kind])
+    # What is left in the cache never crosses a tile that is now impassable
+    for (kind, *_), (tiles, waypoints, _) in planner._cache.items():
+      assert waypoints is not None and planner.masks[kind][tiles[1:-1, 1], tiles[1:-1, 0]].all()
+
+
+def test_failed_local_search_is_no_route(monkeypatch):
+  import bots.pathfinding
+
+  # The search out of the start cluster fails, as if the way out were cut
+  def cut_astar(passable, start, goal, wrap=True):
+    return astar(passable, start, goal) if wrap else None
+
+  monkeypatch.setattr(bots.pathfinding, "astar", cut_astar)
+  state, planner = MapState(), PathPlanner(cluster_size=16, long_range=24)
+  state.update(np.zeros((64, 128), dtype=np.int64))
+  planner.update(state)
+  assert planner.route("ships", np.array([4.0, 4.0]), np.array([100.0, 40.0])) is None
+  assert planner.route("ships", np.array([4.0, 4.0]), np.array([10.0, 10.0])) is not None
@@ -0,0 +1,90 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+from collections import deque
+
+import numpy as np
+
+from bots.mapstate import MapState
+from bots.regions import KIND_VALUES, Regions, find_roots, label
+
+
+def flood(mask):
+  """Component number of every tile of a mask, 4-connected on the wrapped map, -1 elsewhere."""
+  ny, nx = mask.shape
+  components = np.full(mask.shape, -1)
+  count = 0
+  for y, x in np.argwhere(mask):
+    if components[y, x] >= 0:
+      continue
+    components[y, x] = count
+    queue = deque([(y, x)])
+    while queue:
+      cy, cx = queue.popleft()
+      for dy, dx in ((0, 1), (0, -1), (1, 0), (-1, 0)):
+        ty, tx = (cy + dy) % ny, (cx + dx) % nx
+        if mask[ty, tx] and components[ty, tx] < 0:
+          components[ty, tx] = count
+          queue.append((ty, tx))
+    count += 1
+  return components
+
+
+def same_partition(roots, components, mask):
+  """Whether two labelings of the tiles of a mask group them the same way."""
+  tiles = np.flatnonzero(mask)
+  a, b = roots[tiles], components.ravel()[tiles]
+  pairs = np.unique(np.stack([a, b]), axis=1)
+  return len(np.unique(pairs[0])) == len(np.unique(pairs[1])) == pairs.shape[1]
+
+
+def border(game_map, value):
+  """Flat indices of the tiles of a value next to an unknown tile."""
+  unknown = game_map == -1
+  near = np.zeros_like(unknown)
+  for axis in (0, 1):
+    for shift in (1, -1):
+      near |= np.roll(unknown, shift, axis=axis)
+  return np.flatnonzero((game_map == value) & near)
+
+
+def test_label_matches_flood_fill():
+  rng = np.random.default_rng(0)
+  for _ in range(60):
+    shape = rng.integers(1, 30, 2)
+    mask = rng.random(shape) > rng.uniform(0.2, 0.7)
+    parent = label(mask)
+    assert np.array_equal(find_roots(parent, np.arange(mask.size)), parent)
+    assert same_partition(parent, flood(mask), mask)
+
+
+def test_incremental_reveals_match_full_relabel():
+  rng = np.random.default_rng(1)
+  for _ in range(10):
+    shape = rng.integers(8, 40, 2)
+    truth = (rng.random(shape) > 0.45).astype(np.int64)
+    seen = np.full(shape, -1)
+    map_state = MapState()
+    regions = Regions()
+    for _ in range(15):
+      # Reveal a few random windows of the map
+      for _ in range(3):
+        y, x = rng.integers(0, shape)
+        h, w = rng.integers(1, 8, 2)
+        ys, xs = np.arange(y, y + h) % shape[0], np.arange(x, x + w) % shape[1]
+        seen[np.ix_(ys, xs)] = truth[np.ix_(ys, xs)]
+      map_state.update(seen)
+      regions.update(map_state)
+
+      fresh = Regions()
+      full = MapState()
+      full.update(seen)
+      fresh.update(full)
+      for kind, value in KIND_VALUES.items():
+        mask = seen == value
+        roots = find_roots(regions.parents[kind], np.arange(mask.size))
+        assert same_partition(roots, flood(mask), mask)
+        assert np.array_equal(regions.border[kind], border(seen, value))
+        assert np.array_equal(regions.border[kind], fresh.border[kind])
+        open_tiles = np.isin(roots, regions.open[kind]) & mask.ravel()
+        fresh_roots = find_roots(fresh.parents[kind], np.arange(mask.size))
+        assert np.array_equal(open_tiles, np.isin(fresh_roots, fresh.open[kind]) & mask.ravel())
@@ -0,0 +1,91 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+from types import SimpleNamespace
+
+import numpy as np
+
+from bots.geometry import torus_distance
+from bots.registry import BaseRegistry
+from bots.snapshot import WorldSnapshot
+
+SHAPE = (200, 400)
+
+
+def snapshot(bases, tanks=()):
+  """A snapshot of bases, uid: (x, y, team), and of my tanks at (x, y) owned by my first base."""
+  info = {"me": {"bases": [], "tanks": []}, "enemy": {"bases": []}}
+  for uid, (x, y, team) in bases.items():
+    info[team]["bases"].append(SimpleNamespace(uid=uid, x=x, y=y, team=team))
+  owner = info["me"]["bases"][0] if info["me"]["bases"] else SimpleNamespace(uid=None)
+  for i, (x, y) in enumerate(tanks):
+    info["me"]["tanks"].append(SimpleNamespace(uid=f"tank{i}", x=x, y=y, team="me", owner=owner))
+  return WorldSnapshot(info, "me", SHAPE)
+
+
+def confidence(registry, uid):
+  return registry.confidence[registry.slots[uid]]
+
+
+def test_confidence_halves_out_of_view_and_resets_when_seen():
+  registry = BaseRegistry(half_life=30.0)
+  home = {"home": (10.0, 10.0, "me")}
+  registry.update(0.0, snapshot({**home, "far": (300.0, 150.0, "enemy")}))
+  assert confidence(registry, "far") == 1.0
+  registry.update(30.0, snapshot(home))
+  assert np.isclose(confidence(registry, "far"), 0.5)
+  registry.update(60.0, snapshot(home))
+  assert np.isclose(confidence(registry, "far"), 0.25)
+  assert len(registry.select(False, 0.3)) == 0
+  # Seen again, the base is there for sure
+  registry.update(70.0, snapshot({**home, "far": (300.0, 150.0, "enemy")}))
+  assert confidence(registry, "far") == 1.0
+  assert np.array_equal(registry.positions(False, 0.3), [[300.0, 150.0]])
+
+
+def test_missing_bases_in_vision_are_destroyed():
+  registry = BaseRegistry(half_life=30.0, vision=40.0)
+  home = {"home": (10.0, 10.0, "me")}
+  enemy = {"near": (200.0, 100.0, "enemy"), "far": (300.0, 150.0, "enemy")}
+  registry.update(0.0, snapshot({**home, "other": (390.0, 190.0, "me"), **enemy}))
+  # My base is gone, and so is the enemy base my tank is looking at
+  registry.update(1.0, snapshot({**home, "far": enemy["far"]}, tanks=[(170.0, 100.0)]))
+  assert registry.destroyed[registry.slots["other"]] and confidence(registry, "other") == 0.0
+  assert registry.destroyed[registry.slots["near"]] and confidence(registry, "near") == 0.0
+  assert not registry.destroyed[registry.slots["far"]]
+  # It stays destroyed when the tank leaves, and the far one only fades
+  registry.update(31.0, snapshot(home, tanks=[(100.0, 100.0)]))
+  assert confidence(registry, "near") == 0.0
+  assert np.isclose(confidence(registry, "far"), 0.5)
+  distance, position = registry.nearest([190.0, 100.0], False, 0.1)
+  assert np.array_equal(position, [300.0, 150.0])
+  # Just out of vision a missing base is not written off
+  registry.update(32.0, snapshot(home, tanks=[(300.0, 195.0), (255.0, 150.0)]))
+  assert not registry.destroyed[registry.slots["far"]]
+  # Unless it turns up again
+  registry.update(40.0, snapshot({**home, **enemy}))
+  assert not registry.destroyed[registry.slots["near"]] and confidence(registry, "near") == 1.0
+
+
+def test_nearest_matches_brute_force():
+  rng = np.random.default_rng(0)
+  size = np.array([SHAPE[1], SHAPE[0]], dtype=float)
+  for count in (0, 1, 5, 80):
+    registry = BaseRegistry(capacity=4, brute_force=32)
+    bases = {f"base{i}": (*rng.random(2) * size, "me" if i % 3 == 0 else "enemy") for i in range(count)}
+    bases["home"] = (0.0, 0.0, "me")
+    registry.update(0.0, snapshot(bases))
+    # Some enemy bases drop out of view and fade
+    registry.update(20.0, snapshot({uid: base for uid, base in bases.items() if rng.random() < 0.5}))
+    points = rng.random((50, 2)) * size
+    for mine in (True, False):
+      for min_confidence in (0.0, 0.8):
+        distances, positions = registry.nearest(points, mine, min_confidence)
+        expected = registry.positions(mine, min_confidence)
+        if len(expected) == 0:
+          assert np.all(np.isinf(distances)) and np.all(np.isnan(positions))
+          continue
+        brute = torus_distance(points[:, None, :], expected[None, :, :], size)
+        assert np.allclose(distances, brute.min(axis=1))
+        assert np.allclose(torus_distance(points, positions, size), distances)
+        single, position = registry.nearest(points[0], mine, min_confidence)
+        assert np.isclose(single, distances[0]) and np.allclose(position, positions[0])
@@ -0,0 +1,100 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from bots.replay import COMMANDS, ReplayReader, ReplayRecorder, delta_decode, delta_encode
+
+
+class Unit:
+  """A base or vehicle of the info dict, with the attributes the recorder reads."""
+
+  def __init__(self, uid, x, y, owner=None):
+    self.uid, self.x, self.y, self.owner = uid, x, y, owner
+    self.health, self.heading, self.speed, self.attack = 100.0, 0.0, 10.0, 5.0
+    self.stopped, self.number, self.mines, self.crystal = False, 1, 0, 50.0
+    self.built = 0
+
+  def cost(self, kind):
+    return {"mine": 50.0, "tank": 15.0, "ship": 60.0, "jet": 20.0}[kind]
+
+  def goto(self, x, y):
+    pass
+
+  def set_heading(self, heading):
+    self.heading = heading
+
+  def build_tank(self, heading=0):
+    self.built += 1
+    return f"{self.uid}-tank-{self.built}"
+
+
+def test_delta_coding_round_trip():
+  rng = np.random.default_rng(0)
+  uids = rng.integers(0, 20, 500)
+  ticks = rng.permutation(500) // 4
+  for scale in (10, 1000, 10 ** 6):
+    values = rng.integers(-scale, scale, (500, 2))
+    encoded, first = delta_encode(values, uids, ticks)
+    assert encoded.dtype.itemsize <= 4
+    assert np.array_equal(delta_decode(encoded, first, uids, ticks), values)
+
+
+def record(path, ticks):
+  """A match of my base building tanks and an enemy tank driving about, with the map revealed on the way."""
+  rng = np.random.default_rng(1)
+  recorder = ReplayRecorder(str(path), "me", chunk_ticks=4, seed=7)
+  base = Unit("b0", 10.5, 20.25)
+  enemy = Unit("e0", 30.0, 5.0)
+  game_map = np.full((12, 16), -1)
+  expected = []
+  tanks = []
+  for tick in range(ticks):
+    if tick == 9:
+      game_map = np.full((14, 16), -1)
+    game_map.ravel()[rng.integers(0, game_map.size, 3)] = rng.integers(0, 2, 3)
+    enemy.x = (enemy.x + 1.5) % 16
+    enemy.health -= 1
+    info = {"me": {"bases": [base], "tanks": list(tanks)}, "them": {"tanks": [enemy]}}
+    seen = recorder.begin_tick(0.1 * tick, 0.1, info, game_map)
+    seen_base = seen["me"]["bases"][0]
+    if tick % 3 == 0:
+      uid = seen_base.build_tank(heading=90.0)
+      tanks.append(Unit(uid, base.x, base.y, owner=base))
+    for tank in seen["me"].get("tanks", []):
+      tank.goto(tick, 2.0)
+    recorder.end_tick()
+    expected.append((game_map.copy(), [(obj.uid, obj.x, obj.y, obj.health) for group in info.values()
+                                       for objects in group.values() for obj in objects], len(tanks)))
+  recorder.close()
+  return expected
+
+
+def test_recorder_reader_round_trip(tmp_path):
+  path = tmp_path / "match.replay"
+  expected = record(path, 14)
+  reader = ReplayReader(str(path))
+  assert (reader.team, reader.seed, len(reader)) == ("me", 7, 14)
+  assert reader.costs["tank"] == 15.0
+
+  for index, tick in enumerate(reader):
+    game_map, objects, tank_count = expected[index]
+    assert np.isclose(tick.t, 0.1 * index) and tick.dt == 0.1
+    assert np.array_equal(tick.game_map, game_map)
+    assert np.array_equal(reader[index].game_map, game_map)
+
+    info = tick.info()
+    seen = [(obj.uid, obj.x, obj.y, obj.health) for group in info.values() for objects in group.values()
+            for obj in objects]
+    assert sorted(seen) == sorted(objects)
+    assert all(tank.owner.uid == "b0" for tank in info["me"].get("tanks", []))
+
+    # Builds return what they returned in the match, the commands are as given
+    codes = tick.commands[:, 1].astype(int).tolist()
+    assert codes.count(COMMANDS.index("build_tank")) == (index % 3 == 0)
+    assert codes.count(COMMANDS.index("goto")) == tank_count - (index % 3 == 0)
+    gotos = tick.commands[tick.commands[:, 1] == COMMANDS.index("goto")]
+    assert np.array_equal(gotos[:, 2:4], np.tile([index, 2.0], (len(gotos), 1)))
+    if index % 3 == 0:
+      base = info["me"]["bases"][0]
+      assert base.build_tank(heading=90.0) == f"b0-tank-{index // 3 + 1}"
+      assert base.build_tank(heading=90.0) is None
@@ -0,0 +1,88 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+from bots.scheduler import BUILD, IDLE, THREATENED, TickScheduler
+
+
+class FakeClock:
+  """Clock that only moves when a task says it took time."""
+
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self) -> float:
+    return self.now
+
+
+def queue(scheduler, clock, ran, tasks, cost):
+  """Queue (priority, key) tasks that record their key and take cost seconds."""
+  def task(key):
+    ran.append(key)
+    clock.now += cost
+  for priority, key in tasks:
+    scheduler.add(priority, key, task, key)
+
+
+def test_tasks_run_in_priority_order():
+  clock = FakeClock()
+  scheduler = TickScheduler(budget=1.0, clock=clock)
+  ran = []
+  queue(scheduler, clock, ran, [(IDLE, "idle"), (THREATENED, "threatened"), (BUILD, "build"), (IDLE, "idle2")],
+        0.01)
+  assert scheduler.run() == 0
+  assert ran == ["build", "threatened", "idle", "idle2"]
+  assert scheduler.done == 4 and len(scheduler) == 0
+
+
+def test_budget_defers_vehicles_but_not_builds():
+  clock = FakeClock()
+  scheduler = TickScheduler(budget=0.1, clock=clock)
+  ran = []
+  builds = [(BUILD, f"base{i}") for i in range(3)]
+  vehicles = [(IDLE, f"jet{i}") for i in range(10)]
+  queue(scheduler, clock, ran, vehicles + builds, 0.03)
+  deferred = scheduler.run()
+  # The builds run even though they use most of the budget, the one vehicle
+  # that fits runs and the rest wait
+  assert ran == ["base0", "base1", "base2", "jet0"]
+  assert deferred == 9 and scheduler.done == 4
+  assert scheduler.totals["overruns"] == 1
+
+
+def test_budget_starts_at_start():
+  clock = FakeClock()
+  scheduler = TickScheduler(budget=0.1, clock=clock)
+  scheduler.start()
+  # The perception before the tasks used up the whole budget
+  clock.now += 0.1
+  ran = []
+  queue(scheduler, clock, ran, [(BUILD, "base"), (THREATENED, "tank")], 0.01)
+  assert scheduler.run() == 1
+  assert ran == ["base"]
+  assert scheduler.elapsed > scheduler.budget
+
+
+def test_deferred_units_run_first_on_the_next_tick():
+  clock = FakeClock()
+  scheduler = TickScheduler(budget=0.05, clock=clock)
+  units = [f"tank{i}" for i in range(10)]
+  served = set()
+  for tick in range(4):
+    ran = []
+    scheduler.start()
+    queue(scheduler, clock, ran, [(IDLE, uid) for uid in units], 0.01)
+    deferred = scheduler.run()
+    assert deferred == len(units) - len(ran) and ran
+    # Units never served, or served longest ago, come before the rest
+    assert not served & set(ran) or served >= set(units)
+    served |= set(ran)
+    clock.now += 1.0
+  assert served == set(units)
+
+
+def test_forgets_units_that_are_gone():
+  clock = FakeClock()
+  scheduler = TickScheduler(budget=1.0, clock=clock)
+  for tick in range(200):
+    queue(scheduler, clock, [], [(IDLE, f"jet{tick}")], 0.0)
+    scheduler.run()
+  assert len(scheduler._served) <= 2 + 64 + 1
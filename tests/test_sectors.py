@@ -0,0 +1,45 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+from types import SimpleNamespace
+
+import numpy as np
+
+from bots.mapstate import MapState
+from bots.registry import BaseRegistry
+from bots.sectors import SectorIndex
+from bots.snapshot import WorldSnapshot
+
+
+def snapshot(bases, shape):
+  """A snapshot of my bases, uid: (x, y)."""
+  info = {"me": {"bases": [SimpleNamespace(uid=uid, x=x, y=y, team="me") for uid, (x, y) in bases.items()]}}
+  return WorldSnapshot(info, "me", shape)
+
+
+def test_destroyed_bases_are_dropped():
+  rng = np.random.default_rng(0)
+  shape = (120, 200)
+  map_state = MapState()
+  map_state.update(np.where(rng.random(shape) > 0.7, 1, 0))
+  registry, sectors = BaseRegistry(), SectorIndex(base_radius=80.0)
+  bases = {}
+  for t in range(20):
+    # Bases come and go
+    for uid in list(bases):
+      if rng.random() < 0.15:
+        del bases[uid]
+    for _ in range(rng.integers(0, 4)):
+      bases[f"base{t}-{len(bases)}"] = tuple(rng.uniform(0, (200, 120)))
+    registry.update(float(t), snapshot(bases, shape))
+    sectors.update(registry, map_state)
+
+    fresh_registry, fresh = BaseRegistry(), SectorIndex(base_radius=80.0)
+    fresh_registry.update(0.0, snapshot(bases, shape))
+    fresh.update(fresh_registry, map_state)
+    assert sorted(sectors.rows) == sorted(fresh.rows) == sorted(bases)
+    rows = [sectors.rows[uid] for uid in fresh.rows]
+    assert np.array_equal(sectors.position[rows], fresh.position)
+    assert np.array_equal(sectors.bases[rows], fresh.bases)
+    assert np.array_equal(sectors.coast[rows], fresh.coast)
+    for uid in bases:
+      assert sectors.heading(uid, 10.0) == fresh.heading(uid, 10.0)
@@ -0,0 +1,139 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from bots.flowfield import bfs_distance, passable_mask
+from bots.geometry import torus_distance
+from bots.mapstate import MapState
+from bots.sites import ConversionSites, land_counts
+
+
+def brute_free(game_map, bases, enemy_bases, spacing, sites):
+  """Free sites from the distance of every site to every base."""
+  ny, nx = game_map.shape
+  size = np.array([nx, ny], dtype=float)
+  y, x = np.nonzero(sites)
+  centers = np.stack([x + 0.5, y + 0.5], axis=1)
+  free = np.ones(len(centers), dtype=bool)
+  for positions, minimum in ((bases, spacing), (enemy_bases, 60.0)):
+    if len(positions):
+      free &= torus_distance(centers[:, None], np.asarray(positions)[None], size).min(axis=1) >= minimum
+  result = np.zeros(game_map.shape, dtype=bool)
+  result[y[free], x[free]] = True
+  return result
+
+
+def test_incremental_sites_match_full_recompute():
+  rng = np.random.default_rng(0)
+  for _ in range(4):
+    ny, nx = rng.integers(30, 90, 2)
+    truth = (rng.random((ny, nx)) > 0.7).astype(np.int64)
+    seen = np.full((ny, nx), -1)
+    map_state = MapState()
+    sites = ConversionSites(refresh=3)
+    bases, enemy_bases = [], []
+    for tick in range(30):
+      for _ in range(2):
+        y, x = rng.integers(0, (ny, nx))
+        ys, xs = np.arange(y, y + 12) % ny, np.arange(x, x + 12) % nx
+        seen[np.ix_(ys, xs)] = truth[np.ix_(ys, xs)]
+      # Bases come and go, as they do when their confidence decays
+      if rng.random() < 0.3:
+        bases.append(tuple(rng.uniform(0, (nx, ny))))
+      if rng.random() < 0.2 and bases:
+        bases.pop(int(rng.integers(len(bases))))
+      if rng.random() < 0.2:
+        enemy_bases = [tuple(rng.uniform(0, (nx, ny)))]
+      map_state.update(seen)
+      spacing = 20.0 if tick < 20 else 15.0
+      sites.update(map_state, bases, enemy_bases, spacing)
+
+      expected = (seen == 0) & (land_counts(seen, 3) >= 3)
+      assert np.array_equal(sites.land, land_counts(seen, 3))
+      assert np.array_equal(sites.sites, expected)
+      assert np.array_equal(sites.free, brute_free(seen, bases, enemy_bases, spacing, expected))
+      # Taken sites leave the flow field right away
+      assert set(np.flatnonzero(sites.free).tolist()) == sites.flow.sources
+
+
+def test_refresh_follows_the_map_and_free_sites():
+  rng = np.random.default_rng(1)
+  game_map = (rng.random((40, 50)) > 0.7).astype(np.int64)
+  map_state = MapState()
+  map_state.update(game_map)
+  sites = ConversionSites(refresh=1)
+  sites.update(map_state, [(10.0, 10.0)], [], 20.0)
+  sites.update(map_state, [(30.0, 20.0)], [], 20.0)
+  sites.update(map_state, [(30.0, 20.0)], [], 20.0)
+  free = np.flatnonzero(sites.free)
+  assert sites.flow.sources == set(free.tolist())
+  assert np.array_equal(sites.flow.distance, bfs_distance(passable_mask(game_map, "ships"), free))
+
+
+def water_map(shape, rng):
+  """Open water with islands of land, all known."""
+  game_map = np.zeros(shape, dtype=np.int64)
+  for y, x in rng.integers(0, shape, (12, 2)):
+    game_map[np.ix_(np.arange(y, y + 3) % shape[0], np.arange(x, x + 3) % shape[1])] = 1
+  return game_map
+
+
+def sail(sites, uid, position, steps=200):
+  """Follow the headings of a ship tile by tile until it arrives, return where it ended."""
+  position = np.array(position, dtype=float)
+  for _ in range(steps):
+    heading = sites.heading(*position, uid)
+    if heading is None:
+      break
+    position = np.floor(position) + 0.5 + np.round([np.cos(np.radians(heading)), np.sin(np.radians(heading))])
+  return position
+
+
+def test_ships_claim_separate_sites_and_release_them():
+  rng = np.random.default_rng(2)
+  game_map = water_map((80, 100), rng)
+  map_state = MapState()
+  map_state.update(game_map)
+  sites = ConversionSites(reach=24)
+  base = (50.0, 40.0)
+  sites.update(map_state, [base], [], 12.0)
+
+  ends = {}
+  for uid in ("a", "b", "c"):
+    ends[uid] = sail(sites, uid, (52.5, 42.5))
+    assert uid in sites.claims
+    assert np.allclose(ends[uid], sites.claims[uid].site)
+    # The ship may settle on its own site, no other ship may
+    assert sites.is_free(*ends[uid], uid)
+    assert not sites.is_free(*ends[uid], "other")
+  size = np.array([100.0, 80.0])
+  claimed = np.array([sites.claims[uid].site for uid in "abc"])
+  assert (torus_distance(claimed[:, None], claimed[None], size) + 99 * np.eye(3) >= 12.0).all()
+  assert (torus_distance(claimed, np.array(base), size) >= 12.0).all()
+  assert set(np.flatnonzero(sites.free).tolist()) == sites.flow.sources
+
+  # A ship settles: its base shows up and its claim goes at the same update
+  sites.forget(["a"])
+  sites.update(map_state, [base, tuple(ends["a"])], [], 12.0)
+  assert "a" not in sites.claims
+  assert not sites.is_free(*ends["a"])
+  sites.forget(["b"])
+  sites.update(map_state, [base, tuple(ends["a"])], [], 12.0)
+  expected = brute_free(game_map, [base, tuple(ends["a"]), tuple(sites.claims["c"].site)], [], 12.0,
+                        sites.sites)
+  assert np.array_equal(sites.free, expected)
+  assert set(np.flatnonzero(sites.free).tolist()) == sites.flow.sources
+
+
+def test_score_is_the_wrapped_distance_in_spacings():
+  rng = np.random.default_rng(3)
+  game_map = water_map((60, 70), rng)
+  map_state = MapState()
+  map_state.update(game_map)
+  sites = ConversionSites()
+  sites.update(map_state, [(1.0, 1.0)], [(40.0, 30.0)], 10.0)
+  points = rng.uniform(0, (70, 60), (50, 2))
+  size = np.array([70.0, 60.0])
+  expected = np.minimum(torus_distance(points, np.array([1.0, 1.0]), size) / 10.0,
+                        torus_distance(points, np.array([40.0, 30.0]), size) / 60.0)
+  assert np.allclose(sites.score(points), expected)
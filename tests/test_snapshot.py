@@ -0,0 +1,71 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+from types import SimpleNamespace
+
+import numpy as np
+
+from bots.snapshot import KINDS, WorldSnapshot
+
+
+def random_info(rng, teams):
+  """Info dict of random bases and vehicles, some vehicles owned by a base that is out of view."""
+  info = {}
+  count = 0
+  for team in teams:
+    info[team] = {}
+    bases = []
+    for kind in KINDS:
+      if rng.random() < 0.2:
+        continue
+      group = []
+      for _ in range(rng.integers(0, 6)):
+        x, y = rng.uniform(0, 100, 2)
+        obj = SimpleNamespace(uid=f"{team}-{kind}-{count}", x=x, y=y, team=team, health=rng.integers(1, 100),
+                              attack=rng.integers(1, 20), speed=rng.integers(1, 10), heading=rng.uniform(0, 360))
+        count += 1
+        if kind == "bases":
+          bases.append(obj)
+        else:
+          obj.owner = bases[rng.integers(len(bases))] if bases and rng.random() < 0.8 else \
+              SimpleNamespace(uid="gone")
+        group.append(obj)
+      info[team][kind] = group
+  return info
+
+
+def test_rows_match_info():
+  rng = np.random.default_rng(0)
+  for _ in range(30):
+    teams = [f"team{i}" for i in range(rng.integers(1, 4))]
+    info = random_info(rng, teams)
+    me = teams[rng.integers(len(teams))]
+    world = WorldSnapshot(info, me, (50, 100))
+    assert np.array_equal(world.size, [100, 50])
+
+    for kind in KINDS:
+      expected = {team: info[team].get(kind, []) for team in teams}
+      for team in teams:
+        assert world.objects_in(world.rows_of(kind, team)) == expected[team]
+      assert world.objects_in(world.mine(kind)) == expected[me]
+      enemy = [obj for team in teams if team != me for obj in expected[team]]
+      assert world.objects_in(world.enemy(kind)) == enemy
+      assert world.objects_in(np.arange(len(world.uids))[world.enemy(kind)]) == enemy
+      assert np.all(world.kind[world.rows_of(kind)] == KINDS.index(kind))
+
+    for row, obj in enumerate(world.objects):
+      assert world.uids[row] == obj.uid and world.rows[obj.uid] == row
+      assert np.array_equal(world.position[row], [obj.x, obj.y])
+      assert (world.health[row], world.attack[row], world.speed[row], world.heading[row]) == \
+          (obj.health, obj.attack, obj.speed, obj.heading)
+      assert world.teams[world.team_index[row]] == obj.team
+      if hasattr(obj, "owner"):
+        assert world.owner[row] == world.rows.get(obj.owner.uid, -1)
+      else:
+        assert world.owner[row] == -1
+
+    mine = [obj for kind in KINDS for obj in info[me].get(kind, [])]
+    assert world.objects_in(world.my_rows()) == mine
+    for kind in KINDS[1:]:
+      grouped = world.group_by_owner(kind)
+      for base in info[me].get("bases", []):
+        assert grouped[base.uid] == [obj for obj in info[me].get(kind, []) if obj.owner is base]
@@ -0,0 +1,49 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from bots.geometry import torus_distance
+from bots.spatial import SpatialHash
+
+
+def layouts(seed, count=200):
+  """Random maps, points (some bunched in a corner) and queries."""
+  rng = np.random.default_rng(seed)
+  for trial in range(count):
+    size = rng.integers(20, 300, 2).astype(float)
+    points = rng.uniform(0, 1, (rng.integers(0, 200), 2)) * size
+    if trial % 3 == 0:
+      points = points * 0.1
+    queries = rng.uniform(0, 1, (rng.integers(1, 40), 2)) * size
+    yield size, points, queries, float(rng.integers(3, 60)), int(rng.integers(1, 20))
+
+
+def test_k_nearest_matches_brute_force():
+  for size, points, queries, cell_size, k in layouts(0):
+    distances, indices = SpatialHash(points, size, cell_size).k_nearest(queries, k)
+    found = min(k, len(points))
+    assert np.all(indices[:, found:] == -1) and np.all(np.isinf(distances[:, found:]))
+    if found:
+      expected = np.sort(torus_distance(queries[:, None], points[None], size), axis=1)[:, :found]
+      np.testing.assert_allclose(distances[:, :found], expected)
+      np.testing.assert_allclose(torus_distance(queries[:, None], points[indices[:, :found]], size),
+                                 distances[:, :found])
+
+
+def test_nearest_of_single_point():
+  for size, points, queries, cell_size, _ in layouts(1, 50):
+    distance, index = SpatialHash(points, size, cell_size).nearest(queries[0])
+    if len(points):
+      assert np.isclose(distance, torus_distance(queries[0], points, size).min())
+      assert np.isclose(torus_distance(queries[0], points[index], size), distance)
+    else:
+      assert index == -1 and np.isinf(distance)
+
+
+def test_within_matches_brute_force():
+  for size, points, queries, cell_size, k in layouts(2, 100):
+    radius = 3.0 * k
+    found = SpatialHash(points, size, cell_size).within(queries, radius)
+    for query, indices in zip(queries, found):
+      expected = np.flatnonzero(torus_distance(query, points, size) <= radius)
+      np.testing.assert_array_equal(np.sort(indices), expected)
@@ -0,0 +1,59 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from bots.mapstate import MapState
+from bots.terrain import LandHeadingField, away_from_land_headings, window_headings
+
+
+def angle_difference(a, b):
+  difference = np.abs(a - b) % 360
+  return np.minimum(difference, 360 - difference)
+
+
+def brute_force(game_map, offset):
+  """Headings away from land from the pushes of every land tile summed one tile at a time."""
+  ny, nx = game_map.shape
+  headings = np.zeros(game_map.shape)
+  for y in range(ny):
+    for x in range(nx):
+      vx = vy = 0.0
+      for dy in range(-offset, offset + 1):
+        for dx in range(-offset, offset + 1):
+          if (dx or dy) and game_map[(y + dy) % ny, (x + dx) % nx] == 1:
+            vx -= dx / np.hypot(dx, dy)
+            vy -= dy / np.hypot(dx, dy)
+      vx, vy = (0.0 if abs(vx) < 1e-9 else vx), (0.0 if abs(vy) < 1e-9 else vy)
+      headings[y, x] = np.degrees(np.arctan2(vy, vx)) % 360
+  return headings
+
+
+def test_headings_match_brute_force():
+  rng = np.random.default_rng(0)
+  for shape, offset in (((17, 23), 3), ((12, 9), 5), ((30, 30), 5)):
+    game_map = rng.choice([-1, 0, 1], size=shape, p=[0.2, 0.5, 0.3])
+    expected = brute_force(game_map, offset)
+    assert angle_difference(away_from_land_headings(game_map, offset), expected).max() < 1e-6
+    y0, x0 = rng.integers(-5, 5, 2)
+    window = window_headings(game_map, x0, y0, x0 + 15, y0 + 11, offset)
+    rows, cols = np.arange(y0, y0 + 11) % shape[0], np.arange(x0, x0 + 15) % shape[1]
+    assert angle_difference(window, expected[np.ix_(rows, cols)]).max() < 1e-6
+
+
+def test_incremental_field_matches_full_recompute():
+  rng = np.random.default_rng(1)
+  truth = rng.choice([0, 1], size=(90, 130), p=[0.6, 0.4])
+  seen = np.full(truth.shape, -1)
+  map_state = MapState(block_size=16)
+  field = LandHeadingField()
+  for tick in range(40):
+    # Small reveals go through the windows, the tick after a skipped one is recomputed in full
+    y, x = rng.integers(0, truth.shape)
+    rows, cols = np.arange(y, y + 6) % truth.shape[0], np.arange(x, x + 6) % truth.shape[1]
+    seen[np.ix_(rows, cols)] = truth[np.ix_(rows, cols)]
+    map_state.update(seen)
+    if tick % 10 == 9:
+      continue
+    field.update(map_state)
+    assert not field.update(map_state)
+    assert angle_difference(field.headings, away_from_land_headings(seen)).max() < 1e-6
@@ -0,0 +1,77 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import concurrent.futures
+import json
+
+import numpy as np
+
+import bots.tournament
+from bots.params import PARAMS_ENV
+from bots.tournament import ResultCache, bradley_terry, ratings, run
+
+BOTS = ["bot_a", "bot_b", "bot_c"]
+
+
+def test_cache_replays_only_the_matches_of_a_changed_bot(tmp_path, monkeypatch):
+  sources = {"bot_a": "from .common import x\n", "bot_b": "", "bot_c": "", "common": "x = 1\n", "engine": ""}
+  for name, source in sources.items():
+    (tmp_path / f"{name}.py").write_text(source)
+  monkeypatch.setattr(bots.tournament, "_HERE", str(tmp_path))
+  monkeypatch.setenv(PARAMS_ENV, str(tmp_path / "params.json"))
+  # Matches are played here, by a stand-in that records them
+  played = []
+  def play(a, b, seed, map_size, ticks):
+    played.append((a, b, seed))
+    return {"score": float(a < b), "ticks": ticks, "errors": {}}
+  monkeypatch.setattr(bots.tournament, "play", play)
+  monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", concurrent.futures.ThreadPoolExecutor)
+
+  path = str(tmp_path / "cache" / "results.json")
+  def replayed():
+    played.clear()
+    matches = run(BOTS, seeds=2, map_size=64, ticks=10, workers=1, cache=ResultCache(path))
+    assert sorted(matches) == sorted((a, b, float(a < b)) for a, b, _ in matches) and len(matches) == 6
+    return sorted({bot for match in played for bot in match[:2]}), len(played)
+
+  assert replayed() == (BOTS, 6)
+  assert replayed() == ([], 0)
+  (tmp_path / "bot_c.py").write_text("y = 2\n")
+  assert replayed() == (BOTS, 4) and all("bot_c" in match for match in played)
+  # A change to a module only bot_a imports replays bot_a's matches
+  (tmp_path / "common.py").write_text("x = 2\n")
+  assert replayed() == (BOTS, 4) and all("bot_a" in match for match in played)
+  # So do new parameters for bot_b
+  (tmp_path / "params.json").write_text(json.dumps({"bot_b": {"min_tanks": 3}}))
+  assert replayed() == (BOTS, 4) and all("bot_b" in match for match in played)
+  # And a change to the engine replays everything
+  (tmp_path / "engine.py").write_text("z = 3\n")
+  assert replayed() == (BOTS, 6)
+
+
+def test_bradley_terry_recovers_ratings():
+  rng = np.random.default_rng(0)
+  truth = np.array([1300.0, 1450.0, 1550.0, 1700.0])
+  names = [f"bot{i}" for i in range(len(truth))]
+  matches = []
+  for i, j in [(i, j) for i in range(len(truth)) for j in range(i + 1, len(truth))]:
+    expected = 1 / (1 + 10 ** ((truth[j] - truth[i]) / 400))
+    matches += [(names[i], names[j], float(score)) for score in rng.random(2000) < expected]
+  fitted = bradley_terry(names, matches)
+  assert np.isclose(np.mean(fitted), 1500)
+  assert np.all(np.abs(fitted - truth) < 25)
+
+  table = ratings(names, matches[::20], samples=50)
+  for name, estimate in zip(names, truth):
+    rating, low, high = table[name]
+    assert low <= rating <= high and low - 50 <= estimate <= high + 50
+
+
+def test_bradley_terry_even_results():
+  names = ["a", "b", "c"]
+  assert np.allclose(bradley_terry(names, []), 1500)
+  # Every bot beats one and loses to the other
+  matches = [("a", "b", 1.0), ("b", "c", 1.0), ("c", "a", 1.0)] * 5
+  assert np.allclose(bradley_terry(names, matches), 1500)
+  # A bot that won every match gets a finite, top rating
+  rating = bradley_terry(names, [("a", "b", 1.0), ("a", "c", 1.0)] * 10)
+  assert np.all(np.isfinite(rating)) and rating[0] == rating.max()
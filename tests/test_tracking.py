@@ -0,0 +1,76 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from bots.geometry import torus_delta
+from bots.tracking import MotionTracker, intercept
+
+SIZE = np.array([300.0, 200.0])
+
+
+def earliest_root(d, v, s):
+  """Smallest t > 0 with |d + v t| = s t from the polynomial roots, inf if there is none."""
+  coefficients = [v @ v - s * s, 2 * d @ v, d @ d]
+  while coefficients and abs(coefficients[0]) < 1e-12:
+    coefficients = coefficients[1:]
+  roots = np.roots(coefficients) if len(coefficients) > 1 else np.array([])
+  roots = roots[(np.abs(roots.imag) < 1e-9) & (roots.real > 1e-12)].real
+  return roots.min() if len(roots) else np.inf
+
+
+def test_intercept_matches_polynomial_roots():
+  rng = np.random.default_rng(0)
+  n = 400
+  positions = rng.uniform(0, SIZE, (n, 2))
+  targets = rng.uniform(0, SIZE, (n, 2))
+  velocities = rng.normal(0, 15, (n, 2))
+  speeds = rng.uniform(5, 30, n)
+  # Equal speeds have a single root, or none when the target runs away
+  speeds[:40] = np.hypot(velocities[:40, 0], velocities[:40, 1])
+  points, times = intercept(positions, speeds, targets, velocities, SIZE)
+
+  delta = torus_delta(positions, targets, SIZE)
+  expected = np.array([earliest_root(d, v, s) for d, v, s in zip(delta, velocities, speeds)])
+  finite = np.isfinite(expected)
+  assert np.array_equal(np.isfinite(times), finite)
+  assert np.allclose(times[finite], expected[finite], rtol=1e-6)
+  # The pursuer covers the way to the meeting point in that time, which is
+  # where the target got to on the map
+  reach = delta[finite] + velocities[finite] * times[finite, None]
+  assert np.allclose(np.hypot(reach[:, 0], reach[:, 1]), speeds[finite] * times[finite], rtol=1e-6)
+  assert np.allclose(torus_delta(positions[finite] + reach, points[finite], SIZE), 0, atol=1e-6)
+  assert np.allclose(points[~finite], targets[~finite])
+
+
+def test_intercept_lead_is_cut_at_horizon():
+  points, times = intercept([[0.0, 0.0]], [1.0], [[50.0, 0.0]], [[0.5, 0.0]], SIZE, horizon=10.0)
+  assert np.isclose(times[0], 100.0)
+  assert np.allclose(points, [[55.0, 0.0]])
+
+
+def test_velocity_across_the_map_edge():
+  tracker = MotionTracker(history=6, capacity=2)
+  rng = np.random.default_rng(1)
+  starts = rng.uniform(0, SIZE, (5, 2))
+  velocities = rng.normal(0, 40, (5, 2))
+  uids = ["a", "b", "c", "d", "e"]
+  for tick in range(10):
+    t = 0.1 * tick
+    # "e" is missed every other tick, the fit uses the ticks it was seen
+    seen = [i for i in range(5) if i < 4 or tick % 2 == 0]
+    tracker.update(t, [uids[i] for i in seen], (starts[seen] + velocities[seen] * t) % SIZE, SIZE)
+  assert np.allclose(tracker.velocity(uids), velocities)
+  assert np.allclose(tracker.velocity(["unknown"]), 0)
+
+
+def test_stale_units_are_dropped_and_slots_reused():
+  tracker = MotionTracker(history=4, capacity=2)
+  tracker.update(0.0, ["a", "b"], [[1.0, 1.0], [2.0, 2.0]], SIZE)
+  for tick in range(1, 5):
+    tracker.update(0.1 * tick, ["b"], [[2.0 + tick, 2.0]], SIZE)
+  assert "a" not in tracker and "b" in tracker
+  tracker.update(0.5, ["b", "c"], [[7.0, 2.0], [9.0, 9.0]], SIZE)
+  assert len(tracker) == 2 and len(tracker.position) == 2
+  # A single position of the new unit in a reused slot stands still
+  assert np.allclose(tracker.velocity(["c"]), 0)
+  assert np.allclose(tracker.velocity(["b"]), [[10.0, 0.0]])
@@ -0,0 +1,57 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from bots.units import UnitStore
+
+
+def test_slots_of_gone_units_are_reused():
+  store = UnitStore({"ntanks": 0}, capacity=4)
+  uids = [f"tank{i}" for i in range(4)]
+  store.update(uids, np.zeros((4, 2)))
+  store.set("tank1", "ntanks", 3)
+  slot = store.slots["tank1"]
+  assert store.update(["tank0", "tank2", "tank3", "tank4"], np.zeros((4, 2))) == ["tank1"]
+  # The new unit takes the freed slot, with its fields back at their defaults
+  assert store.slots["tank4"] == slot and len(store.position) == 4
+  assert "tank1" not in store and store.get("tank1", "ntanks") == 0
+  assert store.get("tank4", "ntanks") == 0 and not store.is_tracked("tank4")
+  # Running out of slots grows the arrays, keeping what is in them
+  store.set("tank0", "ntanks", 5)
+  store.update(uids[:1] + [f"jet{i}" for i in range(6)], np.ones((7, 2)))
+  assert len(store) == 7 and len(store.position) == 8
+  assert store.get("tank0", "ntanks") == 5 and store.is_tracked("tank0")
+  assert len(set(store.slots.values())) == 7
+
+
+def test_stationary_with_float32_positions():
+  rng = np.random.default_rng(0)
+  store = UnitStore()
+  uids = [f"ship{i}" for i in range(50)]
+  positions = rng.uniform(0, 1000, (50, 2))
+  store.update(uids, positions)
+  assert not any(store.is_tracked(uid) or store.is_stationary(uid) for uid in uids)
+  # The same float64 positions again, which are stored as float32
+  store.update(uids, positions.copy())
+  assert all(store.is_tracked(uid) and store.is_stationary(uid) for uid in uids)
+  moved = rng.random(50) < 0.5
+  positions[moved, rng.integers(0, 2)] += 0.01
+  store.update(uids, positions)
+  assert [store.is_stationary(uid) for uid in uids] == (~moved).tolist()
+  assert not store.is_stationary("unknown") and not store.is_tracked("unknown")
+
+
+def test_fields_per_uid():
+  store = UnitStore({"ntanks": 0, "heading": 90.0})
+  store.update(["base0", "base1"], [[1.0, 2.0], [3.0, 4.0]])
+  store.add("base0", "ntanks")
+  store.add("base0", "ntanks", 2)
+  store.set("base1", "heading", 45.0)
+  assert store.get("base0", "ntanks") == 3 and store.get("base1", "ntanks") == 0
+  assert store.get("base0", "heading") == 90.0 and store.get("base1", "heading") == 45.0
+  # A base set up before it first shows up keeps its fields when it does
+  store.set("base2", "ntanks", 1)
+  assert store.get("base2", "ntanks") == 1 and not store.is_tracked("base2")
+  store.update(["base0", "base1", "base2"], [[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]])
+  assert store.get("base2", "ntanks") == 1 and not store.is_tracked("base2")
+  assert store.get("missing", "heading") == 90.0
@@ -0,0 +1,198 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Round-robin tournament of the bots in the package on the stand-in engine.
+
+    python -m <package>.tournament --seeds 8 --ticks 600
+
+Every pair of bots plays one match per seed, on a process pool using all
+cores. Ratings are Bradley-Terry maximum likelihood estimates on the Elo
+scale, with bootstrap confidence intervals over the matches. Match results
+are cached on disk, keyed by the source hashes of both bots (including the
+package modules they import), the parameters the parameters file gives them,
+the engine's source, the seed and the map, so after changing one bot only its
+matches are replayed.
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import importlib
+import itertools
+import json
+import os
+import re
+import numpy as np
+
+from .benchmark import BOTS
+from .engine import Engine
+from .params import load_overrides, resolve
+
+_IMPORT = re.compile(r"^from \.(\w+) import", re.MULTILINE)
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def source_hash(module: str) -> str:
+  """Hash of a module's source and of every package module it imports, recursively."""
+  digest = hashlib.sha256()
+  seen = set()
+  pending = [module]
+  while pending:
+    name = pending.pop()
+    if name in seen:
+      continue
+    seen.add(name)
+    with open(os.path.join(_HERE, f"{name}.py"), "rb") as f:
+      source = f.read()
+    digest.update(name.encode() + b"\0" + source)
+    pending += sorted(_IMPORT.findall(source.decode()))
+  return digest.hexdigest()[:16]
+
+
+def params_hash(module: str) -> str:
+  """Hash of the parameters of a bot that the parameters file overrides."""
+  overrides = json.dumps(load_overrides(module), sort_keys=True)
+  return hashlib.sha256(overrides.encode()).hexdigest()[:16]
+
+
+def score(engine: Engine, team: str) -> float:
+  """Strength of a team at the end of a match: bases count for ten vehicles."""
+  return 10 * len(engine.bases[team]) + sum(len(group) for group in engine.vehicles[team].values())
+
+
+def play(bot_a: str, bot_b: str, seed: int, map_size: int, ticks: int, params: dict = None) -> dict:
+  """
+  One match. Bots are renamed after their module, so that two bots with the
+  same CREATOR can meet, and params maps bot names to parameter overrides.
+  The score is that of bot_a: 1 for a win, 0.5 for a draw.
+  """
+  players = []
+  for bot in (bot_a, bot_b):
+    module = importlib.import_module(f".{bot}", __package__)
+    player = module.PlayerAi()
+    player.team = bot
+    if params and bot in params:
+      player.params = resolve(module.PARAMS, params[bot])
+    players.append(player)
+  engine = Engine(players, nx=map_size, ny=map_size // 2, seed=seed)
+  engine.run(ticks)
+  a, b = score(engine, bot_a), score(engine, bot_b)
+  return {"score": 0.5 if a == b else float(a > b), "ticks": engine.ticks, "errors": engine.errors}
+
+
+def bradley_terry(bots: list, matches: list, iterations: int = 200) -> np.ndarray:
+  """
+  Elo-scale ratings (mean 1500) fitting (a, b, score of a) matches, with the
+  minorization-maximization algorithm. Every pair gets one virtual draw, so
+  that a bot that never won or never lost still has a finite rating.
+  """
+  index = {bot: i for i, bot in enumerate(bots)}
+  n = len(bots)
+  games = np.ones((n, n)) - np.eye(n)
+  wins = np.full(n, (n - 1) / 2)
+  for a, b, result in matches:
+    i, j = index[a], index[b]
+    games[i, j] += 1
+    games[j, i] += 1
+    wins[i] += result
+    wins[j] += 1 - result
+
+  strength = np.ones(n)
+  for _ in range(iterations):
+    strength = wins / (games / (strength[:, None] + strength[None, :])).sum(axis=1)
+    strength /= np.exp(np.log(strength).mean())
+  return 1500 + 400 * np.log10(strength)
+
+
+def ratings(bots: list, matches: list, samples: int = 200, seed: int = 0) -> dict:
+  """Rating and 95% bootstrap interval of every bot."""
+  rating = bradley_terry(bots, matches)
+  rng = np.random.default_rng(seed)
+  resampled = [rating]
+  if matches:
+    resampled = [bradley_terry(bots, [matches[i] for i in rng.integers(len(matches), size=len(matches))])
+                 for _ in range(samples)]
+  low, high = np.percentile(resampled, [2.5, 97.5], axis=0)
+  return {bot: (rating[i], low[i], high[i]) for i, bot in enumerate(bots)}
+
+
+class ResultCache:
+  """Match results in a JSON file, written atomically after each new result."""
+
+  def __init__(self, path: str):
+    self.path = path
+    self.results = {}
+    if path and os.path.exists(path):
+      with open(path) as f:
+        self.results = json.load(f)
+
+  def __contains__(self, key: str) -> bool:
+    return key in self.results
+
+  def __getitem__(self, key: str) -> dict:
+    return self.results[key]
+
+  def __setitem__(self, key: str, result: dict) -> None:
+    self.results[key] = result
+    if self.path:
+      os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+      with open(self.path + ".tmp", "w") as f:
+        json.dump(self.results, f)
+      os.replace(self.path + ".tmp", self.path)
+
+
+def run(bots, seeds: int = 8, map_size: int = 256, ticks: int = 600, workers: int = None,
+        cache: ResultCache = None) -> list:
+  """Play every pairing on every seed, returns the (a, b, score of a) matches."""
+  cache = ResultCache(None) if cache is None else cache
+  # The bots load their parameters file at startup, so a tuned bot is a new bot
+  hashes = {bot: f"{source_hash(bot)}{params_hash(bot)}" for bot in bots}
+  engine_hash = source_hash("engine")
+
+  schedule = {}
+  for (a, b), seed in itertools.product(itertools.combinations(bots, 2), range(seeds)):
+    # Alternate who is placed first
+    if seed % 2:
+      a, b = b, a
+    key = f"{hashes[a]}:{hashes[b]}:{engine_hash}:{seed}:{map_size}:{ticks}"
+    schedule[key] = (a, b, seed)
+
+  missing = [key for key in schedule if key not in cache]
+  with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+    futures = {pool.submit(play, *schedule[key][:2], schedule[key][2], map_size, ticks): key
+               for key in missing}
+    for future in concurrent.futures.as_completed(futures):
+      key = futures[future]
+      cache[key] = future.result()
+      a, b, seed = schedule[key]
+      print(f"{a} vs {b} (seed {seed}): {cache[key]['score']}", flush=True)
+
+  return [(a, b, cache[key]["score"]) for key, (a, b, seed) in schedule.items()]
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument("--bots", nargs="+", default=BOTS, choices=BOTS)
+  parser.add_argument("--seeds", type=int, default=8, help="matches per pairing")
+  parser.add_argument("--map", type=int, default=256, help="map width, the height is half of it")
+  parser.add_argument("--ticks", type=int, default=600, help="length of a match")
+  parser.add_argument("--workers", type=int, help="processes, all cores by default")
+  parser.add_argument("--cache", default=os.path.join(_HERE, ".tournament", "results.json"),
+                      help="results file, empty to disable caching")
+  args = parser.parse_args(argv)
+
+  matches = run(args.bots, args.seeds, args.map, args.ticks, args.workers, ResultCache(args.cache or None))
+  table = ratings(args.bots, matches)
+  points = {bot: [] for bot in args.bots}
+  for a, b, result in matches:
+    points[a].append(result)
+    points[b].append(1 - result)
+
+  print(f"\n{'bot':<32}{'elo':>8}{'95% interval':>18}{'games':>8}{'score':>8}")
+  for bot, (rating, low, high) in sorted(table.items(), key=lambda item: -item[1][0]):
+    print(f"{bot:<32}{rating:>8.0f}{f'{low:.0f} - {high:.0f}':>18}{len(points[bot]):>8}"
+          f"{np.mean(points[bot]) if points[bot] else 0:>8.2f}")
+
+
+if __name__ == "__main__":
+  main()
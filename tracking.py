@@ -0,0 +1,135 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+from .geometry import torus_delta
+
+
+def intercept(positions: np.ndarray, speeds: np.ndarray, targets: np.ndarray, velocities: np.ndarray,
+              size: np.ndarray, horizon: float = np.inf) -> tuple:
+  """
+  Where n pursuers moving at the given speeds meet n targets moving at
+  constant velocities on the wrapped map, the earliest t > 0 solving
+  |d + v t| = s t for the vector d from pursuer to target. Returns the (n, 2)
+  points and the times, inf where a pursuer cannot catch its target: it then
+  aims at where the target is now. Leads are cut at horizon seconds.
+  """
+  positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+  targets = np.asarray(targets, dtype=float).reshape(-1, 2)
+  velocities = np.asarray(velocities, dtype=float).reshape(-1, 2)
+  speeds = np.asarray(speeds, dtype=float).reshape(-1)
+  delta = torus_delta(positions, targets, size)
+
+  # (v.v - s^2) t^2 + 2 d.v t + d.d = 0, with the roots taken in the form
+  # that does not cancel, which also covers a = 0 (equal speeds). a is
+  # rounded to 0 there, its float noise would put a root far in the future.
+  vv = (velocities * velocities).sum(axis=1)
+  a = vv - speeds**2
+  a[np.abs(a) <= 1e-9 * (vv + speeds**2)] = 0
+  b = 2 * (delta * velocities).sum(axis=1)
+  c = (delta * delta).sum(axis=1)
+  discriminant = b**2 - 4 * a * c
+  with np.errstate(divide="ignore", invalid="ignore"):
+    q = -0.5 * (b + np.copysign(np.sqrt(np.maximum(discriminant, 0)), b))
+    roots = np.stack([q / a, c / q], axis=1)
+  roots[~(roots > 0) | (discriminant < 0)[:, None]] = np.inf
+  times = roots.min(axis=1)
+
+  lead = np.where(np.isfinite(times), np.minimum(times, horizon), 0)
+  return (targets + velocities * lead[:, None]) % np.asarray(size, dtype=float), times
+
+
+class MotionTracker:
+  """
+  Recent positions of enemy units by uid, to estimate where they are going.
+
+  Every tracked uid owns a slot in preallocated arrays holding its positions
+  at the last `history` ticks, a ring buffer whose columns are shared by all
+  slots: update() writes the column of the current tick for all units in
+  view at once, and leaves it empty (nan) for the others. Units that were
+  not seen for `history` ticks are dropped and their slots reused.
+  """
+
+  def __init__(self, history: int = 8, capacity: int = 64):
+    self.history = history
+    self.slots = {}
+    self._free = list(range(capacity - 1, -1, -1))
+    self.position = np.full((capacity, history, 2), np.nan)
+    self.time = np.full(history, np.nan)
+    self.last_seen = np.zeros(capacity, dtype=np.int64)
+    self.size = np.ones(2)
+    self.ticks = 0
+
+  def __len__(self) -> int:
+    return len(self.slots)
+
+  def __contains__(self, uid) -> bool:
+    return uid in self.slots
+
+  def _grow(self) -> None:
+    capacity = len(self.position)
+    self.position = np.concatenate([self.position, np.full_like(self.position, np.nan)])
+    self.last_seen = np.concatenate([self.last_seen, np.zeros(capacity, dtype=np.int64)])
+    self._free += range(2 * capacity - 1, capacity - 1, -1)
+
+  def _allocate(self, uid) -> int:
+    if not self._free:
+      self._grow()
+    slot = self._free.pop()
+    self.slots[uid] = slot
+    self.position[slot] = np.nan
+    return slot
+
+  def update(self, t: float, uids: list, positions: np.ndarray, size: np.ndarray) -> None:
+    """Record the positions of the enemy units in view at time t."""
+    self.size = np.asarray(size, dtype=float)
+    column = self.ticks % self.history
+    self.time[column] = t
+    self.position[:, column] = np.nan
+    slots = np.array([self.slots[uid] if uid in self.slots else self._allocate(uid) for uid in uids],
+                     dtype=np.int64)
+    self.position[slots, column] = np.asarray(positions, dtype=float).reshape(-1, 2)
+    self.last_seen[slots] = self.ticks
+
+    tracked = list(self.slots)
+    stale = self.ticks - self.last_seen[[self.slots[uid] for uid in tracked]] >= self.history
+    for uid in np.array(tracked, dtype=object)[stale]:
+      self._free.append(self.slots.pop(uid))
+    self.ticks += 1
+
+  def velocity(self, uids: list) -> np.ndarray:
+    """
+    (n, 2) velocities of the given units, least-squares fits of their
+    positions over the buffered ticks. Positions are taken relative to the
+    latest one along the shortest wrapped vector, so a unit crossing the map
+    edge keeps its velocity. Units with fewer than two positions stand still.
+    """
+    slots = np.array([self.slots.get(uid, -1) for uid in uids], dtype=np.int64)
+    velocity = np.zeros((len(slots), 2))
+    known = slots >= 0
+    if not known.any():
+      return velocity
+
+    # Columns from the latest tick back
+    columns = (self.ticks - 1 - np.arange(self.history)) % self.history
+    samples = self.position[slots[known]][:, columns]
+    valid = ~np.isnan(samples[..., 0]) & ~np.isnan(self.time[columns])
+    latest = samples[np.arange(len(samples)), valid.argmax(axis=1)]
+    offsets = np.nan_to_num(torus_delta(latest[:, None], samples, self.size))
+    times = np.nan_to_num(self.time[columns] - self.time[columns[0]])
+
+    weight = valid.astype(float)
+    count = np.maximum(weight.sum(axis=1), 1)
+    mean_time = (weight * times).sum(axis=1) / count
+    mean_offset = (weight[..., None] * offsets).sum(axis=1) / count[:, None]
+    deviation = weight * (times - mean_time[:, None])
+    variance = (deviation * (times - mean_time[:, None])).sum(axis=1)
+    covariance = (deviation[..., None] * (offsets - mean_offset[:, None])).sum(axis=1)
+    fitted = variance > 0
+    velocity[np.flatnonzero(known)[fitted]] = covariance[fitted] / variance[fitted, None]
+    return velocity
+
+  def intercepts(self, positions: np.ndarray, speeds: np.ndarray, uids: list, targets: np.ndarray,
+                 horizon: float = np.inf) -> np.ndarray:
+    """(n, 2) intercept points of n pursuers on the tracked units uids at targets, see intercept()."""
+    return intercept(positions, speeds, targets, self.velocity(uids), self.size, horizon)[0]
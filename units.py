@@ -0,0 +1,93 @@
+# SPDX-License-Identifier: BSD-3-Clause
+
+import numpy as np
+
+
+class UnitStore:
+  """
+  Per-unit state of my bases and vehicles, kept in preallocated arrays.
+
+  Every live uid owns a slot in the arrays: its position at the previous tick
+  and any extra numeric fields, e.g. per-base build counters or an enum value.
+  update() is called once per tick with all my live uids; slots of the uids
+  that are gone are reclaimed and reused, so memory stays proportional to the
+  number of live units however long the match runs. The same call compares
+  all positions with the previous tick at once, which answers the "did this
+  unit move" check of the vehicle loops.
+  """
+
+  def __init__(self, fields: dict = None, capacity: int = 64):
+    self.defaults = dict(fields or {})
+    self.slots = {}
+    self._free = list(range(capacity - 1, -1, -1))
+    self.position = np.full((capacity, 2), np.nan, dtype=np.float32)
+    self.fields = {name: np.full(capacity, default, dtype=np.float32)
+                   for name, default in self.defaults.items()}
+    self.tracked = np.zeros(capacity, dtype=bool)
+    self.stationary = np.zeros(capacity, dtype=bool)
+
+  def __len__(self) -> int:
+    return len(self.slots)
+
+  def __contains__(self, uid) -> bool:
+    return uid in self.slots
+
+  def _grow(self) -> None:
+    capacity = len(self.position)
+    self.position = np.concatenate([self.position, np.full((capacity, 2), np.nan, dtype=np.float32)])
+    for name, values in self.fields.items():
+      self.fields[name] = np.concatenate([values, np.full(capacity, self.defaults[name], dtype=np.float32)])
+    self.tracked = np.concatenate([self.tracked, np.zeros(capacity, dtype=bool)])
+    self.stationary = np.concatenate([self.stationary, np.zeros(capacity, dtype=bool)])
+    self._free += range(2 * capacity - 1, capacity - 1, -1)
+
+  def _allocate(self, uid) -> int:
+    if not self._free:
+      self._grow()
+    slot = self._free.pop()
+    self.slots[uid] = slot
+    self.position[slot] = np.nan
+    for name, values in self.fields.items():
+      values[slot] = self.defaults[name]
+    self.tracked[slot] = False
+    self.stationary[slot] = False
+    return slot
+
+  def update(self, uids: list, positions: np.ndarray) -> list:
+    """
+    Record the positions of all my live units for this tick. Returns the uids
+    that were dropped because they are no longer alive.
+    """
+    dead = list(self.slots.keys() - set(uids))
+    for uid in dead:
+      self._free.append(self.slots.pop(uid))
+
+    slots = np.array([self.slots[uid] if uid in self.slots else self._allocate(uid) for uid in uids],
+                     dtype=np.int64)
+    positions = np.asarray(positions, dtype=np.float32).reshape(-1, 2)
+    previous = self.position[slots]
+    self.tracked[slots] = ~np.isnan(previous[:, 0])
+    self.stationary[slots] = (previous == positions).all(axis=1)
+    self.position[slots] = positions
+    return dead
+
+  def is_tracked(self, uid) -> bool:
+    """Whether the unit was already alive at the previous tick."""
+    return uid in self.slots and bool(self.tracked[self.slots[uid]])
+
+  def is_stationary(self, uid) -> bool:
+    """Whether the unit has not moved since the previous tick."""
+    return uid in self.slots and bool(self.stationary[self.slots[uid]])
+
+  def get(self, uid, name: str) -> float:
+    if uid not in self.slots:
+      return self.defaults[name]
+    return float(self.fields[name][self.slots[uid]])
+
+  def set(self, uid, name: str, value: float) -> None:
+    """Set a field, also for a unit that only appears at the next tick (e.g. a new base)."""
+    slot = self.slots[uid] if uid in self.slots else self._allocate(uid)
+    self.fields[name][slot] = value
+
+  def add(self, uid, name: str, amount: float = 1) -> None:
+    self.set(uid, name, self.get(uid, name) + amount)